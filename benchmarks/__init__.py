@@ -0,0 +1 @@
+"""Бенчмарки ValutaTrade Hub (не входят в пакет)."""
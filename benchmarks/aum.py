@@ -0,0 +1,78 @@
+"""Сравнение пакетной оценки портфелей с поштучным циклом.
+
+Запуск: python -m benchmarks.aum --users 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from valutatrade_hub.core import reports
+from valutatrade_hub.core.models import Portfolio, Wallet
+from valutatrade_hub.core.rate_engine import RateMatrix
+
+CODES = ("BTC", "ETH", "SOL", "EUR", "GBP", "RUB")
+PAIRS = {
+    "BTC_USD": {"rate": 90842.0},
+    "ETH_USD": {"rate": 2995.36},
+    "SOL_USD": {"rate": 141.18},
+    "EUR_USD": {"rate": 1.08},
+    "GBP_USD": {"rate": 1.27},
+    "RUB_USD": {"rate": 0.011},
+}
+
+
+def make_portfolios(n_users: int, seed: int = 42) -> list[Portfolio]:
+    rnd = random.Random(seed)
+    portfolios = []
+    for user_id in range(1, n_users + 1):
+        wallets = {
+            code: Wallet(currency_code=code, _balance=rnd.uniform(0, 100))
+            for code in rnd.sample(CODES, rnd.randint(0, len(CODES)))
+        }
+        portfolios.append(Portfolio(_user_id=user_id, _wallets=wallets))
+    return portfolios
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--base", default="EUR")
+    args = parser.parse_args()
+
+    portfolios = make_portfolios(args.users)
+    matrix = RateMatrix.from_pairs(PAIRS)
+
+    loop = reports.value_portfolios_loop(portfolios, matrix, args.base)
+    batch = reports.value_portfolios(portfolios, matrix, args.base)
+    assert abs(loop.total - batch.total) <= 1e-6 * max(1.0, abs(loop.total))
+
+    t_loop = _best_of(
+        lambda: reports.value_portfolios_loop(portfolios, matrix, args.base),
+        args.repeat,
+    )
+    t_batch = _best_of(
+        lambda: reports.value_portfolios(portfolios, matrix, args.base),
+        args.repeat,
+    )
+    engine = "numpy" if reports.np is not None else "loop (numpy не найден)"
+    print(f"users={args.users} base={args.base} engine={engine}")
+    print(f"per-portfolio loop: {t_loop * 1000:10.1f} ms")
+    print(f"batch valuation:    {t_batch * 1000:10.1f} ms")
+    print(f"speedup:            {t_loop / t_batch:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
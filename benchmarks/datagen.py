@@ -0,0 +1,142 @@
+"""Синтетические файлы данных заданного размера.
+
+Пишет users.json, portfolios.json, rates.json и exchange_rates.json
+в каталог data/ так же, как их пишет приложение. У всех пользователей
+пароль PASSWORD, поэтому с ними можно выполнить login.
+
+Запуск: python -m benchmarks.datagen --records 100000 --base-dir /tmp/valuta
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from valutatrade_hub.infra.serialization import write_file
+
+from .aum import PAIRS, make_portfolios
+
+PASSWORD = "bench-pass"
+
+# Матрица кросс-курсов плотная (n² по числу валют), поэтому снимок курсов
+# растёт вместе с остальными файлами только до этого числа пар.
+MAX_RATE_PAIRS = 500
+
+SOURCES = ("CoinGeckoClient", "ExchangeRateApiClient")
+
+
+def make_users(n_users: int, seed: int = 42) -> list[dict]:
+    rnd = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    users = []
+    for user_id in range(1, n_users + 1):
+        salt = "%016x" % rnd.getrandbits(64)
+        users.append(
+            {
+                "user_id": user_id,
+                "username": f"user{user_id}",
+                "hashed_password": hashlib.sha256(
+                    (PASSWORD + salt).encode("utf-8")
+                ).hexdigest(),
+                "salt": salt,
+                "registration_date": (
+                    start + timedelta(seconds=rnd.randint(0, 3 * 10**7))
+                ).isoformat(),
+            }
+        )
+    return users
+
+
+def make_rates(n_pairs: int, seed: int = 42, now: str | None = None) -> dict:
+    """Снимок курсов: настоящие пары из aum.PAIRS и синтетические C<i>_USD."""
+    rnd = random.Random(seed)
+    now = now or datetime(2025, 11, 27, 12).isoformat() + "Z"
+    pairs = {
+        pair: {"rate": info["rate"], "updated_at": now, "source": SOURCES[0]}
+        for pair, info in PAIRS.items()
+    }
+    for i in range(max(0, n_pairs - len(pairs))):
+        pairs[f"C{i}_USD"] = {
+            "rate": rnd.uniform(0.001, 100000),
+            "updated_at": now,
+            "source": rnd.choice(SOURCES),
+        }
+    return {"pairs": pairs, "last_refresh": now}
+
+
+def make_history(n_records: int, seed: int = 42) -> list[dict]:
+    """Записи истории по реальным парам, по минуте между тиками."""
+    rnd = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    pairs = list(PAIRS.items())
+    records = []
+    for i in range(n_records):
+        pair, info = pairs[i % len(pairs)]
+        from_code, to_code = pair.split("_", maxsplit=1)
+        ts = (start + timedelta(minutes=i // len(pairs))).isoformat() + "Z"
+        records.append(
+            {
+                "id": f"{pair}_{ts}",
+                "from_currency": from_code,
+                "to_currency": to_code,
+                "rate": info["rate"] * rnd.uniform(0.9, 1.1),
+                "timestamp": ts,
+                "source": SOURCES[0],
+                "meta": {
+                    "raw_id": "",
+                    "request_ms": rnd.randint(50, 500),
+                    "status_code": 200,
+                    "etag": "",
+                },
+            }
+        )
+    return records
+
+
+def generate(
+    base_dir: Path,
+    records: int,
+    seed: int = 42,
+    max_pairs: int = MAX_RATE_PAIRS,
+) -> dict[str, int]:
+    """Записать все файлы в base_dir/data; возвращает размеры в байтах.
+
+    Снимок курсов помечается текущим временем, чтобы get_rate не считал
+    кеш устаревшим.
+    """
+    data_dir = Path(base_dir) / "data"
+    now = datetime.utcnow().isoformat() + "Z"
+    files = {
+        "users.json": ("users", make_users(records, seed)),
+        "portfolios.json": (
+            "portfolios",
+            [p.to_json() for p in make_portfolios(records, seed)],
+        ),
+        "rates.json": ("rates", make_rates(min(records, max_pairs), seed, now)),
+        "exchange_rates.json": ("exchange_rates", make_history(records, seed)),
+    }
+    sizes = {}
+    for name, (schema, data) in files.items():
+        write_file(data_dir / name, data, schema=schema)
+        sizes[name] = (data_dir / name).stat().st_size
+    return sizes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--base-dir", required=True)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-pairs", type=int, default=MAX_RATE_PAIRS)
+    args = parser.parse_args()
+
+    sizes = generate(Path(args.base_dir), args.records, args.seed, args.max_pairs)
+    for name, size in sizes.items():
+        print(f"{name:<22}{size / 1e6:>10.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Задержка, которую журнал добавляет к операции с log_action.
+
+Обработчик журнала искусственно медленный (--sink-ms на запись, как
+перегруженный диск). Сравниваются запись напрямую из потока команды и
+через очередь с фоновым потоком (как в configure_logging).
+
+Запуск: python -m benchmarks.logging_overhead --calls 500 --sink-ms 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import queue
+import statistics
+import time
+from logging.handlers import QueueListener
+
+from valutatrade_hub.decorators import log_action
+from valutatrade_hub.logging_config import NonBlockingQueueHandler
+
+
+class _SlowHandler(logging.Handler):
+    def __init__(self, delay: float) -> None:
+        super().__init__()
+        self.delay = delay
+        self.records = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.format(record)
+        time.sleep(self.delay)
+        self.records += 1
+
+
+@log_action("BENCH")
+def _operation() -> str:
+    return "ok"
+
+
+def _run(calls: int) -> list[float]:
+    times = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        _operation()
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--sink-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    sink = _SlowHandler(args.sink_ms / 1000)
+
+    root.addHandler(sink)
+    direct = _run(args.calls)
+    root.removeHandler(sink)
+
+    queued_handler = NonBlockingQueueHandler(queue.Queue(maxsize=100_000))
+    listener = QueueListener(queued_handler.queue, sink)
+    listener.start()
+    root.addHandler(queued_handler)
+    queued = _run(args.calls)
+    root.removeHandler(queued_handler)
+    drained = time.perf_counter()
+    listener.stop()
+    drained = time.perf_counter() - drained
+
+    print(f"calls={args.calls} sink={args.sink_ms} ms/record")
+    for name, times in (("direct", direct), ("queued", queued)):
+        print(
+            f"{name:<8} p50 {statistics.median(times):8.3f} ms  "
+            f"max {max(times):8.3f} ms"
+        )
+    print(f"фоновый поток дописал очередь за {drained:.2f} s после команд")
+
+
+if __name__ == "__main__":
+    main()
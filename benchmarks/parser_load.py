@@ -0,0 +1,166 @@
+"""Нагрузка на сервис парсинга без интернета.
+
+Источники:
+  synthetic — SyntheticApiClient, --pairs пар, шаг блуждания на запрос;
+  replay    — ReplayApiClient, кадр истории на запрос (--replay-file);
+  http      — настоящие CoinGeckoClient и ExchangeRateApiClient против
+              локальной заглушки benchmarks.stub_api (монеты и фиат из
+              каталога валют, --coins добавляет вымышленные монеты).
+
+--threads потоков параллельно выполняют RatesUpdater.run_update
+(--updates раз каждый) в отдельном временном каталоге данных. Выводятся
+перцентили времени обновления, курсов в секунду и прирост истории.
+
+Запуск: python -m benchmarks.parser_load --source synthetic --pairs 5000
+        python -m benchmarks.parser_load --source http --threads 8 --latency-ms 20
+        python -m benchmarks.parser_load --source http --coins 5000 --updates 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+def _build_clients(args: argparse.Namespace, config, server_url: str | None):
+    from valutatrade_hub.parser_service.api_clients import (
+        CoinGeckoClient,
+        ExchangeRateApiClient,
+        ReplayApiClient,
+        SyntheticApiClient,
+    )
+
+    if args.source == "synthetic":
+        return [
+            SyntheticApiClient(
+                config,
+                pairs=args.pairs,
+                frequency=0,
+                change_fraction=args.change_fraction,
+                seed=1,
+            )
+        ]
+    if args.source == "replay":
+        return [ReplayApiClient(config, path=args.replay_file, speed=0)]
+    if args.coins:
+        # вымышленные монеты поверх каталога: проверка пакетных запросов
+        config.CRYPTO_ID_MAP = {
+            **config.CRYPTO_ID_MAP,
+            **{f"X{i:04d}": f"stub-coin-{i:04d}" for i in range(args.coins)},
+        }
+        config.CRYPTO_CURRENCIES = tuple(config.CRYPTO_ID_MAP)
+    config.COINGECKO_URL = f"{server_url}/api/v3/simple/price"
+    config.EXCHANGERATE_API_URL = f"{server_url}/v6"
+    config.EXCHANGERATE_API_KEY = "stub"
+    return [CoinGeckoClient(config), ExchangeRateApiClient(config)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--source", choices=("synthetic", "replay", "http"), default="synthetic"
+    )
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--pairs", type=int, default=1000)
+    parser.add_argument("--change-fraction", type=float, default=1.0)
+    parser.add_argument(
+        "--coins", type=int, default=0, help="http: дополнительных монет"
+    )
+    parser.add_argument("--replay-file", default="data/exchange_rates.json")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tick", type=float, default=0.05)
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    args = parser.parse_args()
+    if args.replay_file:
+        args.replay_file = str(Path(args.replay_file).resolve())
+
+    # каталог валют — встроенный в пакет, как в продакшене
+    base_dir = tempfile.mkdtemp(prefix="valuta-parser-load-")
+    os.environ["VALUTA_BASE_DIR"] = base_dir
+    os.environ["VALUTA_STORAGE_BACKEND"] = args.backend
+    logging.getLogger("valutatrade_hub").setLevel(logging.CRITICAL)
+
+    from valutatrade_hub.infra.database import get_db
+    from valutatrade_hub.parser_service.config import ParserConfig
+    from valutatrade_hub.parser_service.updater import RatesUpdater
+
+    server = None
+    if args.source == "http":
+        from .stub_api import StubApiServer
+
+        server = StubApiServer(
+            tick=args.tick, latency_ms=args.latency_ms, error_rate=args.error_rate
+        )
+        server.start_background()
+
+    latencies: list[float] = []
+    counters = {"rates": 0, "written": 0, "not_modified": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def worker() -> None:
+        config = ParserConfig()
+        config.MAX_RETRIES = 1
+        updater = RatesUpdater(
+            _build_clients(args, config, server.url if server else None)
+        )
+        for _ in range(args.updates):
+            started = time.perf_counter()
+            result = updater.run_update()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                counters["rates"] += result["total_rates"]
+                counters["written"] += result["written"]
+                counters["not_modified"] += len(result["not_modified"])
+                counters["errors"] += len(result["errors"])
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    get_db().flush()
+
+    history = sum(
+        p.stat().st_size
+        for p in (Path(base_dir) / "data").glob("*")
+        if p.name.startswith(("exchange_rates", "valutatrade.db"))
+    )
+    ordered = sorted(latencies)
+    print(
+        f"source={args.source} threads={args.threads} updates={len(latencies)} "
+        f"backend={args.backend}"
+    )
+    print(
+        f"run_update p50 {statistics.median(ordered) * 1000:.2f} ms  "
+        f"p99 {ordered[int(0.99 * (len(ordered) - 1))] * 1000:.2f} ms  "
+        f"max {ordered[-1] * 1000:.2f} ms"
+    )
+    print(
+        f"курсов получено {counters['rates']} ({counters['rates'] / elapsed:.0f}/s), "
+        f"записано {counters['written']}, 304: {counters['not_modified']}, "
+        f"ошибок: {counters['errors']}"
+    )
+    print(f"история: {history / 1024:.0f} KB за {elapsed:.1f} s")
+    if server is not None:
+        print(f"запросов к заглушке: {server.requests}")
+        server.shutdown()
+    shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
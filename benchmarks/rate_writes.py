@@ -0,0 +1,135 @@
+"""Запись на диск при частом обновлении курсов: все курсы или изменения.
+
+Две заглушки провайдеров (как CoinGecko и ExchangeRate в планировщике)
+возвращают --pairs пар: криптовалюты (каждая пятая пара) сдвигаются
+каждый тик случайным блужданием, фиатные меняются с вероятностью
+--fiat-change, иначе приходят те же значения. Прогон с
+CHANGE_THRESHOLD=-1 воспроизводит прежнее поведение (пишется каждый
+курс), второй — с порогом из ParserConfig.
+
+Запуск: python -m benchmarks.rate_writes --ticks 500 --pairs 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from .usecases import _written_bytes
+
+
+def _run(
+    threshold: float | None,
+    ticks: int,
+    n_pairs: int,
+    fiat_change: float,
+    results: multiprocessing.Queue,
+) -> None:
+    from valutatrade_hub.infra.database import get_db
+    from valutatrade_hub.parser_service.api_clients import BaseApiClient
+    from valutatrade_hub.parser_service.config import ParserConfig
+    from valutatrade_hub.parser_service.updater import RatesUpdater
+
+    logging.getLogger("valutatrade_hub").setLevel(logging.CRITICAL)
+    rnd = random.Random(42)
+    rates = {f"C{i:03d}_USD": rnd.uniform(0.5, 50000) for i in range(n_pairs)}
+    crypto = [pair for i, pair in enumerate(rates) if i % 5 == 0]
+
+    class _StubClient(BaseApiClient):
+        def __init__(self, config: ParserConfig, pairs: list[str]) -> None:
+            super().__init__(config)
+            self.pairs = pairs
+
+        def fetch_rates(self) -> dict:
+            for pair in self.pairs:
+                if pair in crypto:
+                    rates[pair] *= 1 + rnd.gauss(0, 0.0005)
+                elif rnd.random() < fiat_change:
+                    rates[pair] *= 1 + rnd.gauss(0, 0.001)
+            self.last_meta = {"status_code": 200}
+            return {pair: rates[pair] for pair in self.pairs}
+
+    config = ParserConfig()
+    if threshold is not None:
+        config.CHANGE_THRESHOLD = threshold
+    # провайдеры обновляются раздельно, как в планировщике
+    fiat = [pair for pair in rates if pair not in crypto]
+    updaters = [
+        RatesUpdater([_StubClient(config, crypto)]),
+        RatesUpdater([_StubClient(config, fiat)]),
+    ]
+
+    written = snapshots = 0
+    written_before = _written_bytes()
+    started = time.perf_counter()
+    for _ in range(ticks):
+        for updater in updaters:
+            result = updater.run_update()
+            written += result["written"]
+            snapshots += bool(result["written"])
+    elapsed = time.perf_counter() - started
+    get_db().flush()
+    written_after = _written_bytes()
+
+    data_dir = Path(os.environ["VALUTA_BASE_DIR"]) / "data"
+    history = sum(
+        p.stat().st_size for p in data_dir.glob("exchange_rates*.jsonl")
+    )
+    results.put(
+        {
+            "records": written,
+            "snapshots": snapshots,
+            "history_bytes": history,
+            "written_bytes": (
+                None if written_before is None else written_after - written_before
+            ),
+            "ms_per_tick": elapsed / ticks * 1000,
+        }
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ticks", type=int, default=500)
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--fiat-change", type=float, default=0.02)
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(
+        f"ticks={args.ticks} pairs={args.pairs} backend={args.backend}\n"
+        f"{'mode':<10}{'records':>10}{'snapshots':>11}{'history KB':>12}"
+        f"{'written KB':>12}{'ms/tick':>10}"
+    )
+    for name, threshold in (("all", -1.0), ("changes", None)):
+        base_dir = tempfile.mkdtemp(prefix="valuta-rate-writes-")
+        os.environ["VALUTA_BASE_DIR"] = base_dir
+        os.environ["VALUTA_STORAGE_BACKEND"] = args.backend
+        results = ctx.Queue()
+        proc = ctx.Process(
+            target=_run,
+            args=(threshold, args.ticks, args.pairs, args.fiat_change, results),
+        )
+        proc.start()
+        report = results.get()
+        proc.join()
+        shutil.rmtree(base_dir, ignore_errors=True)
+        written = report["written_bytes"]
+        print(
+            f"{name:<10}{report['records']:>10}{report['snapshots']:>11}"
+            f"{report['history_bytes'] / 1024:>12.0f}"
+            f"{'-' if written is None else f'{written / 1024:.0f}':>12}"
+            f"{report['ms_per_tick']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Скорость кодирования/декодирования файлов данных для всех кодеков.
+
+Данные — портфели, пользователи и снимок курсов того же вида, что
+в data/. Запуск: python -m benchmarks.serialization --sizes 1000,10000,100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from valutatrade_hub.infra.serialization import available_codecs
+
+from .aum import make_portfolios
+from .datagen import make_rates, make_users
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    codecs = available_codecs()
+    print(f"codecs: {', '.join(codecs)}")
+    print(
+        f"{'data':<12}{'size':>8}  {'codec':<12}{'bytes':>12}"
+        f"{'encode ms':>12}{'decode ms':>12}{'MB/s enc':>10}{'MB/s dec':>10}"
+    )
+    for size in (int(s) for s in args.sizes.split(",")):
+        datasets = {
+            "portfolios": [p.to_json() for p in make_portfolios(size)],
+            "users": make_users(size),
+            "rates": make_rates(min(size, 5000)),
+        }
+        for name, data in datasets.items():
+            for codec in codecs.values():
+                raw = codec.dumps(data)
+                assert codec.loads(raw) == data
+                t_enc = _best_of(lambda: codec.dumps(data), args.repeat)
+                t_dec = _best_of(lambda: codec.loads(raw), args.repeat)
+                mb = len(raw) / 1e6
+                print(
+                    f"{name:<12}{size:>8}  {codec.name:<12}{len(raw):>12}"
+                    f"{t_enc * 1000:>12.2f}{t_dec * 1000:>12.2f}"
+                    f"{mb / t_enc:>10.1f}{mb / t_dec:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
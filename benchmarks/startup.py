@@ -0,0 +1,128 @@
+"""Время холодного запуска CLI в режиме одной команды (project <command>).
+
+Каждая команда запускается в новом процессе --repeat раз; дополнительный
+запуск с python -X importtime показывает, сколько заняли импорты и
+какие тяжёлые модули были загружены. Для сравнения замеряется пустой
+интерпретатор (python -c pass).
+
+Запуск: python -m benchmarks.startup --repeat 20 [--max-ms 150]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+MAIN = str(Path(__file__).resolve().parent.parent / "main.py")
+
+COMMANDS = [
+    "help",
+    "whoami",
+    "buy --currency BTC --amount 0.1",
+    "show-portfolio",
+    "show-rates",
+]
+
+# модули, которые не должны загружаться командами, которым они не нужны
+HEAVY = ("requests", "urllib3", "numpy", "prettytable", "sqlite3")
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def _run(argv: list[str], env: dict, cwd: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        argv,
+        env=env,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+
+def _wall_ms(argv: list[str], env: dict, cwd: str, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _run(argv, env, cwd)
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def import_profile(argv: list[str], env: dict, cwd: str) -> tuple[float, set]:
+    """Суммарное время импортов верхнего уровня (мс) и загруженные модули."""
+    result = _run([argv[0], "-X", "importtime", *argv[1:]], env, cwd)
+    total_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        modules.add(match.group(4))
+        if len(match.group(3)) == 1:  # модуль верхнего уровня
+            total_us += int(match.group(2))
+    return total_us / 1000, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--commands",
+        default=";".join(COMMANDS),
+        help="команды через ';'",
+    )
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="код возврата 1, если медиана какой-то команды больше",
+    )
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp(prefix="valuta-startup-")
+    env = dict(os.environ, VALUTA_BASE_DIR=base_dir)
+    python = sys.executable
+    for setup in (
+        "register --username bench --password bench-pass",
+        "login --username bench --password bench-pass",
+    ):
+        _run([python, MAIN, *shlex.split(setup)], env, base_dir)
+
+    baseline = statistics.median(
+        _wall_ms([python, "-c", "pass"], env, base_dir, args.repeat)
+    )
+    print(f"python {sys.version.split()[0]}, data={base_dir}")
+    print(f"пустой интерпретатор: {baseline:.1f} ms")
+    print(
+        f"{'команда':<36}{'median ms':>10}{'min ms':>9}"
+        f"{'imports ms':>12}  тяжёлые модули"
+    )
+    slow = []
+    for command in args.commands.split(";"):
+        argv = [python, MAIN, *shlex.split(command)]
+        times = _wall_ms(argv, env, base_dir, args.repeat)
+        imports_ms, modules = import_profile(argv, env, base_dir)
+        heavy = sorted(name for name in HEAVY if name in modules)
+        median = statistics.median(times)
+        print(
+            f"{command:<36}{median:>10.1f}{min(times):>9.1f}"
+            f"{imports_ms:>12.1f}  {', '.join(heavy) or '-'}"
+        )
+        if args.max_ms is not None and median > args.max_ms:
+            slow.append(command)
+    if slow:
+        print(f"медиана больше {args.max_ms} ms: {', '.join(slow)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Стресс-тест хранилища: N процессов одновременно торгуют и регистрируются.
+
+Каждый процесс покупает и продаёт BTC у общего набора пользователей
+(часть сделок конфликтует) и регистрирует своего пользователя. В конце
+проверяется, что ни одна сделка и ни одна регистрация не потеряны.
+
+Запуск: python -m benchmarks.stress --procs 8 --trades 200 [--backend sqlite]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+PASSWORD = "stress-pass"
+
+
+def _worker(
+    index: int,
+    usernames: list[str],
+    trades: int,
+    results: multiprocessing.Queue,
+) -> None:
+    from valutatrade_hub.core import usecases
+    from valutatrade_hub.core.exceptions import (
+        ConcurrentUpdateError,
+        InsufficientFundsError,
+    )
+    from valutatrade_hub.core.session import Session
+
+    logging.getLogger("valutatrade_hub").setLevel(logging.CRITICAL)
+    usecases.register_user(username=f"worker{index}", password=PASSWORD)
+    sessions = {name: Session.login(name, PASSWORD) for name in usernames}
+    applied = {name: 0.0 for name in usernames}
+    rejected = 0
+    no_funds = 0
+    for k in range(trades):
+        name = usernames[(index + k) % len(usernames)]
+        # покупка 2 и продажа 1; отказ после всех повторов — не потеря,
+        # он просто не учитывается в ожидаемом балансе. Если покупки
+        # отклонены, продажа может упереться в нехватку средств — это тоже
+        # отказ, а не ошибка воркера
+        for func, delta in (
+            (usecases.buy_currency, 2.0),
+            (usecases.sell_currency, -1.0),
+        ):
+            try:
+                func("BTC", abs(delta), session=sessions[name])
+                applied[name] += delta
+            except ConcurrentUpdateError:
+                rejected += 1
+            except InsufficientFundsError:
+                no_funds += 1
+    results.put((applied, rejected, no_funds))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--procs", type=int, default=8)
+    parser.add_argument("--trades", type=int, default=200)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp(prefix="valuta-stress-")
+    # дочерние процессы (spawn) наследуют окружение
+    os.environ["VALUTA_BASE_DIR"] = base_dir
+    os.environ["VALUTA_STORAGE_BACKEND"] = args.backend
+
+    from valutatrade_hub.core import usecases
+    from valutatrade_hub.infra.database import get_db
+
+    usernames = [f"shared{i}" for i in range(args.users)]
+    for name in usernames:
+        usecases.register_user(username=name, password=PASSWORD)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(i, usernames, args.trades, results))
+        for i in range(args.procs)
+    ]
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    expected = {name: 0.0 for name in usernames}
+    rejected = 0
+    no_funds = 0
+    for p in procs:
+        applied, worker_rejected, worker_no_funds = results.get()
+        rejected += worker_rejected
+        no_funds += worker_no_funds
+        for name, delta in applied.items():
+            expected[name] += delta
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    db = get_db()
+
+    failures = [p.exitcode for p in procs if p.exitcode != 0]
+    lost = []
+    for name, count in expected.items():
+        portfolio = db.get_portfolio(db.get_user(name).user_id)
+        wallet = portfolio.get_wallet("BTC") if portfolio else None
+        balance = wallet.balance if wallet else 0.0
+        if abs(balance - count) > 1e-9:
+            lost.append(f"{name}: ожидалось {count}, получено {balance}")
+    workers = [db.get_user(f"worker{i}") for i in range(args.procs)]
+    missing = [i for i, user in enumerate(workers) if user is None]
+    ids = [u.user_id for u in db.load_users()]
+
+    trades = args.procs * args.trades * 2
+    print(f"backend={args.backend} procs={args.procs} data={base_dir}")
+    print(f"trades: {trades} за {elapsed:.2f} s ({trades / elapsed:.0f} ops/s)")
+    print(f"отклонено после всех повторов: {rejected}")
+    print(f"отклонено из-за нехватки средств: {no_funds}")
+    ok = True
+    if failures:
+        ok = False
+        print(f"процессы завершились с ошибкой: {failures}")
+    if lost:
+        ok = False
+        print("потерянные сделки:\n  " + "\n  ".join(lost))
+    if missing or len(ids) != len(set(ids)):
+        ok = False
+        print(f"потерянные регистрации: {missing}, id: {sorted(ids)}")
+    print("OK: потерянных обновлений нет" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
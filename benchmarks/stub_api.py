@@ -0,0 +1,202 @@
+"""Локальная заглушка CoinGecko и ExchangeRate-API для нагрузочных тестов.
+
+Отдаёт ответы той же формы, что настоящие API:
+
+    GET /api/v3/simple/price?ids=bitcoin,ethereum&vs_currencies=usd
+    GET /v6/<ключ>/latest/USD
+
+Курсы блуждают случайно и меняются раз в --tick секунд; ответы несут
+ETag, поэтому повторный запрос в пределах тика получает 304. --latency-ms
+и --error-rate добавляют задержку и ответы 503 (проверка повторов).
+Настоящие клиенты направляются на заглушку переменными окружения:
+
+    python -m benchmarks.stub_api --port 8765 &
+    export COINGECKO_URL=http://127.0.0.1:8765/api/v3/simple/price
+    export EXCHANGERATE_API_URL=http://127.0.0.1:8765/v6
+    export EXCHANGERATE_API_KEY=stub
+    python main.py update-rates
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class RandomWalk:
+    """Курсы по ключам, которые сдвигаются раз в tick секунд."""
+
+    def __init__(self, tick: float, volatility: float, seed: int = 0) -> None:
+        self.tick = tick
+        self.volatility = volatility
+        self._random = random.Random(seed)
+        self._rates: Dict[str, float] = {}
+        self._step = 0
+        self.updated = int(time.time())
+        self._lock = threading.Lock()
+
+    def _advance(self) -> None:
+        step = int(time.monotonic() / self.tick) if self.tick > 0 else self._step + 1
+        if step != self._step:
+            for key, rate in self._rates.items():
+                self._rates[key] = rate * math.exp(
+                    self._random.gauss(0, self.volatility)
+                )
+            self._step = step
+            self.updated = int(time.time())
+
+    def get(self, keys: list[str]) -> Dict[str, float]:
+        with self._lock:
+            self._advance()
+            for key in keys:
+                if key not in self._rates:
+                    self._rates[key] = math.exp(self._random.uniform(-3, 10))
+            return {key: self._rates[key] for key in keys}
+
+
+def fiat_codes() -> tuple[str, ...]:
+    """Коды, которые «знает» заглушка ExchangeRate-API: фиат из каталога."""
+    from valutatrade_hub.core.currencies import FiatCurrency, list_currencies
+
+    return tuple(c.code for c in list_currencies(FiatCurrency))
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    server: "StubApiServer"
+    protocol_version = "HTTP/1.1"
+    # заголовки и тело уходят отдельными пакетами: без этого keep-alive
+    # упирается в задержку подтверждений TCP (~40 ms на запрос)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def _send(self, status: int, body: Optional[bytes], etag: str = "") -> None:
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802 (имя задаёт BaseHTTPRequestHandler)
+        server = self.server
+        server.count_request()
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(503, b'{"error": "stub overload"}')
+            return
+
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if url.path.rstrip("/").endswith("/simple/price"):
+            payload = self._coingecko(parse_qs(url.query))
+        elif len(parts) == 4 and parts[0] == "v6" and parts[2] == "latest":
+            payload = self._exchangerate(parts[3].upper())
+        else:
+            self._send(404, b'{"error": "not found"}')
+            return
+
+        body = json.dumps(payload).encode("utf-8")
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, None, etag)
+            return
+        self._send(200, body, etag)
+
+    def _coingecko(self, query: dict) -> dict:
+        ids = [i for i in query.get("ids", [""])[0].split(",") if i]
+        vs = query.get("vs_currencies", ["usd"])[0].lower()
+        rates = self.server.walk.get([f"{i}:{vs}" for i in ids])
+        return {i: {vs: rates[f"{i}:{vs}"]} for i in ids}
+
+    def _exchangerate(self, base: str) -> dict:
+        # курс к USD блуждает, кросс-курсы выводятся из него
+        codes = self.server.fiat_codes
+        rates = self.server.walk.get([f"fx:{c}" for c in codes])
+        usd = {code: rates[f"fx:{code}"] for code in codes}
+        usd["USD"] = 1.0
+        base_usd = usd.get(base)
+        if base_usd is None:
+            return {"result": "error", "error-type": "unsupported-code"}
+        return {
+            "result": "success",
+            "base_code": base,
+            "time_last_update_unix": self.server.walk.updated,
+            "conversion_rates": {
+                code: value / base_usd for code, value in usd.items()
+            },
+        }
+
+
+class StubApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        tick: float = 1.0,
+        volatility: float = 0.001,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+    ) -> None:
+        super().__init__(("127.0.0.1", port), StubApiHandler)
+        self.walk = RandomWalk(tick, volatility)
+        self.fiat_codes = fiat_codes()
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.requests = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count_request(self) -> None:
+        with self._count_lock:
+            self.requests += 1
+
+    def start_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tick", type=float, default=1.0)
+    parser.add_argument("--volatility", type=float, default=0.001)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubApiServer(
+        args.port, args.tick, args.volatility, args.latency_ms, args.error_rate
+    )
+    print(f"stub API: {server.url} (Ctrl+C — остановить)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"обслужено запросов: {server.requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Задержки основных сценариев на синтетических данных 10³–10⁶ записей.
+
+Для каждого масштаба в отдельном процессе генерируются файлы данных
+(benchmarks.datagen) и замеряются register_user, login_user, buy/sell,
+show_portfolio, show_rates, get_rate и RatesUpdater.run_update с
+клиентами-заглушками. По каждой операции: первый (холодный) вызов,
+перцентили задержки, пик памяти (tracemalloc) и байты, записанные за
+операцию. Результаты пишутся в JSON; --compare сравнивает с прошлым
+прогоном и возвращает 1, если медиана выросла больше порога.
+
+Запуск: python -m benchmarks.usecases --scales 1000,10000,100000
+        python -m benchmarks.usecases --output new.json --compare old.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from .datagen import MAX_RATE_PAIRS
+
+# пары, которые «возвращают» заглушки провайдеров
+STUB_PAIRS = {
+    "StubCryptoClient": ("BTC_USD", "ETH_USD", "SOL_USD"),
+    "StubFiatClient": ("EUR_USD", "GBP_USD", "RUB_USD"),
+}
+
+
+def _written_bytes() -> Optional[int]:
+    """Байты, переданные процессом в write() (Linux, /proc/self/io)."""
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _measure(
+    op: Callable[[int], object],
+    iterations: int,
+    budget: float,
+    memory_runs: int,
+) -> dict:
+    """Холодный вызов, затем до iterations вызовов (не дольше budget с)."""
+    started = time.perf_counter()
+    op(0)
+    cold = time.perf_counter() - started
+
+    latencies = []
+    written_before = _written_bytes()
+    deadline = time.perf_counter() + budget
+    for i in range(1, iterations + 1):
+        started = time.perf_counter()
+        op(i)
+        latencies.append(time.perf_counter() - started)
+        if time.perf_counter() > deadline and len(latencies) >= 5:
+            break
+    written_after = _written_bytes()
+
+    # пик памяти меряется отдельно: tracemalloc сильно замедляет вызовы
+    peak = 0
+    tracemalloc.start()
+    for i in range(memory_runs):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        op(iterations + 1 + i)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    n = len(latencies)
+    return {
+        "iterations": n,
+        "cold_ms": round(cold * 1000, 3),
+        "mean_ms": round(sum(latencies) / n * 1000, 3),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p90_ms": round(_percentile(latencies, 90) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "bytes_written_per_op": (
+            None
+            if written_before is None
+            else round((written_after - written_before) / n)
+        ),
+    }
+
+
+def _run_scale(
+    scale: int,
+    iterations: int,
+    budget: float,
+    memory_runs: int,
+    max_pairs: int,
+    results: multiprocessing.Queue,
+) -> None:
+    from valutatrade_hub.core import usecases
+    from valutatrade_hub.core.session import Session
+    from valutatrade_hub.parser_service.api_clients import BaseApiClient
+    from valutatrade_hub.parser_service.config import ParserConfig
+    from valutatrade_hub.parser_service.updater import RatesUpdater
+
+    from .datagen import PASSWORD, generate
+
+    logging.getLogger("valutatrade_hub").setLevel(logging.CRITICAL)
+    started = time.perf_counter()
+    files = generate(Path(os.environ["VALUTA_BASE_DIR"]), scale, max_pairs=max_pairs)
+    generate_s = time.perf_counter() - started
+    if os.environ.get("VALUTA_STORAGE_BACKEND") == "sqlite":
+        from valutatrade_hub.infra.sqlite_db import migrate_from_json
+
+        migrate_from_json()
+
+    rnd = random.Random(scale)
+
+    class _StubClient(BaseApiClient):
+        def __init__(self, name: str) -> None:
+            super().__init__(ParserConfig())
+            self.name = name
+
+        def fetch_rates(self) -> dict:
+            self.last_meta = {"status_code": 200, "request_ms": 0}
+            return {pair: rnd.uniform(0.01, 100000) for pair in STUB_PAIRS[self.name]}
+
+    updater = RatesUpdater([_StubClient(name) for name in STUB_PAIRS])
+    # сделки и отчёты идут от имени user1 в отдельной сессии: login_user
+    # меняет только сессию по умолчанию
+    session = Session.login("user1", PASSWORD)
+    run_id = f"{os.getpid()}"
+
+    ops: dict[str, Callable[[int], object]] = {
+        "register_user": lambda i: usecases.register_user(
+            username=f"new{run_id}_{i}", password=PASSWORD
+        ),
+        "login_user": lambda i: usecases.login_user(
+            username=f"user{rnd.randint(1, scale)}", password=PASSWORD
+        ),
+        "buy_currency": lambda i: usecases.buy_currency(
+            "BTC", 0.01, session=session
+        ),
+        "sell_currency": lambda i: usecases.sell_currency(
+            "BTC", 0.005, session=session
+        ),
+        "show_portfolio": lambda i: usecases.show_portfolio("USD", session=session),
+        "show_rates": lambda i: usecases.show_rates(top=20),
+        "get_rate": lambda i: usecases.get_rate("BTC", "EUR"),
+        "run_update": lambda i: updater.run_update(),
+    }
+    report = {
+        "records": scale,
+        "generate_s": round(generate_s, 2),
+        "files": files,
+        "ops": {},
+    }
+    for name, op in ops.items():
+        report["ops"][name] = _measure(op, iterations, budget, memory_runs)
+    report["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put(report)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    """Операции, у которых медиана выросла больше чем в threshold раз."""
+    regressions = []
+    print(f"\nсравнение с {old['meta'].get('git')} ({old['meta']['created']}):")
+    for scale, report in new["scales"].items():
+        old_report = old["scales"].get(scale)
+        if old_report is None:
+            continue
+        for name, stats in report["ops"].items():
+            old_stats = old_report["ops"].get(name)
+            if old_stats is None or not old_stats["p50_ms"]:
+                continue
+            ratio = stats["p50_ms"] / old_stats["p50_ms"]
+            mark = ""
+            if ratio > threshold:
+                mark = "  <-- регрессия"
+                regressions.append(f"{scale}/{name}")
+            print(
+                f"  {scale:>8} {name:<16}{old_stats['p50_ms']:>10.3f} ->"
+                f"{stats['p50_ms']:>10.3f} ms  x{ratio:.2f}{mark}"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--scales", default="1000,10000,100000")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=5.0,
+        help="не дольше N секунд на операцию (минимум 5 вызовов)",
+    )
+    parser.add_argument("--memory-runs", type=int, default=3)
+    parser.add_argument(
+        "--max-pairs",
+        type=int,
+        default=MAX_RATE_PAIRS,
+        help="предел числа пар в rates.json",
+    )
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", metavar="FILE")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    result = {
+        "meta": {
+            "created": datetime.utcnow().isoformat() + "Z",
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "serializer": os.environ.get("VALUTA_SERIALIZER", "auto"),
+            "iterations": args.iterations,
+            "max_pairs": args.max_pairs,
+        },
+        "scales": {},
+    }
+    ctx = multiprocessing.get_context("spawn")
+    print(
+        f"{'records':>8} {'operation':<16}{'cold ms':>10}{'p50 ms':>10}"
+        f"{'p90 ms':>10}{'p99 ms':>10}{'peak KB':>10}{'B/op':>10}"
+    )
+    for scale in (int(s) for s in args.scales.split(",")):
+        base_dir = tempfile.mkdtemp(prefix=f"valuta-bench-{scale}-")
+        # дочерний процесс (spawn) получает каталог данных через окружение
+        os.environ["VALUTA_BASE_DIR"] = base_dir
+        os.environ["VALUTA_STORAGE_BACKEND"] = args.backend
+        results = ctx.Queue()
+        proc = ctx.Process(
+            target=_run_scale,
+            args=(
+                scale,
+                args.iterations,
+                args.budget,
+                args.memory_runs,
+                args.max_pairs,
+                results,
+            ),
+        )
+        proc.start()
+        report = results.get()
+        proc.join()
+        shutil.rmtree(base_dir, ignore_errors=True)
+        result["scales"][str(scale)] = report
+        for name, stats in report["ops"].items():
+            written = stats["bytes_written_per_op"]
+            print(
+                f"{scale:>8} {name:<16}{stats['cold_ms']:>10.2f}"
+                f"{stats['p50_ms']:>10.3f}{stats['p90_ms']:>10.3f}"
+                f"{stats['p99_ms']:>10.3f}{stats['peak_kb']:>10.1f}"
+                f"{'-' if written is None else written:>10}"
+            )
+        print(f"{scale:>8} max RSS {report['max_rss_kb'] / 1024:.0f} MB")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"результаты: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        regressions = compare(old, result, args.threshold)
+        if regressions:
+            print(f"регрессии (x{args.threshold}+): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
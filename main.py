@@ -1,10 +1,79 @@
-from valutatrade_hub.cli.interface import run_cli
+import argparse
+import sys
+
 from valutatrade_hub.logging_config import configure_logging
 
 
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="project")
+    parser.add_argument(
+        "command",
+        nargs=argparse.REMAINDER,
+        help="выполнить одну команду и выйти, например: buy --currency BTC",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="выполнить команды из файла ('-' — из stdin) без диалога",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=int,
+        default=100,
+        metavar="N",
+        help="сбрасывать изменения на диск каждые N команд (0 — в конце)",
+    )
+    parser.add_argument(
+        "--output",
+        choices=("jsonl", "text"),
+        default="jsonl",
+        help="формат результатов пакетного режима",
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=("text", "json"),
+        default=None,
+        help="формат журнала (по умолчанию VALUTA_LOG_FORMAT или text)",
+    )
+    parser.add_argument(
+        "--stop-on-error",
+        action="store_true",
+        help="остановить пакет на первой ошибке",
+    )
+    return parser.parse_args(argv)
+
+
 def main() -> None:
-    configure_logging()
-    run_cli()
+    args = _parse_args()
+    configure_logging(args.log_format)
+    if args.batch:
+        from valutatrade_hub.cli.batch import run_batch
+
+        if args.batch == "-":
+            failed = run_batch(
+                sys.stdin,
+                sys.stdout,
+                checkpoint_every=args.checkpoint,
+                output_format=args.output,
+                stop_on_error=args.stop_on_error,
+            )
+        else:
+            with open(args.batch, encoding="utf-8") as stream:
+                failed = run_batch(
+                    stream,
+                    sys.stdout,
+                    checkpoint_every=args.checkpoint,
+                    output_format=args.output,
+                    stop_on_error=args.stop_on_error,
+                )
+        sys.exit(1 if failed else 0)
+
+    from valutatrade_hub.cli.interface import run_cli, run_command
+
+    if args.command:
+        sys.exit(run_command(args.command))
+    else:
+        run_cli()
 
 
 if __name__ == "__main__":
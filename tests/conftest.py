@@ -0,0 +1,19 @@
+import pytest
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.infra.database import DatabaseManager
+from valutatrade_hub.infra.metrics import MetricsRegistry
+from valutatrade_hub.infra.settings import SettingsLoader, get_settings
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """Чистый каталог данных и новые синглтоны настроек и хранилища."""
+    monkeypatch.setenv("VALUTA_BASE_DIR", str(tmp_path))
+    monkeypatch.setenv("VALUTA_STORAGE_BACKEND", "json")
+    monkeypatch.setenv("VALUTA_METRICS", "0")
+    monkeypatch.setattr(SettingsLoader, "_instance", None)
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    monkeypatch.setattr(MetricsRegistry, "_instance", None)
+    monkeypatch.setattr(usecases, "_current_session", None)
+    return get_settings()
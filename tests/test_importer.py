@@ -0,0 +1,44 @@
+import io
+
+import pytest
+
+from valutatrade_hub.core.importer import _parse_record, import_users
+from valutatrade_hub.infra.database import DatabaseManager
+
+ROWS = "\n".join(
+    [
+        '{"username": "alice", "password": "secret", "balances": {"USD": 10}}',
+        '{"username": "bob", "password": "secret", "balances": [1, 2]}',
+        '{"username": "carol", "password": "secret", "balances": "USD"}',
+        '{"username": "dave", "password": "secret", "balances": 5}',
+        '{"username": "erin", "password": "secret"}',
+    ]
+)
+
+
+@pytest.mark.parametrize("balances", [[1, 2], "USD", 5, 0, ""])
+def test_malformed_balances_is_value_error(balances):
+    raw = {"username": "bob", "password": "secret", "balances": balances}
+    with pytest.raises(ValueError, match="строка 7"):
+        _parse_record(7, raw)
+
+
+def test_import_rejects_malformed_balances(settings):
+    report = import_users(
+        io.StringIO(ROWS), fmt="jsonl", workers=1, skip_invalid=True
+    )
+
+    assert report.total == 5
+    assert report.imported == 2
+    assert report.rejected == 3
+    assert [error.split(":")[0] for error in report.errors] == [
+        "строка 2",
+        "строка 3",
+        "строка 4",
+    ]
+    assert all(error.count("строка") == 1 for error in report.errors)
+
+    db = DatabaseManager()
+    names = {user.username for user in db.load_users()}
+    assert {"alice", "erin"} <= names
+    assert not names & {"bob", "carol", "dave"}
@@ -0,0 +1,34 @@
+from valutatrade_hub.core.models import Portfolio, Wallet
+from valutatrade_hub.infra.sqlite_db import SqliteDatabase
+
+
+def test_save_portfolio_drops_removed_wallets(settings, monkeypatch):
+    monkeypatch.setattr(SqliteDatabase, "_instance", None)
+    db = SqliteDatabase()
+    db.add_portfolios(
+        [
+            Portfolio(
+                _user_id=1,
+                _wallets={
+                    "USD": Wallet(currency_code="USD", _balance=10.0),
+                    "BTC": Wallet(currency_code="BTC", _balance=1.0),
+                },
+            )
+        ]
+    )
+
+    stored = db.get_portfolio(1)
+    db.save_portfolio(
+        Portfolio(
+            _user_id=1,
+            _wallets={"USD": stored.get_wallet("USD")},
+            _version=stored.version,
+        )
+    )
+    assert set(db.get_portfolio(1).wallets) == {"USD"}
+
+    stored = db.get_portfolio(1)
+    db.save_portfolio(
+        Portfolio(_user_id=1, _wallets={}, _version=stored.version)
+    )
+    assert db.get_portfolio(1).wallets == {}
@@ -0,0 +1,63 @@
+import random
+import threading
+
+from valutatrade_hub.core import usecases
+from valutatrade_hub.core.exceptions import InsufficientFundsError
+from valutatrade_hub.core.session import Session
+from valutatrade_hub.infra.database import DatabaseManager
+
+THREADS = 4
+TRADES = 100
+
+
+def _trade(username: str, seed: int, done: list) -> None:
+    session = Session.login(username, "secret")
+    rnd = random.Random(seed)
+    net = 0.0
+    for _ in range(TRADES):
+        amount = float(rnd.randint(1, 5))
+        try:
+            if rnd.random() < 0.3:
+                usecases.sell_currency("BTC", amount, session=session)
+                net -= amount
+            else:
+                usecases.buy_currency("BTC", amount, session=session)
+                net += amount
+        except InsufficientFundsError:
+            pass
+    done.append(net)
+
+
+def _run_threads(username: str) -> float:
+    done: list = []
+    threads = [
+        threading.Thread(target=_trade, args=(username, seed, done))
+        for seed in range(THREADS)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(done) == THREADS
+    return sum(done)
+
+
+def _btc_balance(username: str) -> float:
+    # новый экземпляр читает контрольную точку и журнал с диска
+    DatabaseManager._instance = None
+    db = DatabaseManager()
+    portfolio = db.get_portfolio(db.get_user(username).user_id)
+    return portfolio.get_wallet("BTC").balance
+
+
+def test_threaded_trades_match_journal(settings):
+    usecases.register_user("trader", "secret")
+    expected = _run_threads("trader")
+    assert _btc_balance("trader") == expected
+
+
+def test_threaded_trades_with_frequent_checkpoints(settings):
+    settings.set("TRADE_JOURNAL_CHECKPOINT_BYTES", 2048)
+    usecases.register_user("trader", "secret")
+    expected = _run_threads("trader")
+    assert _btc_balance("trader") == expected
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import io
+import json
+import shlex
+import time
+from contextlib import redirect_stdout
+from typing import IO, Iterator, List, Optional, Tuple
+
+from ..infra.database import get_db
+from .interface import dispatch
+
+
+def _tokens_from_json(raw: dict) -> List[str]:
+    """{"command": "buy", "args": {"currency": "BTC", "amount": 1}}
+    или {"line": "buy --currency BTC --amount 1"}."""
+    if "line" in raw:
+        return shlex.split(str(raw["line"]))
+    tokens = [str(raw["command"])]
+    for key, value in (raw.get("args") or {}).items():
+        tokens.extend([f"--{key}", str(value)])
+    return tokens
+
+
+def iter_commands(
+    stream: IO[str],
+) -> Iterator[Tuple[int, List[str], Optional[str]]]:
+    """Команды из потока: обычные строки CLI или JSON-объекты (JSONL).
+
+    Строка, которую не удалось разобрать, отдаётся с текстом ошибки и
+    пустым списком токенов, чтобы пакет учёл её как неуспешную команду.
+    """
+    for lineno, line in enumerate(stream, start=1):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        try:
+            if stripped.startswith("{"):
+                tokens = _tokens_from_json(json.loads(stripped))
+            else:
+                tokens = shlex.split(stripped)
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            yield lineno, [], f"{type(exc).__name__}: {exc}"
+            continue
+        if tokens:
+            yield lineno, tokens, None
+
+
+def run_batch(
+    stream: IO[str],
+    out: IO[str],
+    checkpoint_every: int = 100,
+    output_format: str = "jsonl",
+    stop_on_error: bool = False,
+) -> int:
+    """Выполнить команды пакетом; возвращает число команд с ошибкой.
+
+    Данные загружаются один раз, запись на диск откладывается до
+    контрольной точки (каждые ``checkpoint_every`` команд, 0 — только в
+    конце). По каждой команде выводится результат и время выполнения.
+    """
+    db = get_db()
+    db.set_deferred(True)
+    executed = 0
+    failed = 0
+    checkpoints = 0
+    started = time.perf_counter()
+    try:
+        for lineno, tokens, error in iter_commands(stream):
+            buffer = io.StringIO()
+            ok = False
+            keep_going = True
+            t0 = time.perf_counter()
+            if error is None:
+                try:
+                    with redirect_stdout(buffer):
+                        result = dispatch(tokens[0], tokens[1:])
+                    ok, keep_going = result.ok, result.keep_going
+                except Exception as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            executed += 1
+            failed += not ok
+
+            record = {
+                "line": lineno,
+                "command": tokens[0] if tokens else "",
+                "ok": ok,
+                "ms": round(elapsed_ms, 3),
+                "output": buffer.getvalue().rstrip("\n"),
+            }
+            if error is not None:
+                record["error"] = error
+            _emit(out, record, output_format)
+
+            if checkpoint_every > 0 and executed % checkpoint_every == 0:
+                db.flush()
+                checkpoints += 1
+            if not keep_going or (not ok and stop_on_error):
+                break
+    finally:
+        db.set_deferred(False)
+        checkpoints += 1
+
+    summary = {
+        "summary": {
+            "commands": executed,
+            "errors": failed,
+            "checkpoints": checkpoints,
+            "total_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+    }
+    _emit(out, summary, output_format)
+    return failed
+
+
+def _emit(out: IO[str], record: dict, output_format: str) -> None:
+    if output_format == "jsonl":
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+    if "summary" in record:
+        info = record["summary"]
+        out.write(
+            f"Выполнено команд: {info['commands']}, ошибок: {info['errors']}, "
+            f"время: {info['total_ms']:.1f} ms\n"
+        )
+        return
+    status = "OK" if record["ok"] else "ERROR"
+    out.write(
+        f"[{record['line']}] {record['command']} {status} "
+        f"({record['ms']:.2f} ms)\n"
+    )
+    if record["output"]:
+        out.write(record["output"] + "\n")
+    if "error" in record:
+        out.write(record["error"] + "\n")
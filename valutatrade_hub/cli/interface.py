@@ -1,26 +1,60 @@
 from __future__ import annotations
 
 import shlex
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
 
 from ..core.exceptions import (
     ApiRequestError,
+    ConcurrentUpdateError,
     CurrencyNotFoundError,
+    InsufficientFundsError,
 )
+from ..core.session import Session
 from ..core.usecases import (
     buy_currency,
+    get_current_session,
     get_current_username,
     get_rate,
+    import_users,
     login_user,
+    logout_user,
     register_user,
     sell_currency,
-    set_current_username,
+    set_current_session,
+    show_aum_report,
     show_portfolio,
+    show_rate_history,
     show_rates,
+    show_stats,
 )
-from ..parser_service.api_clients import CoinGeckoClient, ExchangeRateApiClient
-from ..parser_service.config import ParserConfig
-from ..parser_service.updater import RatesUpdater
+from ..infra.settings import get_settings
+
+if TYPE_CHECKING:
+    from ..parser_service.scheduler import RatesScheduler
+
+# Сервис парсинга (requests), SQLite и колоночная история импортируются
+# внутри своих команд, чтобы запуск CLI оставался быстрым.
+
+_scheduler: Optional[RatesScheduler] = None
+
+# Ошибки, о которых достаточно сообщить пользователю: команда не выполнена,
+# но сессия продолжается (в пакетном режиме — "ok": false).
+_USER_ERRORS = (
+    ValueError,
+    PermissionError,
+    CurrencyNotFoundError,
+    InsufficientFundsError,
+    ApiRequestError,
+    ConcurrentUpdateError,
+)
+
+
+class CommandResult(NamedTuple):
+    """Итог команды: ok — выполнена без ошибки, keep_going — не выход."""
+
+    ok: bool = True
+    keep_going: bool = True
 
 
 def _parse_options(tokens: List[str]) -> Dict[str, str]:
@@ -45,116 +79,181 @@ def _print_help() -> None:
     print("Доступные команды:")
     print("  register --username NAME --password PASS")
     print("  login --username NAME --password PASS")
+    print(
+        "  import-users --file PATH [--format csv|jsonl] [--workers N] "
+        "[--skip-invalid] [--dry-run]"
+    )
     print("  show-portfolio [--base USD]")
     print("  buy --currency CODE --amount N")
     print("  sell --currency CODE --amount N")
     print("  get-rate --from CODE --to CODE")
-    print("  update-rates [--source coingecko|exchangerate]")
+    print("  update-rates [--source coingecko|exchangerate|synthetic|replay]")
     print("  show-rates [--currency CODE] [--top N]")
+    print("  watch-rates [--currency CODE] [--interval N] [--ticks N]")
+    print("  watch-portfolio [--base USD] [--interval N] [--ticks N]")
+    print(
+        "  rate-history --pair BTC_USD [--from ISO] [--to ISO] "
+        "[--bar 1m|5m|15m|1h|4h|1d] [--limit N]"
+    )
+    print(
+        "  scheduler-start [--source coingecko|exchangerate|synthetic|replay] "
+        "[--interval N] [--foreground]"
+    )
+    print("  scheduler-stop")
+    print("  aum-report [--base USD] [--top N]")
+    print("  migrate-sqlite")
+    print("  sync-columnar")
+    print("  stats [--reset]")
     print("  whoami")
     print("  logout")
     print("  help")
     print("  exit / quit")
 
 
-def _cmd_register(args: List[str]) -> None:
+def _cmd_register(args: List[str]) -> bool:
     opts = _parse_options(args)
     username = opts.get("username", "").strip()
     password = opts.get("password", "").strip()
     if not username:
         print("Укажите --username")
-        return
+        return False
     if not password:
         print("Укажите --password")
-        return
-    msg = register_user(username=username, password=password)
+        return False
+    try:
+        print(register_user(username=username, password=password))
+    except _USER_ERRORS as exc:
+        print(str(exc))
+        return False
+    return True
+
+
+def _cmd_import_users(args: List[str]) -> bool:
+    opts = _parse_options(args)
+    path = opts.get("file", "").strip()
+    if not path:
+        print("Укажите --file (CSV или JSONL, '-' — stdin)")
+        return False
+    workers = None
+    if opts.get("workers"):
+        try:
+            workers = int(opts["workers"])
+        except ValueError:
+            print("'--workers' должно быть целым числом")
+            return False
+    try:
+        msg = import_users(
+            path,
+            fmt=opts.get("format", "").strip().lower() or None,
+            workers=workers,
+            skip_invalid="skip-invalid" in opts,
+            dry_run="dry-run" in opts,
+        )
+    except _USER_ERRORS as exc:
+        print(str(exc))
+        return False
     print(msg)
+    return True
 
 
-def _cmd_login(args: List[str]) -> None:
+def _cmd_login(args: List[str]) -> bool:
     opts = _parse_options(args)
     username = opts.get("username", "").strip()
     password = opts.get("password", "").strip()
     if not username or not password:
         print("Укажите --username и --password")
-        return
-    msg = login_user(username=username, password=password)
-    print(msg)
+        return False
+    try:
+        print(login_user(username=username, password=password))
+    except _USER_ERRORS as exc:
+        print(str(exc))
+        return False
+    return True
 
 
-def _cmd_show_portfolio(args: List[str]) -> None:
+def _cmd_show_portfolio(args: List[str]) -> bool:
     opts = _parse_options(args)
     base = opts.get("base", "USD").strip() or "USD"
     try:
-        msg = show_portfolio(base_currency=base)
-        print(msg)
-    except PermissionError as exc:
+        print(show_portfolio(base_currency=base))
+    except _USER_ERRORS as exc:
         print(str(exc))
+        return False
+    return True
 
 
-def _cmd_buy(args: List[str]) -> None:
+def _cmd_buy(args: List[str]) -> bool:
     opts = _parse_options(args)
     currency = opts.get("currency", "").strip()
     amount_raw = opts.get("amount", "").strip()
     if not currency or not amount_raw:
         print("Укажите --currency и --amount")
-        return
+        return False
     try:
         amount = float(amount_raw)
     except ValueError:
         print("'amount' должен быть числом")
-        return
+        return False
 
     try:
-        msg = buy_currency(currency_code=currency, amount=amount)
-        print(msg)
-    except PermissionError as exc:
+        print(buy_currency(currency_code=currency, amount=amount))
+    except _USER_ERRORS as exc:
         print(str(exc))
+        return False
+    return True
 
 
-def _cmd_sell(args: List[str]) -> None:
+def _cmd_sell(args: List[str]) -> bool:
     opts = _parse_options(args)
     currency = opts.get("currency", "").strip()
     amount_raw = opts.get("amount", "").strip()
     if not currency or not amount_raw:
         print("Укажите --currency и --amount")
-        return
+        return False
     try:
         amount = float(amount_raw)
     except ValueError:
         print("'amount' должен быть числом")
-        return
+        return False
 
     try:
-        msg = sell_currency(currency_code=currency, amount=amount)
-        print(msg)
-    except PermissionError as exc:
+        print(sell_currency(currency_code=currency, amount=amount))
+    except _USER_ERRORS as exc:
         print(str(exc))
+        return False
+    return True
 
 
-def _cmd_get_rate(args: List[str]) -> None:
+def _cmd_get_rate(args: List[str]) -> bool:
     opts = _parse_options(args)
     from_code = opts.get("from", "").strip()
     to_code = opts.get("to", "").strip()
     if not from_code or not to_code:
         print("Укажите --from и --to")
-        return
+        return False
     try:
-        msg = get_rate(from_code=from_code, to_code=to_code)
-        print(msg)
+        print(get_rate(from_code=from_code, to_code=to_code))
     except CurrencyNotFoundError as exc:
         print(str(exc))
         print(
             "Проверьте коды валют или выполните 'show-rates', "
             "чтобы посмотреть доступные пары.",
         )
+        return False
     except ApiRequestError as exc:
         print(str(exc))
+        return False
+    return True
 
 
-def _cmd_update_rates(args: List[str]) -> None:
-    opts = _parse_options(args)
-    source = opts.get("source", "").strip().lower() or "all"
+def _build_clients(source: str) -> list:
+    from ..parser_service.api_clients import (
+        CoinGeckoClient,
+        ExchangeRateApiClient,
+        ReplayApiClient,
+        SyntheticApiClient,
+    )
+    from ..parser_service.config import ParserConfig
 
     config = ParserConfig()
     clients = []
@@ -162,17 +261,38 @@ def _cmd_update_rates(args: List[str]) -> None:
         clients.append(CoinGeckoClient(config))
     if source in ("all", "exchangerate"):
         clients.append(ExchangeRateApiClient(config))
+    # офлайн-источники для нагрузочных тестов, в "all" не входят
+    if source == "synthetic":
+        clients.append(SyntheticApiClient(config))
+    if source == "replay":
+        clients.append(ReplayApiClient(config))
+    return clients
+
 
+def _cmd_update_rates(args: List[str]) -> bool:
+    opts = _parse_options(args)
+    source = opts.get("source", "").strip().lower() or "all"
+
+    try:
+        clients = _build_clients(source)
+    except ApiRequestError as exc:
+        print(str(exc))
+        return False
     if not clients:
-        print("Неизвестный source. Используйте coingecko или exchangerate.")
-        return
+        print(
+            "Неизвестный source. Используйте coingecko, exchangerate, "
+            "synthetic или replay."
+        )
+        return False
+
+    from ..parser_service.updater import RatesUpdater
 
     updater = RatesUpdater(clients)
     try:
         result = updater.run_update()
     except ApiRequestError as exc:
         print(str(exc))
-        return
+        return False
 
     total = result["total_rates"]
     errors = result["errors"]
@@ -181,9 +301,105 @@ def _cmd_update_rates(args: List[str]) -> None:
     else:
         print("Update successful.")
     print(f"Total rates updated: {total}")
+    print(
+        f"Записано изменившихся курсов: {result['written']}, "
+        f"без изменений: {result['unchanged']}"
+    )
+    if result.get("not_modified"):
+        print("Not modified: " + ", ".join(result["not_modified"]))
+    for name, ms in result.get("latency_ms", {}).items():
+        print(f"  {name}: {ms:.0f} ms")
+    return not errors
+
+
+def _cmd_rate_history(args: List[str]) -> bool:
+    opts = _parse_options(args)
+    pair = opts.get("pair", "").strip()
+    if not pair:
+        print("Укажите --pair, например BTC_USD")
+        return False
+    limit_raw = opts.get("limit")
+    limit = None
+    if limit_raw:
+        try:
+            limit = int(limit_raw)
+        except ValueError:
+            print("'--limit' должно быть целым числом")
+            return False
+    msg = show_rate_history(
+        pair=pair,
+        start=opts.get("from", "").strip() or None,
+        end=opts.get("to", "").strip() or None,
+        bar=opts.get("bar", "").strip() or "1h",
+        limit=limit,
+    )
+    print(msg)
+    return True
+
+
+def _cmd_scheduler_start(args: List[str]) -> bool:
+    global _scheduler
+    if _scheduler is not None and _scheduler.running:
+        print("Планировщик уже запущен")
+        return False
+    opts = _parse_options(args)
+    source = opts.get("source", "").strip().lower() or "all"
+    interval_raw = opts.get("interval", "").strip()
+    interval = None
+    if interval_raw:
+        try:
+            interval = float(interval_raw)
+        except ValueError:
+            print("'--interval' должно быть числом секунд")
+            return False
+        if interval <= 0:
+            print("'--interval' должно быть положительным")
+            return False
+
+    try:
+        clients = _build_clients(source)
+    except ApiRequestError as exc:
+        print(str(exc))
+        return False
+    if not clients:
+        print(
+            "Неизвестный source. Используйте coingecko, exchangerate, "
+            "synthetic или replay."
+        )
+        return False
+    if "foreground" in opts:
+        from ..parser_service.scheduler import run_scheduler
+
+        # отдельный процесс-демон: цикл в главном потоке, SIGTERM и
+        # Ctrl+C останавливают его после текущего тика
+        print("Планировщик запущен; Ctrl+C или SIGTERM — остановка")
+        run_scheduler(clients, interval)
+        print("Планировщик остановлен")
+        return True
+
+    from ..parser_service.scheduler import RatesScheduler, build_schedules
+
+    _scheduler = RatesScheduler(build_schedules(clients, interval))
+    _scheduler.start_background()
+    for schedule in _scheduler.schedules:
+        print(
+            f"Планировщик: {schedule.name} "
+            f"каждые {schedule.interval:.0f} с"
+        )
+    return True
 
 
-def _cmd_show_rates(args: List[str]) -> None:
+def _cmd_scheduler_stop() -> bool:
+    if _scheduler is None or not _scheduler.running:
+        print("Планировщик не запущен")
+        return False
+    _scheduler.stop()
+    _scheduler.join()
+    print("Планировщик остановлен")
+    return True
+
+
+def _cmd_show_rates(args: List[str]) -> bool:
     opts = _parse_options(args)
     currency = opts.get("currency")
     top_raw = opts.get("top")
@@ -193,22 +409,185 @@ def _cmd_show_rates(args: List[str]) -> None:
             top = int(top_raw)
         except ValueError:
             print("'--top' должно быть целым числом")
-            return
+            return False
     msg = show_rates(currency=currency, top=top)
     print(msg)
+    return True
+
 
+def _watch_options(opts: Dict[str, str]) -> Optional[tuple]:
+    try:
+        interval = float(opts.get("interval") or 1.0)
+        ticks = int(opts.get("ticks") or 0)
+    except ValueError:
+        print("'--interval' должно быть числом, '--ticks' — целым числом")
+        return None
+    if interval <= 0:
+        print("'--interval' должно быть больше нуля")
+        return None
+    return interval, ticks
+
+
+def _cmd_watch_rates(args: List[str]) -> bool:
+    from .watch import watch_rates
+
+    opts = _parse_options(args)
+    parsed = _watch_options(opts)
+    if parsed is None:
+        return False
+    interval, ticks = parsed
+    try:
+        watch_rates(opts.get("currency"), interval=interval, ticks=ticks)
+    except KeyboardInterrupt:
+        print()
+        print("Наблюдение остановлено")
+    return True
 
-def _cmd_whoami() -> None:
+
+def _cmd_watch_portfolio(args: List[str]) -> bool:
+    from .watch import watch_portfolio
+
+    opts = _parse_options(args)
+    parsed = _watch_options(opts)
+    if parsed is None:
+        return False
+    interval, ticks = parsed
+    base = opts.get("base", "USD").strip() or "USD"
+    try:
+        watch_portfolio(base, interval=interval, ticks=ticks)
+    except PermissionError as exc:
+        print(str(exc))
+        return False
+    except KeyboardInterrupt:
+        print()
+        print("Наблюдение остановлено")
+    return True
+
+
+def _cmd_aum_report(args: List[str]) -> bool:
+    opts = _parse_options(args)
+    base = opts.get("base", "USD").strip() or "USD"
+    top_raw = opts.get("top")
+    top = 10
+    if top_raw:
+        try:
+            top = int(top_raw)
+        except ValueError:
+            print("'--top' должно быть целым числом")
+            return False
+    try:
+        print(show_aum_report(base_currency=base, top=top))
+    except CurrencyNotFoundError as exc:
+        print(str(exc))
+        return False
+    return True
+
+
+def _cmd_migrate_sqlite() -> bool:
+    from ..infra.sqlite_db import migrate_from_json
+
+    counts = migrate_from_json()
+    print(
+        "Данные перенесены в SQLite: "
+        f"пользователей {counts['users']}, "
+        f"портфелей {counts['portfolios']}, "
+        f"курсов {counts['rates']}, "
+        f"записей истории {counts['history']}"
+    )
+    print("Для работы с SQLite задайте VALUTA_STORAGE_BACKEND=sqlite")
+    return True
+
+
+def _cmd_sync_columnar() -> bool:
+    from ..infra.columnar import ColumnarHistory
+    from ..infra.database import get_db
+
+    history = ColumnarHistory()
+    added = history.sync_from(get_db())
+    print(f"Добавлено записей в колоночную историю: {added}")
+    for pair in history.pairs():
+        with history.open_pair(pair) as columns:
+            print(f"  {pair}: {len(columns)}")
+    return True
+
+
+def _cmd_stats(args: List[str]) -> bool:
+    opts = _parse_options(args)
+    print(show_stats(reset="reset" in opts))
+    return True
+
+
+def _cmd_whoami() -> bool:
     username = get_current_username()
     if username:
         print(f"Текущий пользователь: {username}")
     else:
         print("Вы не залогинены")
+    return True
+
+
+def _cmd_logout() -> bool:
+    print(logout_user())
+    return True
+
+
+def dispatch(cmd: str, args: List[str]) -> CommandResult:
+    """Выполнить одну команду и вернуть её итог."""
+    if cmd in ("exit", "quit"):
+        return CommandResult(keep_going=False)
+    ok = True
+    if cmd == "help":
+        _print_help()
+    elif cmd == "register":
+        ok = _cmd_register(args)
+    elif cmd == "login":
+        ok = _cmd_login(args)
+    elif cmd == "import-users":
+        ok = _cmd_import_users(args)
+    elif cmd == "show-portfolio":
+        ok = _cmd_show_portfolio(args)
+    elif cmd == "buy":
+        ok = _cmd_buy(args)
+    elif cmd == "sell":
+        ok = _cmd_sell(args)
+    elif cmd == "get-rate":
+        ok = _cmd_get_rate(args)
+    elif cmd == "update-rates":
+        ok = _cmd_update_rates(args)
+    elif cmd == "show-rates":
+        ok = _cmd_show_rates(args)
+    elif cmd == "watch-rates":
+        ok = _cmd_watch_rates(args)
+    elif cmd == "watch-portfolio":
+        ok = _cmd_watch_portfolio(args)
+    elif cmd == "rate-history":
+        ok = _cmd_rate_history(args)
+    elif cmd == "scheduler-start":
+        ok = _cmd_scheduler_start(args)
+    elif cmd == "scheduler-stop":
+        ok = _cmd_scheduler_stop()
+    elif cmd == "aum-report":
+        ok = _cmd_aum_report(args)
+    elif cmd == "migrate-sqlite":
+        ok = _cmd_migrate_sqlite()
+    elif cmd == "sync-columnar":
+        ok = _cmd_sync_columnar()
+    elif cmd == "stats":
+        ok = _cmd_stats(args)
+    elif cmd == "whoami":
+        ok = _cmd_whoami()
+    elif cmd == "logout":
+        ok = _cmd_logout()
+    else:
+        print("Неизвестная команда. Напишите 'help' для списка.")
+        ok = False
+    return CommandResult(ok=ok)
 
 
-def _cmd_logout() -> None:
-    set_current_username(None)
-    print("Вы вышли из системы")
+def _stop_scheduler() -> None:
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.stop()
+        _scheduler.join()
 
 
 def run_cli() -> None:
@@ -228,32 +607,27 @@ def run_cli() -> None:
             print(f"Ошибка парсинга команды: {exc}")
             continue
 
-        cmd = tokens[0]
-        args = tokens[1:]
-
-        if cmd in ("exit", "quit"):
+        if not dispatch(tokens[0], tokens[1:]).keep_going:
             break
-        if cmd == "help":
-            _print_help()
-        elif cmd == "register":
-            _cmd_register(args)
-        elif cmd == "login":
-            _cmd_login(args)
-        elif cmd == "show-portfolio":
-            _cmd_show_portfolio(args)
-        elif cmd == "buy":
-            _cmd_buy(args)
-        elif cmd == "sell":
-            _cmd_sell(args)
-        elif cmd == "get-rate":
-            _cmd_get_rate(args)
-        elif cmd == "update-rates":
-            _cmd_update_rates(args)
-        elif cmd == "show-rates":
-            _cmd_show_rates(args)
-        elif cmd == "whoami":
-            _cmd_whoami()
-        elif cmd == "logout":
-            _cmd_logout()
-        else:
-            print("Неизвестная команда. Напишите 'help' для списка.")
+
+    _stop_scheduler()
+
+
+def run_command(tokens: List[str]) -> int:
+    """Выполнить одну команду без диалога: project buy --currency BTC ...
+
+    Вход между запусками хранится в файле SESSION_FILE. Возвращает код
+    выхода: 0 — команда выполнена, 1 — ошибка или неизвестная команда.
+    """
+    path = Path(get_settings().get("SESSION_FILE"))
+    restored = Session.restore(path)
+    set_current_session(restored)
+    result = dispatch(tokens[0], tokens[1:])
+    _stop_scheduler()
+
+    session = get_current_session()
+    if session is None or not session.active:
+        path.unlink(missing_ok=True)
+    elif session is not restored:
+        session.save(path)
+    return 0 if result.ok else 1
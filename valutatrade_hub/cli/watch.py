@@ -0,0 +1,222 @@
+"""Режим наблюдения: watch-rates и watch-portfolio.
+
+Между обновлениями процесс спит в ожидании записи в файлы данных
+(inotify) или опрашивает поколение хранилища раз в interval секунд.
+Таблица перерисовывается построчно: только строки, изменившиеся с
+прошлого тика, и строки, с которых снимается подсветка.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from typing import IO, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from ..core.usecases import portfolio_rows, rate_rows
+from ..infra.database import get_db
+from ..infra.watch import make_watcher
+
+GREEN = "\x1b[32m"
+RED = "\x1b[31m"
+RESET = "\x1b[0m"
+
+# значение для сравнения и ячейки строки (без столбца изменения)
+Row = Tuple[float, List[str]]
+
+# сколько ждать события, прежде чем перепроверить поколение
+WAKEUP_SECONDS = 60.0
+
+
+class LiveTable:
+    """Таблица с перерисовкой только изменившихся строк.
+
+    В терминале строки стоят на постоянных позициях экрана и
+    переписываются escape-последовательностями; изменившаяся на этом тике
+    строка подсвечивается (рост — зелёным, падение — красным), на
+    следующем тике подсветка снимается. Вне терминала после первой
+    таблицы печатаются только изменившиеся строки.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        widths: Sequence[int],
+        out: IO[str] = sys.stdout,
+        tty: Optional[bool] = None,
+    ) -> None:
+        self.columns = [*columns, "Изменение"]
+        self.widths = [*widths, 16]
+        self.out = out
+        self.tty = out.isatty() if tty is None else tty
+        self._values: Dict[str, float] = {}
+        self._order: List[str] = []
+        self._highlighted: Dict[str, float] = {}
+        # строк таблицы, записанных последним update (без заголовков)
+        self.redrawn = 0
+
+    def _format(self, cells: Sequence[str]) -> str:
+        return " ".join(
+            str(cell)[:width].ljust(width) for cell, width in zip(cells, self.widths)
+        ).rstrip()
+
+    def _row_text(self, key: str, row: Row, previous: Optional[float]) -> str:
+        value, cells = row
+        change = ""
+        if previous and value != previous:
+            delta = (value - previous) / previous * 100
+            change = f"{'▲' if delta > 0 else '▼'} {delta:+.3f}%"
+        text = self._format([*cells, change])
+        if self.tty and change:
+            text = f"{GREEN if value > previous else RED}{text}{RESET}"
+        return text
+
+    def _move(self, line: int) -> str:
+        return f"\x1b[{line};1H\x1b[2K"
+
+    def update(self, title: str, rows: Dict[str, Row], footer: str) -> None:
+        """Вывести новое состояние; ``{changed}`` в footer — число изменений."""
+        keys = sorted(rows)
+        previous = self._values
+        changed = {k for k in keys if rows[k][0] != previous.get(k)}
+        footer = footer.format(changed=len(changed))
+        w = self.out.write
+        if keys != self._order:
+            # состав строк изменился: таблица рисуется заново
+            self._draw_full(title, keys, rows, previous, footer)
+        elif self.tty:
+            redraw = changed | set(self._highlighted)
+            w(self._move(1) + title)
+            for i, key in enumerate(keys):
+                if key in redraw:
+                    # подсветка снимается: строка без изменения
+                    before = previous.get(key) if key in changed else None
+                    w(self._move(4 + i) + self._row_text(key, rows[key], before))
+            w(self._move(5 + len(keys)) + footer)
+            w(f"\x1b[{6 + len(keys)};1H")
+            self.redrawn = len(redraw)
+        else:
+            stamp = time.strftime("%H:%M:%S")
+            for key in keys:
+                if key in changed:
+                    w(f"{stamp} {self._row_text(key, rows[key], previous[key])}\n")
+            self.redrawn = len(changed)
+        self.out.flush()
+        self._order = keys
+        self._highlighted = {k: previous[k] for k in changed if k in previous}
+        self._values = {k: rows[k][0] for k in keys}
+
+    def _draw_full(
+        self,
+        title: str,
+        keys: List[str],
+        rows: Dict[str, Row],
+        previous: Dict[str, float],
+        footer: str,
+    ) -> None:
+        lines = [title, self._format(self.columns), "-" * sum(self.widths)]
+        lines += [self._row_text(k, rows[k], previous.get(k)) for k in keys]
+        lines += ["", footer]
+        if self.tty:
+            self.out.write("\x1b[H\x1b[2J")
+        self.out.write("\n".join(lines) + "\n")
+        self.redrawn = len(keys)
+
+
+def _watch(
+    kinds: Sequence[str],
+    generation: Callable[[], Hashable],
+    render: Callable[[], None],
+    interval: float,
+    ticks: int,
+) -> int:
+    """Перерисовывать при каждом изменении поколения; вернуть число тиков."""
+    db = get_db()
+    paths = [path for kind in kinds for path in db.watched_files(kind)]
+    watcher = make_watcher(paths, poll_interval=interval)
+    seen: Hashable = None
+    shown = 0
+    try:
+        while True:
+            current = generation()
+            if current != seen:
+                seen = current
+                render()
+                shown += 1
+                if ticks and shown >= ticks:
+                    return shown
+            watcher.wait(WAKEUP_SECONDS)
+    finally:
+        watcher.close()
+
+
+def watch_rates(
+    currency: Optional[str] = None,
+    interval: float = 1.0,
+    ticks: int = 0,
+    out: IO[str] = sys.stdout,
+) -> int:
+    db = get_db()
+    table = LiveTable(
+        ["Пара", "Курс", "Обновлено", "Источник"],
+        [12, 18, 28, 22],
+        out,
+    )
+
+    def generation() -> Hashable:
+        snapshot = db.load_rates_snapshot()
+        return db.rates_generation(), snapshot.get("last_refresh")
+
+    def render() -> None:
+        rows = {
+            pair: (
+                float(info["rate"]),
+                [
+                    pair,
+                    f"{float(info['rate']):.6f}",
+                    info.get("updated_at") or "-",
+                    info.get("source") or "-",
+                ],
+            )
+            for pair, info in rate_rows(currency)
+        }
+        last_refresh = db.load_rates_snapshot().get("last_refresh")
+        table.update(
+            f"Курсы (обновлено {last_refresh}); Ctrl+C — выход",
+            rows,
+            f"{time.strftime('%H:%M:%S')}: изменилось строк {{changed}}",
+        )
+
+    return _watch(["rates"], generation, render, interval, ticks)
+
+
+def watch_portfolio(
+    base_currency: str = "USD",
+    interval: float = 1.0,
+    ticks: int = 0,
+    out: IO[str] = sys.stdout,
+) -> int:
+    db = get_db()
+    base = base_currency.upper()
+    table = LiveTable(
+        ["Валюта", "Баланс", f"Стоимость в {base}"],
+        [10, 20, 24],
+        out,
+    )
+
+    def generation() -> Hashable:
+        return db.accounts_generation(), db.rates_generation()
+
+    def render() -> None:
+        wallets = portfolio_rows(base)
+        rows = {
+            code: (value, [code, f"{balance:.4f}", f"{value:,.2f} {base}"])
+            for code, balance, value in wallets
+        }
+        total = sum(value for _, _, value in wallets)
+        table.update(
+            f"Портфель: ИТОГО {total:,.2f} {base}; Ctrl+C — выход",
+            rows,
+            f"{time.strftime('%H:%M:%S')}: изменилось строк {{changed}}",
+        )
+
+    return _watch(["accounts", "rates"], generation, render, interval, ticks)
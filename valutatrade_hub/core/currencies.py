@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import logging
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Dict
+from pathlib import Path
+from typing import Dict, List, Optional, Type
 
 from .exceptions import CurrencyNotFoundError
 
+logger = logging.getLogger(__name__)
+
 
 class Currency(ABC):
     """Базовый класс валюты."""
@@ -47,6 +51,7 @@ class FiatCurrency(Currency):
 class CryptoCurrency(Currency):
     algorithm: str = "Unknown"
     market_cap: float = 0.0
+    coingecko_id: str = ""
 
     def __init__(
         self,
@@ -54,10 +59,12 @@ class CryptoCurrency(Currency):
         code: str,
         algorithm: str,
         market_cap: float,
+        coingecko_id: str = "",
     ) -> None:
         super().__init__(name=name, code=code)
         self.algorithm = algorithm
         self.market_cap = market_cap
+        self.coingecko_id = coingecko_id
 
     def get_display_info(self) -> str:
         return (
@@ -69,14 +76,108 @@ _CURRENCY_REGISTRY: Dict[str, Currency] = {
     "USD": FiatCurrency("US Dollar", "USD", "United States"),
     "EUR": FiatCurrency("Euro", "EUR", "Eurozone"),
     "RUB": FiatCurrency("Russian Ruble", "RUB", "Russia"),
-    "BTC": CryptoCurrency("Bitcoin", "BTC", "SHA-256", 1.12e12),
-    "ETH": CryptoCurrency("Ethereum", "ETH", "Ethash", 4.5e11),
-    "SOL": CryptoCurrency("Solana", "SOL", "Proof-of-History", 8.0e10),
+    "BTC": CryptoCurrency("Bitcoin", "BTC", "SHA-256", 1.12e12, "bitcoin"),
+    "ETH": CryptoCurrency("Ethereum", "ETH", "Ethash", 4.5e11, "ethereum"),
+    "SOL": CryptoCurrency("Solana", "SOL", "Proof-of-History", 8.0e10, "solana"),
 }
+_catalog_loaded = False
+
+
+def register_currency(currency: Currency) -> None:
+    _CURRENCY_REGISTRY[currency.code] = currency
+
+
+def _read_catalog(path: Optional[str]) -> Optional[dict]:
+    """Каталог из каталога данных, если он там есть, иначе встроенный."""
+    from importlib import resources
+
+    from ..infra.serialization import decode, read_file
+
+    if path and Path(path).exists():
+        return read_file(path)
+    try:
+        bundled = resources.files(__package__).joinpath("assets.json")
+        return decode(bundled.read_bytes())
+    except (FileNotFoundError, ModuleNotFoundError):
+        return None
+
+
+def load_asset_catalog(path: Optional[str] = None) -> int:
+    """Зарегистрировать валюты из каталога; вернуть их число.
+
+    Каталог — JSON с разделами ``fiat`` (код -> name, country) и
+    ``crypto`` (код -> name, coingecko_id, algorithm, market_cap).
+    Файл ASSETS_FILE в каталоге данных заменяет каталог, поставляемый с
+    пакетом. Без каталога остаются встроенные валюты.
+    """
+    from ..infra.settings import get_settings
+
+    path = path or get_settings().get("ASSETS_FILE")
+    catalog = _read_catalog(path)
+    if not catalog:
+        logger.warning(
+            "Asset catalog not found (%s, bundled assets.json); "
+            "only built-in currencies are available",
+            path,
+        )
+        return 0
+    count = 0
+    for code, info in (catalog.get("fiat") or {}).items():
+        try:
+            register_currency(
+                FiatCurrency(info["name"], code, info.get("country", "Unknown"))
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning("Skipping fiat %r in asset catalog: %s", code, exc)
+            continue
+        count += 1
+    for code, info in (catalog.get("crypto") or {}).items():
+        try:
+            register_currency(
+                CryptoCurrency(
+                    info["name"],
+                    code,
+                    info.get("algorithm", "Unknown"),
+                    float(info.get("market_cap", 0.0)),
+                    info.get("coingecko_id", ""),
+                )
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning("Skipping crypto %r in asset catalog: %s", code, exc)
+            continue
+        count += 1
+    return count
+
+
+def _ensure_catalog() -> None:
+    global _catalog_loaded
+    if not _catalog_loaded:
+        _catalog_loaded = True
+        load_asset_catalog()
+
+
+def list_currencies(kind: Type[Currency] = Currency) -> List[Currency]:
+    """Все известные валюты (или только заданного типа) в порядке кодов."""
+    _ensure_catalog()
+    return [
+        currency
+        for _, currency in sorted(_CURRENCY_REGISTRY.items())
+        if isinstance(currency, kind)
+    ]
+
+
+def coingecko_ids() -> Dict[str, str]:
+    """Код криптовалюты -> id CoinGecko для всех валют с известным id."""
+    return {
+        c.code: c.coingecko_id
+        for c in list_currencies(CryptoCurrency)
+        if isinstance(c, CryptoCurrency) and c.coingecko_id
+    }
 
 
 def get_currency(code: str) -> Currency:
     """Получить объект валюты по коду или кинуть CurrencyNotFoundError."""
+    _ensure_catalog()
     normalized = code.upper()
     currency = _CURRENCY_REGISTRY.get(normalized)
     if not currency:
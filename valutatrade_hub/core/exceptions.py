@@ -22,3 +22,13 @@ class ApiRequestError(Exception):
         msg = f"Ошибка при обращении к внешнему API: {reason}"
         super().__init__(msg)
         self.reason = reason
+
+
+class ConcurrentUpdateError(Exception):
+    def __init__(self, resource: str) -> None:
+        msg = (
+            f"Данные '{resource}' изменены другим процессом, "
+            "операцию нужно повторить"
+        )
+        super().__init__(msg)
+        self.resource = resource
@@ -0,0 +1,220 @@
+"""Массовый импорт пользователей и начальных балансов.
+
+Файл читается потоком и проверяется целиком до записи: имена (пустые,
+повторы в файле, занятые), пароли, коды валют и балансы. Затем id
+выделяются одним диапазоном из постоянной последовательности, пароли
+хешируются (на больших файлах — в нескольких процессах), а пользователи
+и портфели записываются по одной записи на файл.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from ..infra.database import BaseRepository, get_db
+from .exceptions import CurrencyNotFoundError
+from .models import Portfolio, User, Wallet
+from .utils import validate_currency_code
+
+FORMATS = ("csv", "jsonl")
+
+# Пароль хешируется одним sha256 (~3 мкс), поэтому пул процессов
+# окупает запуск и передачу данных только на очень больших файлах.
+PARALLEL_MIN_ROWS = 200_000
+CHUNK_SIZE = 20_000
+
+# сообщений об ошибках в отчёте не больше этого числа
+MAX_REPORTED_ERRORS = 20
+
+
+@dataclass
+class ImportRow:
+    line: int
+    username: str
+    password: str
+    balances: Dict[str, float]
+
+
+@dataclass
+class ImportReport:
+    """Итог импорта: сколько записано и какие строки отклонены."""
+
+    total: int = 0
+    imported: int = 0
+    first_id: Optional[int] = None
+    last_id: Optional[int] = None
+    errors: List[str] = field(default_factory=list)
+    rejected: int = 0
+    seconds: float = 0.0
+
+    def reject(self, line: int, reason: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            prefix = f"строка {line}: "
+            if not reason.startswith(prefix):
+                reason = prefix + reason
+            self.errors.append(reason)
+
+
+def detect_format(path: str) -> str:
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def iter_records(stream: IO[str], fmt: str) -> Iterator[Tuple[int, dict]]:
+    """(номер строки, {"username", "password", "balances"}) из CSV или JSONL.
+
+    В CSV кроме username и password каждый столбец — код валюты с
+    начальным балансом (пустая ячейка — без кошелька).
+    """
+    if fmt == "jsonl":
+        for lineno, line in enumerate(stream, start=1):
+            stripped = line.strip()
+            if stripped and not stripped.startswith("#"):
+                try:
+                    yield lineno, json.loads(stripped)
+                except json.JSONDecodeError as exc:
+                    yield lineno, {"error": f"некорректный JSON ({exc.msg})"}
+        return
+
+    reader = csv.DictReader(stream)
+    for row in reader:
+        balances = {
+            code: value
+            for code, value in row.items()
+            if code not in ("username", "password") and code and value
+        }
+        yield reader.line_num, {
+            "username": row.get("username"),
+            "password": row.get("password"),
+            "balances": balances,
+        }
+
+
+def _parse_record(line: int, raw: Any) -> ImportRow:
+    if not isinstance(raw, dict):
+        raise ValueError("строка должна быть JSON-объектом")
+    if "error" in raw:
+        raise ValueError(raw["error"])
+    username = str(raw.get("username") or "").strip()
+    password = str(raw.get("password") or "")
+    if not username:
+        raise ValueError("Имя пользователя не может быть пустым")
+    if len(password) < 4:
+        raise ValueError("Пароль должен быть не короче 4 символов")
+    given = raw.get("balances")
+    if given is None:
+        given = {}
+    if not isinstance(given, dict):
+        raise ValueError(
+            f"строка {line}: balances должно быть объектом "
+            f"{{код: сумма}}, а не {type(given).__name__}"
+        )
+    balances: Dict[str, float] = {}
+    for code, value in given.items():
+        code = validate_currency_code(str(code).strip())
+        try:
+            amount = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Баланс {code} должен быть числом") from None
+        if amount < 0:
+            raise ValueError(f"Баланс {code} не может быть отрицательным")
+        balances[code] = amount
+    return ImportRow(line, username, password, balances)
+
+
+def _hash_chunk(items: List[Tuple[int, str, str]]) -> List[dict]:
+    # выполняется в процессе пула: возвращает готовые записи users.json
+    return [User.create(uid, name, pw).to_json() for uid, name, pw in items]
+
+
+def _create_users(
+    items: List[Tuple[int, str, str]],
+    workers: int,
+) -> List[User]:
+    if workers <= 1 or len(items) < PARALLEL_MIN_ROWS:
+        return [User.create(uid, name, pw) for uid, name, pw in items]
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    # spawn: в родителе работают потоки журнала, fork с ними небезопасен
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        return [
+            User.from_json(data)
+            for chunk in pool.map(_hash_chunk, chunks)
+            for data in chunk
+        ]
+
+
+def import_users(
+    stream: IO[str],
+    fmt: str = "csv",
+    workers: Optional[int] = None,
+    skip_invalid: bool = False,
+    dry_run: bool = False,
+    db: Optional[BaseRepository] = None,
+) -> ImportReport:
+    """Импортировать пользователей из потока.
+
+    Если в файле есть ошибки, по умолчанию ничего не записывается;
+    ``skip_invalid`` пропускает ошибочные строки и импортирует остальные.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Формат должен быть одним из: {', '.join(FORMATS)}")
+    db = db or get_db()
+    started = time.perf_counter()
+    report = ImportReport()
+
+    rows: List[ImportRow] = []
+    seen: set[str] = set()
+    # занятые имена — одним чтением, а не запросом на каждую строку
+    taken = {user.username for user in db.load_users()}
+    for line, raw in iter_records(stream, fmt):
+        report.total += 1
+        try:
+            row = _parse_record(line, raw)
+        except (ValueError, CurrencyNotFoundError) as exc:
+            report.reject(line, str(exc))
+            continue
+        if row.username in seen:
+            report.reject(line, f"имя '{row.username}' повторяется в файле")
+            continue
+        if row.username in taken:
+            report.reject(line, f"имя '{row.username}' уже занято")
+            continue
+        seen.add(row.username)
+        rows.append(row)
+
+    if not rows or dry_run or (report.rejected and not skip_invalid):
+        report.seconds = time.perf_counter() - started
+        return report
+
+    ids = db.reserve_user_ids(len(rows))
+    users = _create_users(
+        [(uid, row.username, row.password) for uid, row in zip(ids, rows)],
+        workers or os.cpu_count() or 1,
+    )
+    portfolios = [
+        Portfolio(
+            _user_id=uid,
+            _wallets={
+                code: Wallet(currency_code=code, _balance=amount)
+                for code, amount in row.balances.items()
+            },
+        )
+        for uid, row in zip(ids, rows)
+    ]
+    db.add_users(users)
+    db.add_portfolios(portfolios)
+
+    report.imported = len(users)
+    report.first_id, report.last_id = ids[0], ids[-1]
+    report.seconds = time.perf_counter() - started
+    return report
@@ -7,6 +7,7 @@ from datetime import datetime
 from typing import Dict
 
 from .exceptions import InsufficientFundsError
+from .rate_engine import RateMatrix
 
 
 def _hash_password(password: str, salt: str) -> str:
@@ -159,15 +160,36 @@ class Wallet:
 class Portfolio:
     _user_id: int
     _wallets: Dict[str, Wallet]
+    # растёт при каждом сохранении; по нему ловятся конкурентные записи
+    _version: int = 0
 
     @property
     def user_id(self) -> int:
         return self._user_id
 
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @version.setter
+    def version(self, value: int) -> None:
+        self._version = int(value)
+
     @property
     def wallets(self) -> Dict[str, Wallet]:
         return dict(self._wallets)
 
+    def copy(self) -> "Portfolio":
+        """Независимая копия: кошельки не разделяются с оригиналом."""
+        return Portfolio(
+            _user_id=self._user_id,
+            _wallets={
+                code: Wallet(currency_code=code, _balance=w.balance)
+                for code, w in self._wallets.items()
+            },
+            _version=self._version,
+        )
+
     def add_currency(self, currency_code: str) -> Wallet:
         code = currency_code.upper()
         if code in self._wallets:
@@ -181,21 +203,23 @@ class Portfolio:
 
     def get_total_value(
         self,
-        exchange_rates: dict,
+        exchange_rates: "dict | RateMatrix",
         base_currency: str = "USD",
     ) -> float:
+        """Стоимость портфеля в базовой валюте.
+
+        ``exchange_rates`` — готовая RateMatrix или словарь пар снимка.
+        """
+        if isinstance(exchange_rates, RateMatrix):
+            matrix = exchange_rates
+        else:
+            matrix = RateMatrix.from_pairs(exchange_rates)
         total = 0.0
         base = base_currency.upper()
         for code, wallet in self._wallets.items():
-            if code == base:
-                total += wallet.balance
-                continue
-            pair = f"{code}_{base}"
-            rate_info = exchange_rates.get(pair)
-            if not rate_info:
-                continue
-            rate = float(rate_info["rate"])
-            total += wallet.balance * rate
+            value = matrix.convert(wallet.balance, code, base)
+            if value is not None:
+                total += value
         return total
 
     def to_json(self) -> dict:
@@ -206,6 +230,7 @@ class Portfolio:
         return {
             "user_id": self._user_id,
             "wallets": wallets_data,
+            "version": self._version,
         }
 
     @classmethod
@@ -214,4 +239,8 @@ class Portfolio:
         wallets: Dict[str, Wallet] = {}
         for code, wallet_data in wallets_raw.items():
             wallets[code.upper()] = Wallet.from_json(code, wallet_data)
-        return cls(_user_id=int(data["user_id"]), _wallets=wallets)
+        return cls(
+            _user_id=int(data["user_id"]),
+            _wallets=wallets,
+            _version=int(data.get("version", 0)),
+        )
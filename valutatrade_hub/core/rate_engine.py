@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from .utils import parse_timestamp
+
+
+def _oldest(*stamps: Optional[str]) -> Optional[str]:
+    """Самая ранняя из отметок времени (по времени, а не по строке)."""
+    return min(filter(None, stamps), key=parse_timestamp, default=None)
+
+
+class RateMatrix:
+    """Кросс-курсы валюта×валюта без плотной матрицы.
+
+    Строится один раз по снимку ``pairs`` за O(пар): прямые пары и
+    обратные к ним хранятся словарём, для остальных валют — курс к опорной
+    (самой связанной, при равенстве — USD), найденный обходом в ширину.
+    Любой кросс-курс — поиск O(1): прямая котировка, если она есть, иначе
+    ``to_pivot[a] / to_pivot[b]``.
+    """
+
+    def __init__(
+        self,
+        direct: Dict[str, Dict[str, Tuple[float, Optional[str]]]],
+        to_pivot: Dict[str, Tuple[float, Optional[str]]],
+        pivot: Optional[str],
+    ) -> None:
+        self.direct = direct
+        self.to_pivot = to_pivot
+        self.pivot = pivot
+
+    @classmethod
+    def from_pairs(cls, pairs: dict) -> "RateMatrix":
+        edges: Dict[str, Dict[str, Tuple[float, Optional[str]]]] = {}
+        for pair, info in pairs.items():
+            if "_" not in pair:
+                continue
+            src, dst = pair.split("_", maxsplit=1)
+            rate = float(info["rate"])
+            if rate <= 0:
+                continue
+            ts = info.get("updated_at")
+            edges.setdefault(src, {})[dst] = (rate, ts)
+            # обратное ребро не перетирает явно заданную обратную пару
+            edges.setdefault(dst, {}).setdefault(src, (1.0 / rate, ts))
+        if not edges:
+            return cls(edges, {}, None)
+
+        pivot = max(sorted(edges), key=lambda c: (len(edges[c]), c == "USD"))
+
+        # курс каждой валюты к опорной (обход в ширину)
+        to_pivot: Dict[str, Tuple[float, Optional[str]]] = {
+            pivot: (1.0, None)
+        }
+        queue = deque([pivot])
+        while queue:
+            node = queue.popleft()
+            node_rate, node_ts = to_pivot[node]
+            for neighbour, (rate, ts) in edges[node].items():
+                if neighbour in to_pivot:
+                    continue
+                # neighbour -> node = 1 / (node -> neighbour)
+                to_pivot[neighbour] = (node_rate / rate, _oldest(node_ts, ts))
+                queue.append(neighbour)
+
+        return cls(edges, to_pivot, pivot)
+
+    def rate(self, from_code: str, to_code: str) -> Optional[float]:
+        if from_code == to_code:
+            return 1.0
+        # прямые котировки точнее триангуляции
+        quote = self.direct.get(from_code, {}).get(to_code)
+        if quote is not None:
+            return quote[0]
+        a = self.to_pivot.get(from_code)
+        b = self.to_pivot.get(to_code)
+        if a is None or b is None:
+            return None
+        return a[0] / b[0]
+
+    def updated_at(self, from_code: str, to_code: str) -> Optional[str]:
+        if from_code == to_code:
+            return None
+        quote = self.direct.get(from_code, {}).get(to_code)
+        if quote is not None:
+            return quote[1]
+        a = self.to_pivot.get(from_code)
+        b = self.to_pivot.get(to_code)
+        if a is None or b is None:
+            return None
+        return _oldest(a[1], b[1])
+
+    def convert(
+        self,
+        amount: float,
+        from_code: str,
+        to_code: str,
+    ) -> Optional[float]:
+        rate = self.rate(from_code, to_code)
+        return None if rate is None else amount * rate
+
+
+_matrix_cache: Optional[Tuple[int, RateMatrix]] = None
+
+
+def get_rate_matrix(pairs: dict, generation: int) -> RateMatrix:
+    """Кросс-курсы для снимка; перестраиваются только при смене поколения."""
+    global _matrix_cache
+    if _matrix_cache is None or _matrix_cache[0] != generation:
+        _matrix_cache = (generation, RateMatrix.from_pairs(pairs))
+    return _matrix_cache[1]
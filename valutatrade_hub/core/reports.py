@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from .models import Portfolio, Wallet
+from .rate_engine import RateMatrix
+
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен: без него работает обычный цикл
+    np = None
+
+
+@dataclass
+class AumReport:
+    """Сводка активов под управлением в базовой валюте."""
+
+    base: str
+    total: float
+    per_currency: Dict[str, Tuple[float, float]]
+    per_user: Dict[int, float]
+    unpriced: List[str] = field(default_factory=list)
+
+    def top_holders(self, top: int = 10) -> List[Tuple[int, float]]:
+        ranked = sorted(self.per_user.items(), key=lambda x: x[1], reverse=True)
+        return ranked[:top]
+
+
+def _rate_vector(
+    matrix: RateMatrix,
+    codes: Sequence[str],
+    base: str,
+) -> Tuple[List[float], List[str]]:
+    rates: List[float] = []
+    unpriced: List[str] = []
+    for code in codes:
+        rate = matrix.rate(code, base)
+        if rate is None:
+            unpriced.append(code)
+            rate = 0.0
+        rates.append(rate)
+    return rates, unpriced
+
+
+def _currency_codes(wallets: Iterable[Dict[str, Wallet]]) -> List[str]:
+    codes = set()
+    for w in wallets:
+        codes.update(w)
+    return sorted(codes)
+
+
+def value_portfolios(
+    portfolios: Sequence[Portfolio],
+    matrix: RateMatrix,
+    base_currency: str = "USD",
+) -> AumReport:
+    """Оценить все портфели разом.
+
+    С numpy кошельки упаковываются в разреженные массивы (пользователь,
+    валюта, баланс) без плотной матрицы пользователи×валюты, а суммы по
+    пользователям и валютам считает bincount.
+    """
+    if np is None:
+        return value_portfolios_loop(portfolios, matrix, base_currency)
+
+    base = base_currency.upper()
+    wallets = [p.wallets for p in portfolios]
+    codes = _currency_codes(wallets)
+    col = {code: j for j, code in enumerate(codes)}
+    rates, unpriced = _rate_vector(matrix, codes, base)
+
+    counts = np.fromiter(map(len, wallets), dtype=np.intp, count=len(wallets))
+    size = int(counts.sum())
+    rows = np.repeat(np.arange(len(wallets)), counts)
+    cols = np.fromiter(
+        (col[code] for w in wallets for code in w),
+        dtype=np.intp,
+        count=size,
+    )
+    balances = np.fromiter(
+        (wallet.balance for w in wallets for wallet in w.values()),
+        dtype=np.float64,
+        count=size,
+    )
+    valued = balances * np.asarray(rates, dtype=np.float64)[cols]
+
+    user_totals = np.bincount(rows, weights=valued, minlength=len(wallets))
+    currency_balances = np.bincount(cols, weights=balances, minlength=len(codes))
+    currency_values = np.bincount(cols, weights=valued, minlength=len(codes))
+
+    return AumReport(
+        base=base,
+        total=float(user_totals.sum()),
+        per_currency={
+            code: (float(currency_balances[j]), float(currency_values[j]))
+            for code, j in col.items()
+        },
+        per_user={
+            p.user_id: float(user_totals[i]) for i, p in enumerate(portfolios)
+        },
+        unpriced=unpriced,
+    )
+
+
+def value_portfolios_loop(
+    portfolios: Sequence[Portfolio],
+    matrix: RateMatrix,
+    base_currency: str = "USD",
+) -> AumReport:
+    """Эталонная оценка по одному портфелю (без numpy)."""
+    base = base_currency.upper()
+    codes = _currency_codes(p.wallets for p in portfolios)
+    rates, unpriced = _rate_vector(matrix, codes, base)
+    rate_of = dict(zip(codes, rates))
+
+    per_currency = {code: (0.0, 0.0) for code in codes}
+    per_user: Dict[int, float] = {}
+    for p in portfolios:
+        per_user[p.user_id] = p.get_total_value(matrix, base)
+        for code, wallet in p.wallets.items():
+            balance, value = per_currency[code]
+            per_currency[code] = (
+                balance + wallet.balance,
+                value + wallet.balance * rate_of[code],
+            )
+
+    return AumReport(
+        base=base,
+        total=sum(per_user.values()),
+        per_currency=per_currency,
+        per_user=per_user,
+        unpriced=unpriced,
+    )
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from ..infra.database import BaseRepository, get_db
+from ..infra.serialization import read_file, write_file
+from ..infra.settings import get_settings
+from .models import Portfolio, User
+from .utils import parse_timestamp
+
+
+def _credential(user: User) -> str:
+    """Отпечаток учётных данных: после смены пароля или пересоздания
+    пользователя сохранённый вход недействителен."""
+    raw = f"{user.salt}:{user.hashed_password}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+class Session:
+    """Сессия вошедшего пользователя.
+
+    Держит объект User и портфель пользователя, поэтому команды не ищут
+    их в хранилище заново. Кеш сбрасывается, когда меняется поколение
+    данных хранилища (в том числе из-за записи другим процессом). В одном
+    процессе может быть несколько независимых сессий.
+    """
+
+    def __init__(self, user: User, db: Optional[BaseRepository] = None) -> None:
+        self.db = db or get_db()
+        self.user_id = user.user_id
+        self._user: Optional[User] = user
+        self._portfolio: Optional[Portfolio] = None
+        self._generation = self.db.accounts_generation()
+        self._active = True
+
+    @classmethod
+    def login(
+        cls,
+        username: str,
+        password: str,
+        db: Optional[BaseRepository] = None,
+    ) -> "Session":
+        """Проверить пароль и открыть сессию; ValueError при ошибке."""
+        db = db or get_db()
+        user = db.get_user(username)
+        if not user:
+            raise ValueError(f"Пользователь '{username}' не найден")
+        if not user.verify_password(password):
+            raise ValueError("Неверный пароль")
+        return cls(user, db)
+
+    @classmethod
+    def restore(
+        cls,
+        path: Path,
+        db: Optional[BaseRepository] = None,
+    ) -> Optional["Session"]:
+        """Сессия из файла, сохранённого save().
+
+        None, если входа не было, срок истёк, файл повреждён или
+        пользователь в users.json не совпадает с сохранённым.
+        """
+        try:
+            data = read_file(path)
+            user_id = int(data["user_id"])
+            expires_at = parse_timestamp(data["expires_at"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if expires_at <= datetime.utcnow():
+            return None
+        db = db or get_db()
+        user = db.get_user_by_id(user_id)
+        if (
+            user is None
+            or user.username != data.get("username")
+            or _credential(user) != data.get("credential")
+        ):
+            return None
+        return cls(user, db)
+
+    def save(self, path: Path) -> None:
+        """Запомнить вход для следующих запусков CLI (без пароля) на
+        SESSION_TTL секунд."""
+        issued_at = datetime.utcnow()
+        ttl = timedelta(seconds=float(get_settings().get("SESSION_TTL")))
+        write_file(
+            path,
+            {
+                "user_id": self.user_id,
+                "username": self.username,
+                "credential": _credential(self.user),
+                "issued_at": issued_at.isoformat(),
+                "expires_at": (issued_at + ttl).isoformat(),
+            },
+            schema="session",
+        )
+
+    def _check(self) -> None:
+        if not self._active:
+            raise PermissionError("Сначала выполните login")
+        generation = self.db.accounts_generation()
+        if generation != self._generation:
+            self.invalidate()
+            self._generation = generation
+
+    def invalidate(self) -> None:
+        """Сбросить закешированные объекты; следующий доступ перечитает их."""
+        self._user = None
+        self._portfolio = None
+
+    def close(self) -> None:
+        self.invalidate()
+        self._active = False
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    @property
+    def user(self) -> User:
+        self._check()
+        if self._user is None:
+            user = self.db.get_user_by_id(self.user_id)
+            if user is None:
+                # пользователя удалили — сессия больше не действительна
+                self.close()
+                raise PermissionError("Сначала выполните login")
+            self._user = user
+        return self._user
+
+    @property
+    def username(self) -> str:
+        return self.user.username
+
+    @property
+    def portfolio(self) -> Portfolio:
+        """Снимок портфеля пользователя; пустой, если его ещё нет в хранилище.
+
+        Снимок — собственная копия сессии, общая только с ней: изменения
+        идут через хранилище (save_wallet), а новая версия портфеля в
+        хранилище заменяет снимок при следующем обращении.
+        """
+        self._check()
+        stored = self.db.get_portfolio(self.user_id)
+        if stored is None:
+            if self._portfolio is None or self._portfolio.version:
+                self._portfolio = Portfolio(_user_id=self.user_id, _wallets={})
+        elif self._portfolio is None or self._portfolio.version != stored.version:
+            self._portfolio = stored.copy()
+        return self._portfolio
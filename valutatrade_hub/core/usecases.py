@@ -1,74 +1,64 @@
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional, Tuple
 
-from prettytable import PrettyTable
-
-from ..decorators import log_action
+from ..decorators import log_action, retry_on_conflict
 from ..infra.database import get_db
+from ..infra.metrics import get_metrics
 from ..infra.settings import get_settings
 from .exceptions import (
     ApiRequestError,
+    ConcurrentUpdateError,
     CurrencyNotFoundError,
     InsufficientFundsError,
 )
-from .models import User, Portfolio
+from .models import Portfolio, User, Wallet
+from .rate_engine import RateMatrix, get_rate_matrix
+from .session import Session
 from .utils import validate_currency_code
 
-_current_username: Optional[str] = None
-
+# prettytable, numpy (через reports) и индекс истории импортируются внутри
+# команд: короткий запуск CLI не должен платить за неиспользуемые модули.
 
-def get_current_username() -> Optional[str]:
-    return _current_username
+# Сессия по умолчанию (интерактивный CLI); команды принимают и явную.
+_current_session: Optional[Session] = None
 
 
-def set_current_username(username: Optional[str]) -> None:
-    global _current_username
-    _current_username = username
+def get_current_session() -> Optional[Session]:
+    return _current_session
 
 
-def _find_user_by_name(users: list[User], username: str) -> Optional[User]:
-    for u in users:
-        if u.username == username:
-            return u
-    return None
+def set_current_session(session: Optional[Session]) -> None:
+    global _current_session
+    if _current_session is not None and _current_session is not session:
+        _current_session.close()
+    _current_session = session
 
 
-def _find_portfolio_by_user_id(
-    portfolios: list[Portfolio],
-    user_id: int,
-) -> Optional[Portfolio]:
-    for p in portfolios:
-        if p.user_id == user_id:
-            return p
-    return None
+def get_current_username() -> Optional[str]:
+    session = get_current_session()
+    if session is None or not session.active:
+        return None
+    try:
+        return session.username
+    except PermissionError:
+        return None
 
 
 @log_action("REGISTER")
+@retry_on_conflict()
 def register_user(username: str, password: str) -> str:
     db = get_db()
-    users = db.load_users()
-
-    if _find_user_by_name(users, username):
-        return f"Имя пользователя '{username}' уже занято"
-
-    try:
-        new_id = max((u.user_id for u in users), default=0) + 1
-    except ValueError:
-        new_id = 1
 
-    try:
-        user = User.create(user_id=new_id, username=username, password=password)
-    except ValueError as exc:
-        return str(exc)
+    if db.get_user(username):
+        raise ValueError(f"Имя пользователя '{username}' уже занято")
 
-    users.append(user)
-    db.save_users(users)
+    new_id = db.next_user_id()
+    user = User.create(user_id=new_id, username=username, password=password)
 
-    portfolios = db.load_portfolios()
-    portfolios.append(Portfolio(_user_id=user.user_id, _wallets={}))
-    db.save_portfolios(portfolios)
+    db.save_user(user)
+    db.save_portfolio(Portfolio(_user_id=user.user_id, _wallets={}))
 
     return (
         f"Пользователь '{username}' зарегистрирован (id={user.user_id}). "
@@ -78,70 +68,115 @@ def register_user(username: str, password: str) -> str:
 
 @log_action("LOGIN")
 def login_user(username: str, password: str) -> str:
-    db = get_db()
-    users = db.load_users()
-    user = _find_user_by_name(users, username)
-    if not user:
-        return f"Пользователь '{username}' не найден"
+    session = Session.login(username, password)
+    set_current_session(session)
+    return f"Вы вошли как '{username}'"
 
-    if not user.verify_password(password):
-        return "Неверный пароль"
 
-    set_current_username(username)
-    return f"Вы вошли как '{username}'"
+def logout_user() -> str:
+    set_current_session(None)
+    return "Вы вышли из системы"
 
 
-def _require_login() -> User:
-    username = get_current_username()
-    if not username:
-        raise PermissionError("Сначала выполните login")
+@log_action("IMPORT_USERS")
+def import_users(
+    path: str,
+    fmt: Optional[str] = None,
+    workers: Optional[int] = None,
+    skip_invalid: bool = False,
+    dry_run: bool = False,
+) -> str:
+    """Массовая регистрация из CSV/JSONL ('-' — stdin)."""
+    import sys
 
-    db = get_db()
-    users = db.load_users()
-    user = _find_user_by_name(users, username)
-    if not user:
-        raise PermissionError("Сначала выполните login")
-    return user
+    from .importer import detect_format
+    from .importer import import_users as run_import
+
+    fmt = fmt or detect_format(path)
+    try:
+        if path == "-":
+            report = run_import(sys.stdin, fmt, workers, skip_invalid, dry_run)
+        else:
+            with open(path, encoding="utf-8", newline="") as stream:
+                report = run_import(stream, fmt, workers, skip_invalid, dry_run)
+    except OSError as exc:
+        raise ValueError(f"Не удалось прочитать файл: {exc}") from exc
+    except ConcurrentUpdateError as exc:
+        # add_users ничего не пишет, если имя или id успели занять
+        raise ValueError(
+            "Импорт не выполнен: пользователей одновременно добавил другой "
+            "процесс, повторите команду"
+        ) from exc
+
+    lines = [f"Строк в файле: {report.total}, с ошибками: {report.rejected}"]
+    lines += [f"  {error}" for error in report.errors]
+    if report.rejected > len(report.errors):
+        lines.append(f"  ... и ещё {report.rejected - len(report.errors)}")
+    if report.imported:
+        lines.append(
+            f"Импортировано пользователей: {report.imported} "
+            f"(id {report.first_id}-{report.last_id}) за {report.seconds:.2f} s"
+        )
+    elif dry_run:
+        lines.append("Проверка завершена, ничего не записано (--dry-run)")
+    elif report.rejected and not skip_invalid:
+        lines.append(
+            "Ничего не импортировано: исправьте ошибки "
+            "или укажите --skip-invalid"
+        )
+    else:
+        lines.append("Нечего импортировать")
+    return "\n".join(lines)
 
 
-def show_portfolio(base_currency: str = "USD") -> str:
-    user = _require_login()
+def _rate_matrix() -> RateMatrix:
     db = get_db()
-    portfolios = db.load_portfolios()
-    portfolio = _find_portfolio_by_user_id(portfolios, user.user_id)
-    if not portfolio:
-        return "Портфель не найден"
-
     snapshot = db.load_rates_snapshot()
+    return get_rate_matrix(snapshot.get("pairs", {}), db.rates_generation())
+
+
+def _require_session(session: Optional[Session] = None) -> Session:
+    session = session or get_current_session()
+    if session is None or not session.active:
+        raise PermissionError("Сначала выполните login")
+    return session
+
+
+def portfolio_rows(
+    base_currency: str = "USD",
+    session: Optional[Session] = None,
+) -> List[Tuple[str, float, float]]:
+    """Кошельки текущего пользователя: (валюта, баланс, стоимость в базе)."""
+    session = _require_session(session)
+    matrix = _rate_matrix()
     base = base_currency.upper()
+    return [
+        (code, wallet.balance, matrix.convert(wallet.balance, code, base) or 0.0)
+        for code, wallet in session.portfolio.wallets.items()
+    ]
 
-    pairs = snapshot.get("pairs", {})
-    if base == "USD":
-        rates_data = pairs
-    else:
-        rates_data = pairs
 
-    if not portfolio.wallets:
+def show_portfolio(
+    base_currency: str = "USD",
+    session: Optional[Session] = None,
+) -> str:
+    session = _require_session(session)
+    user = session.user
+    base = base_currency.upper()
+    rows = portfolio_rows(base, session)
+
+    if not rows:
         return "У вас пока нет ни одного кошелька"
 
+    from prettytable import PrettyTable
+
     table = PrettyTable()
     table.field_names = ["Валюта", "Баланс", f"Стоимость в {base}"]
 
     total = 0.0
-    for code, wallet in portfolio.wallets.items():
-        if code == base:
-            value_in_base = wallet.balance
-        else:
-            pair = f"{code}_{base}"
-            info = rates_data.get(pair)
-            if not info:
-                value_in_base = 0.0
-            else:
-                value_in_base = wallet.balance * float(info["rate"])
+    for code, balance, value_in_base in rows:
         total += value_in_base
-        table.add_row(
-            [code, f"{wallet.balance:.4f}", f"{value_in_base:.2f} {base}"]
-        )
+        table.add_row([code, f"{balance:.4f}", f"{value_in_base:.2f} {base}"])
 
     header = (
         f"Портфель пользователя '{user.username}' "
@@ -151,27 +186,39 @@ def show_portfolio(base_currency: str = "USD") -> str:
     return header + str(table) + "\n" + footer
 
 
-@log_action("BUY", verbose=True)
-def buy_currency(currency_code: str, amount: float) -> str:
-    if amount <= 0:
-        return "'amount' должен быть положительным числом"
+def _save_wallet(session: Session, portfolio: Portfolio, wallet: Wallet) -> None:
+    """Записать новый баланс, если портфель не менялся со снимка.
+
+    Снимок сессии не меняется: кошелёк — копия, и в хранилище он попадает
+    только после проверки версии.
+    """
     try:
-        code = validate_currency_code(currency_code)
-    except CurrencyNotFoundError as exc:
-        return str(exc)
+        session.db.save_wallet(
+            portfolio.user_id, wallet, expected_version=portfolio.version
+        )
+    except ConcurrentUpdateError:
+        # повтор в retry_on_conflict начнёт со свежего снимка
+        session.invalidate()
+        raise
 
-    user = _require_login()
-    db = get_db()
-    portfolios = db.load_portfolios()
-    portfolio = _find_portfolio_by_user_id(portfolios, user.user_id)
-    if not portfolio:
-        portfolio = Portfolio(_user_id=user.user_id, _wallets={})
-        portfolios.append(portfolio)
 
-    wallet = portfolio.get_wallet(code)
-    if not wallet:
-        wallet = portfolio.add_currency(code)
+@log_action("BUY", verbose=True)
+@retry_on_conflict()
+def buy_currency(
+    currency_code: str,
+    amount: float,
+    session: Optional[Session] = None,
+) -> str:
+    if amount <= 0:
+        raise ValueError("'amount' должен быть положительным числом")
+    code = validate_currency_code(currency_code)
+
+    session = _require_session(session)
+    db = session.db
+    portfolio = session.portfolio
 
+    current = portfolio.get_wallet(code)
+    wallet = Wallet(code, current.balance if current else 0.0)
     before = wallet.balance
     wallet.deposit(amount)
     after = wallet.balance
@@ -193,7 +240,7 @@ def buy_currency(currency_code: str, amount: float) -> str:
         rate_msg = "по неизвестному курсу"
         est_msg = "Оценочную стоимость рассчитать не удалось"
 
-    db.save_portfolios(portfolios)
+    _save_wallet(session, portfolio, wallet)
 
     return (
         f"Покупка выполнена: {amount:.4f} {code} {rate_msg}\n"
@@ -204,36 +251,27 @@ def buy_currency(currency_code: str, amount: float) -> str:
 
 
 @log_action("SELL", verbose=True)
-def sell_currency(currency_code: str, amount: float) -> str:
+@retry_on_conflict()
+def sell_currency(
+    currency_code: str,
+    amount: float,
+    session: Optional[Session] = None,
+) -> str:
     if amount <= 0:
-        return "'amount' должен быть положительным числом"
-    try:
-        code = validate_currency_code(currency_code)
-    except CurrencyNotFoundError as exc:
-        return str(exc)
+        raise ValueError("'amount' должен быть положительным числом")
+    code = validate_currency_code(currency_code)
 
-    user = _require_login()
-    db = get_db()
-    portfolios = db.load_portfolios()
-    portfolio = _find_portfolio_by_user_id(portfolios, user.user_id)
-    if not portfolio:
-        return (
-            f"У вас нет кошелька '{code}'. Добавьте валюту: "
-            "она создаётся автоматически при первой покупке."
-        )
+    session = _require_session(session)
+    db = session.db
+    portfolio = session.portfolio
 
-    wallet = portfolio.get_wallet(code)
-    if not wallet:
-        return (
-            f"У вас нет кошелька '{code}'. Добавьте валюту: "
-            "она создаётся автоматически при первой покупке."
-        )
+    current = portfolio.get_wallet(code)
+    if not current:
+        raise InsufficientFundsError(available=0.0, required=amount, code=code)
 
+    wallet = Wallet(code, current.balance)
     before = wallet.balance
-    try:
-        wallet.withdraw(amount)
-    except InsufficientFundsError as exc:
-        return str(exc)
+    wallet.withdraw(amount)
     after = wallet.balance
 
     snapshot = db.load_rates_snapshot()
@@ -258,7 +296,7 @@ def sell_currency(currency_code: str, amount: float) -> str:
             "Курс не найден, оценочную выручку рассчитать не удалось"
         )
 
-    db.save_portfolios(portfolios)
+    _save_wallet(session, portfolio, wallet)
     return msg
 
 
@@ -269,12 +307,9 @@ def get_rate(from_code: str, to_code: str) -> str:
     quote = validate_currency_code(to_code)
 
     db = get_db()
-    snapshot = db.load_rates_snapshot()
-    pairs = snapshot.get("pairs", {})
-    last_refresh_raw = snapshot.get("last_refresh")
+    last_refresh = db.get_last_refresh()
 
-    if last_refresh_raw:
-        last_refresh = datetime.fromisoformat(last_refresh_raw)
+    if last_refresh:
         if datetime.utcnow() - last_refresh > timedelta(
             seconds=ttl_seconds
         ):
@@ -288,41 +323,27 @@ def get_rate(from_code: str, to_code: str) -> str:
         )
 
     pair = f"{base}_{quote}"
-    rev_pair = f"{quote}_{base}"
-    info = pairs.get(pair)
-    rev_info = pairs.get(rev_pair)
-
-    if not info and not rev_info:
+    matrix = _rate_matrix()
+    rate = matrix.rate(base, quote)
+    if not rate:
         raise CurrencyNotFoundError(code=pair)
 
-    if info:
-        rate = float(info["rate"])
-        ts = info["updated_at"]
-        msg = (
-            f"Курс {base}→{quote}: {rate:.8f} "
-            f"(обновлено: {ts})"
-        )
-        if rev_info:
-            rev_rate = float(rev_info["rate"])
-        else:
-            rev_rate = 1.0 / rate if rate != 0 else 0.0
-        msg += (
-            f"\nОбратный курс {quote}→{base}: "
-            f"{rev_rate:.5f}"
-        )
-        return msg
+    rev_rate = matrix.rate(quote, base) or 1.0 / rate
+    ts = matrix.updated_at(base, quote) or last_refresh.isoformat()
+    return (
+        f"Курс {base}→{quote}: {rate:.8f} "
+        f"(обновлено: {ts})\n"
+        f"Обратный курс {quote}→{base}: {rev_rate:.5f}"
+    )
 
-    if rev_info:
-        rev_rate = float(rev_info["rate"])
-        ts = rev_info["updated_at"]
-        rate = 1.0 / rev_rate if rev_rate != 0 else 0.0
-        return (
-            f"Курс {base}→{quote}: {rate:.8f} "
-            f"(обновлено: {ts})\n"
-            f"Обратный курс {quote}→{base}: {rev_rate:.5f}"
-        )
 
-    raise CurrencyNotFoundError(code=pair)
+def rate_rows(currency: str | None = None) -> List[Tuple[str, dict]]:
+    """Пары снимка курсов (все или с базовой валютой currency)."""
+    pairs = get_db().load_rates_snapshot().get("pairs", {})
+    if not currency:
+        return list(pairs.items())
+    prefix = f"{currency.upper()}_"
+    return [(pair, info) for pair, info in pairs.items() if pair.startswith(prefix)]
 
 
 def show_rates(
@@ -331,30 +352,24 @@ def show_rates(
 ) -> str:
     db = get_db()
     snapshot = db.load_rates_snapshot()
-    pairs = snapshot.get("pairs", {})
     last_refresh = snapshot.get("last_refresh")
 
-    if not pairs:
+    if not snapshot.get("pairs"):
         return (
             "Локальный кеш курсов пуст. "
             "Выполните 'update-rates', чтобы загрузить данные."
         )
 
-    filtered = []
-    if currency:
-        code = currency.upper()
-        for pair, info in pairs.items():
-            if pair.startswith(f"{code}_"):
-                filtered.append((pair, info))
-        if not filtered:
-            return f"Курс для '{code}' не найден в кеше."
-    else:
-        filtered = list(pairs.items())
+    filtered = rate_rows(currency)
+    if currency and not filtered:
+        return f"Курс для '{currency.upper()}' не найден в кеше."
 
     filtered.sort(key=lambda x: float(x[1]["rate"]), reverse=True)
     if top is not None and top > 0:
         filtered = filtered[:top]
 
+    from prettytable import PrettyTable
+
     table = PrettyTable()
     table.field_names = ["Пара", "Курс", "Обновлено", "Источник"]
     for pair, info in filtered:
@@ -369,3 +384,136 @@ def show_rates(
 
     header = f"Rates from cache (updated at {last_refresh}):\n"
     return header + str(table)
+
+
+def show_aum_report(base_currency: str = "USD", top: int = 10) -> str:
+    db = get_db()
+    base = validate_currency_code(base_currency)
+    portfolios = db.load_portfolios()
+    if not portfolios:
+        return "Портфелей пока нет"
+
+    from prettytable import PrettyTable
+
+    from .reports import value_portfolios
+
+    report = value_portfolios(portfolios, _rate_matrix(), base)
+
+    by_currency = PrettyTable()
+    by_currency.field_names = ["Валюта", "Баланс", f"Стоимость в {base}"]
+    ranked = sorted(
+        report.per_currency.items(),
+        key=lambda x: x[1][1],
+        reverse=True,
+    )
+    for code, (balance, value) in ranked:
+        by_currency.add_row([code, f"{balance:.4f}", f"{value:,.2f} {base}"])
+
+    holders = PrettyTable()
+    holders.field_names = ["Пользователь", f"Стоимость в {base}"]
+    for user_id, value in report.top_holders(top):
+        user = db.get_user_by_id(user_id)
+        name = user.username if user else f"id={user_id}"
+        holders.add_row([name, f"{value:,.2f} {base}"])
+
+    lines = [
+        f"Активы под управлением (база: {base}): "
+        f"{report.total:,.2f} {base}, портфелей: {len(report.per_user)}",
+        str(by_currency),
+        f"Топ-{top} держателей:",
+        str(holders),
+    ]
+    if report.unpriced:
+        lines.append(
+            "Нет курса для: " + ", ".join(report.unpriced)
+            + " (учтены как 0)"
+        )
+    return "\n".join(lines)
+
+
+def show_rate_history(
+    pair: str,
+    start: str | None = None,
+    end: str | None = None,
+    bar: str = "1h",
+    limit: int | None = None,
+) -> str:
+    from prettytable import PrettyTable
+
+    from ..infra.history_index import (
+        BAR_SECONDS,
+        from_epoch,
+        get_history_index,
+        to_epoch,
+    )
+
+    pair = pair.upper()
+    if "_" not in pair:
+        return "Пара задаётся в виде FROM_TO, например BTC_USD"
+    if bar not in BAR_SECONDS:
+        return "Неизвестный размер бара. Доступны: " + ", ".join(BAR_SECONDS)
+    try:
+        start_ts = to_epoch(start) if start else None
+        end_ts = to_epoch(end) if end else None
+    except ValueError:
+        return "Время задаётся в формате ISO, например 2025-11-27T12:00"
+
+    bars = get_history_index().ohlc(pair, start_ts, end_ts, BAR_SECONDS[bar])
+    if not bars:
+        return f"История по паре {pair} за указанный период не найдена"
+    if limit is not None and limit > 0:
+        bars = bars[-limit:]
+
+    table = PrettyTable()
+    table.field_names = ["Начало", "Open", "High", "Low", "Close", "Тиков"]
+    for b in bars:
+        table.add_row(
+            [
+                from_epoch(b.start).isoformat(),
+                f"{b.open:.6f}",
+                f"{b.high:.6f}",
+                f"{b.low:.6f}",
+                f"{b.close:.6f}",
+                b.count,
+            ]
+        )
+    return f"История {pair} (бар {bar}):\n" + str(table)
+
+
+def show_stats(reset: bool = False) -> str:
+    """Метрики операций по всем процессам: вызовы, ошибки, задержки."""
+    metrics = get_metrics()
+    if reset:
+        metrics.reset()
+        return "Метрики сброшены"
+    stats = metrics.snapshot()
+    if not stats:
+        return "Метрик пока нет"
+
+    from prettytable import PrettyTable
+
+    table = PrettyTable()
+    table.field_names = [
+        "Операция", "Вызовов", "Ошибок", "Среднее ms",
+        "p50 ms", "p95 ms", "p99 ms", "Макс ms", "Всего s",
+    ]
+    # сверху — операции, на которые ушло больше всего времени
+    for action, s in sorted(stats.items(), key=lambda x: x[1].total, reverse=True):
+        table.add_row(
+            [
+                action,
+                s.count,
+                s.errors,
+                f"{s.total / s.count * 1000:.2f}" if s.count else "-",
+                f"{s.quantile(0.5) * 1000:.2f}",
+                f"{s.quantile(0.95) * 1000:.2f}",
+                f"{s.quantile(0.99) * 1000:.2f}",
+                f"{s.max * 1000:.2f}",
+                f"{s.total:.3f}",
+            ]
+        )
+    return (
+        str(table)
+        + f"\nPrometheus: {metrics.prometheus_file} "
+        "(p50/p95/p99 — оценка по гистограмме)"
+    )
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 import json
+import re
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
+from ..infra import serialization
 from .exceptions import CurrencyNotFoundError
 from . import currencies
 
@@ -16,15 +19,74 @@ def validate_currency_code(code: str) -> str:
     return normalized
 
 
+def parse_timestamp(value: str) -> datetime:
+    """ISO-время (в т.ч. с суффиксом Z) -> наивное UTC-время."""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
 def load_json(path: Path, default: Any) -> Any:
-    if not path.exists():
-        return default
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    return serialization.read_file(path, default)
+
 
+def save_json(path: Path, data: Any, schema: str = "") -> None:
+    serialization.write_file(path, data, schema=schema or path.stem)
 
-def save_json(path: Path, data: Any) -> None:
-    tmp_path = path.with_suffix(path.suffix + ".tmp")
-    with tmp_path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    tmp_path.replace(path)
+
+_ENVELOPE_DATA = re.compile(r'"data"\s*:\s*\[')
+
+
+def iter_json_array(path: Path, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Потоково отдаёт элементы JSON-массива, не загружая файл целиком."""
+    if not path.exists():
+        return
+    decoder = json.JSONDecoder()
+    with path.open("r", encoding="utf-8") as f:
+        buf = ""
+        started = False
+        eof = False
+        while True:
+            pos = 0
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if not started:
+                    if pos >= len(buf):
+                        break
+                    if buf[pos] == "{":
+                        # конверт с заголовком: массив лежит в ключе data
+                        match = _ENVELOPE_DATA.search(buf, pos)
+                        if match is None:
+                            if eof:
+                                raise ValueError(f"{path}: нет ключа data")
+                            break
+                        header = buf[pos : match.start()].rstrip().rstrip(",")
+                        serialization.check_header(json.loads(header + "}"))
+                        pos = match.end() - 1
+                    if buf[pos] != "[":
+                        raise ValueError(f"{path}: ожидался JSON-массив")
+                    started = True
+                    pos += 1
+                    continue
+                if pos < len(buf) and buf[pos] == "]":
+                    return
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    break
+                if end >= len(buf) and not eof:
+                    # число на границе чанка могло оборваться
+                    break
+                pos = end
+                yield item
+            if eof:
+                return
+            buf = buf[pos:]
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buf += chunk
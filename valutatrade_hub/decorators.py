@@ -1,38 +1,136 @@
 import functools
 import logging
+import random
+import time
 from datetime import datetime
 from typing import Any, Callable, TypeVar
 
+from .core.exceptions import ConcurrentUpdateError
+from .infra.metrics import get_metrics
+
 logger = logging.getLogger(__name__)
 
 F = TypeVar("F", bound=Callable[..., Any])
 
 
-def log_action(action: str, verbose: bool = False) -> Callable[[F], F]:
+# аргументы, которые не попадают в журнал даже с verbose
+_HIDDEN_ARGS = ("password", "session")
+
+
+def _describe(value: Any) -> str:
+    if isinstance(value, str):
+        first_line = value.split("\n", 1)[0]
+        return first_line[:200]
+    return repr(value)[:200]
+
+
+def log_action(
+    action: str,
+    verbose: bool = False,
+    level: int = logging.INFO,
+) -> Callable[[F], F]:
+    """Журналировать вызов и записать его в метрики (счётчики, задержка).
+
+    ``verbose`` добавляет в журнал аргументы и результат (первую строку
+    текста). Частые внутренние вызовы (хранилище, API) журналируются
+    с ``level=logging.DEBUG``, но в метрики попадают всегда.
+    """
+    error_level = logging.ERROR if level >= logging.INFO else logging.WARNING
+    # по action фильтр журнала прореживает записи каждой операции отдельно
+    extra = {"action": action}
+
     def decorator(func: F) -> F:
         @functools.wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            timestamp = datetime.utcnow().isoformat()
-            username = kwargs.get("username") or kwargs.get("current_username")
-            msg_prefix = (
-                f"{action} ts={timestamp} user={username if username else '-'}"
-            )
-            logger.info("%s started", msg_prefix)
+            enabled = logger.isEnabledFor(level)
+            msg_prefix = action
+            if enabled:
+                timestamp = datetime.utcnow().isoformat()
+                username = kwargs.get("username") or kwargs.get("current_username")
+                msg_prefix = (
+                    f"{action} ts={timestamp} user={username if username else '-'}"
+                )
+                if verbose:
+                    params = " ".join(
+                        f"{k}={_describe(v)}"
+                        for k, v in kwargs.items()
+                        if k not in _HIDDEN_ARGS
+                    )
+                    if params:
+                        msg_prefix += " " + params
+                logger.log(level, "%s started", msg_prefix, extra=extra)
+            started = time.perf_counter()
             try:
                 result = func(*args, **kwargs)
-                if verbose and isinstance(result, dict):
-                    logger.info("%s OK details=%s", msg_prefix, result)
-                else:
-                    logger.info("%s OK", msg_prefix)
-                return result
             except Exception as exc:
-                logger.error(
-                    "%s ERROR type=%s msg=%s",
+                elapsed = time.perf_counter() - started
+                get_metrics().observe(action, elapsed, error=True)
+                logger.log(
+                    error_level,
+                    "%s ERROR type=%s msg=%s ms=%.1f",
                     msg_prefix,
                     type(exc).__name__,
                     str(exc),
+                    elapsed * 1000,
+                    extra=extra,
                 )
                 raise
+            elapsed = time.perf_counter() - started
+            get_metrics().observe(action, elapsed)
+            if enabled:
+                if verbose:
+                    logger.log(
+                        level,
+                        "%s OK ms=%.1f result=%s",
+                        msg_prefix,
+                        elapsed * 1000,
+                        _describe(result),
+                        extra=extra,
+                    )
+                else:
+                    logger.log(
+                        level,
+                        "%s OK ms=%.1f",
+                        msg_prefix,
+                        elapsed * 1000,
+                        extra=extra,
+                    )
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def retry_on_conflict(
+    attempts: int = 10,
+    backoff: float = 0.005,
+    max_backoff: float = 0.5,
+) -> Callable[[F], F]:
+    """Повторить функцию при ConcurrentUpdateError.
+
+    Пауза между попытками случайная и растёт экспоненциально, чтобы
+    конкурирующие процессы расходились по времени.
+    """
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            for attempt in range(1, attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except ConcurrentUpdateError as exc:
+                    if attempt == attempts:
+                        raise
+                    logger.warning(
+                        "%s conflict (%s), retry %d/%d",
+                        func.__name__,
+                        exc.resource,
+                        attempt,
+                        attempts - 1,
+                    )
+                    delay = min(max_backoff, backoff * 2**attempt)
+                    time.sleep(random.uniform(0, delay))
 
         return wrapper
 
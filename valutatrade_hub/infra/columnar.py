@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import mmap
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .database import BaseRepository
+from .history_index import to_epoch
+from .locking import file_lock
+from .serialization import read_file, write_file
+from .settings import get_settings
+
+try:
+    import numpy as np
+except ImportError:  # без numpy колонки отдаются как memoryview
+    np = None
+
+FORMAT_VERSION = 1
+
+# записей истории за один шаг sync_from: память не растёт с историей
+SYNC_CHUNK = 10_000
+
+# имя файла колонки -> (typecode array, dtype numpy)
+COLUMNS = {
+    "ts.i8": ("q", "<i8"),
+    "rate.f8": ("d", "<f8"),
+    "src.u1": ("B", "u1"),
+}
+
+
+class PairColumns:
+    """Колонки одной пары, открытые через mmap без копирования.
+
+    ``timestamps`` — микросекунды эпохи (int64), ``rates`` — float64,
+    ``sources`` — коды источников (uint8), имена в ``source_names``.
+    Колонки обрезаются до ``count`` из meta.json: хвост недописанной
+    или ещё не зафиксированной записи не виден.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        source_names: List[str],
+        count: int = 0,
+    ) -> None:
+        self.directory = directory
+        self.source_names = source_names
+        self.count = count
+        self._maps: List[mmap.mmap] = []
+        self.timestamps = self._open("ts.i8")
+        self.rates = self._open("rate.f8")
+        self.sources = self._open("src.u1")
+
+    def _open(self, name: str) -> Any:
+        typecode, dtype = COLUMNS[name]
+        path = self.directory / name
+        size = path.stat().st_size if path.exists() else 0
+        itemsize = array(typecode).itemsize
+        count = min(self.count, size // itemsize)
+        if count == 0:
+            empty = array(typecode)
+            return np.asarray(empty, dtype=dtype) if np is not None else empty
+        with path.open("rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        if np is not None:
+            return np.frombuffer(mapped, dtype=dtype, count=count)
+        return memoryview(mapped).cast(typecode)[:count]
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    def close(self) -> None:
+        self.timestamps = self.rates = self.sources = None
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # на колонки ещё ссылаются снаружи — закроет сборщик
+                pass
+        self._maps = []
+
+    def __enter__(self) -> "PairColumns":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class ColumnarHistory:
+    """История курсов в колоночном формате: каталог на пару.
+
+    Каждый каталог содержит колонки фиксированной ширины (ts.i8, rate.f8,
+    src.u1) и meta.json со словарём источников. Запись — дозапись в
+    конец колонок.
+    """
+
+    def __init__(self, root: Optional[Path] = None) -> None:
+        settings = get_settings()
+        if root is None:
+            root = Path(settings.get("HISTORY_COLUMNAR_DIR"))
+        self.root = Path(root)
+        self._meta_file = self.root / "meta.json"
+        self.lock_path = Path(settings.get("LOCK_DIR")) / "columnar.lock"
+
+    def _load_meta(self) -> dict:
+        if not self._meta_file.exists():
+            return {
+                "version": FORMAT_VERSION,
+                "byteorder": "little",
+                "cursor": None,
+                "pairs": {},
+            }
+        return read_file(self._meta_file)
+
+    def _save_meta(self, meta: dict) -> None:
+        write_file(self._meta_file, meta, schema="columnar-meta")
+
+    def pairs(self) -> List[str]:
+        return sorted(self._load_meta()["pairs"])
+
+    def append(self, records: Iterable[dict], meta: Optional[dict] = None) -> int:
+        own_meta = meta is None
+        if meta is None:
+            meta = self._load_meta()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        grouped: Dict[str, Dict[str, array]] = {}
+        total = 0
+        for record in records:
+            pair = f"{record['from_currency']}_{record['to_currency']}"
+            pair_meta = meta["pairs"].setdefault(pair, {"sources": []})
+            names = pair_meta["sources"]
+            source = record.get("source") or ""
+            if source not in names:
+                if len(names) >= 256:
+                    raise ValueError(f"{pair}: больше 256 источников")
+                names.append(source)
+            cols = grouped.setdefault(
+                pair,
+                {name: array(code) for name, (code, _) in COLUMNS.items()},
+            )
+            cols["ts.i8"].append(int(to_epoch(record["timestamp"]) * 1_000_000))
+            cols["rate.f8"].append(float(record["rate"]))
+            cols["src.u1"].append(names.index(source))
+            total += 1
+
+        for pair, cols in grouped.items():
+            directory = self.root / pair
+            directory.mkdir(exist_ok=True)
+            count = meta["pairs"][pair].get("count", 0)
+            for name, values in cols.items():
+                if sys.byteorder != "little":
+                    values.byteswap()
+                with (directory / name).open("ab") as f:
+                    # хвост от прерванной записи, не попавший в meta.json
+                    f.truncate(count * values.itemsize)
+                    values.tofile(f)
+            meta["pairs"][pair]["count"] = count + len(cols["rate.f8"])
+
+        if own_meta:
+            self._save_meta(meta)
+        return total
+
+    def sync_from(self, db: BaseRepository, chunk: int = SYNC_CHUNK) -> int:
+        """Дописать записи истории, появившиеся после прошлой синхронизации.
+
+        Первый вызов конвертирует всю существующую историю. Записи читаются
+        пачками по ``chunk``, курсор сохраняется после каждой пачки; запись
+        идёт под блокировкой, поэтому процессы не дописывают одно и то же.
+        """
+        added = 0
+        with file_lock(self.lock_path):
+            meta = self._load_meta()
+            cursor = meta.get("cursor")
+            if isinstance(cursor, list):
+                cursor = tuple(cursor)
+            while True:
+                records, cursor = db.read_exchange_records_since(cursor, chunk)
+                if not records:
+                    break
+                added += self.append(records, meta)
+                meta["cursor"] = cursor
+                self._save_meta(meta)
+                if len(records) < chunk:
+                    break
+        return added
+
+    def open_pair(self, pair: str) -> PairColumns:
+        pair_meta = self._load_meta()["pairs"].get(pair, {"sources": []})
+        return PairColumns(
+            self.root / pair,
+            pair_meta["sources"],
+            pair_meta.get("count", 0),
+        )
@@ -1,14 +1,224 @@
 from __future__ import annotations
 
+import atexit
 import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from ..core.models import User, Portfolio
+from ..core.exceptions import ConcurrentUpdateError
+from ..core.models import User, Portfolio, Wallet
+from ..core.utils import parse_timestamp
+from ..decorators import log_action
+from .history_log import HistoryLog, convert_json_array
+from .locking import file_lock
+from .serialization import encode, read_file, write_file
 from .settings import get_settings
+from .trade_journal import TradeJournal
 
+logger = logging.getLogger(__name__)
+
+FileStamp = Optional[Tuple[int, int, int]]
+
+
+def _file_stamp(path: Path) -> FileStamp:
+    """Дешёвый признак изменения файла: (inode, mtime_ns, size) или None.
+
+    Файлы пишутся через tmp + rename, поэтому новая запись всегда меняет
+    inode — даже если mtime и размер совпали с прежними.
+    """
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _is_newer(candidate: Optional[str], current: Optional[str]) -> bool:
+    if not candidate:
+        return False
+    if not current:
+        return True
+    return parse_timestamp(candidate) >= parse_timestamp(current)
+
+
+def _merge_rates(theirs: Optional[dict], ours: dict) -> dict:
+    """Слить два снимка курсов: по каждой паре — более свежий курс."""
+    if not theirs:
+        return ours
+    pairs = dict(theirs.get("pairs", {}))
+    for pair, info in ours.get("pairs", {}).items():
+        other = pairs.get(pair)
+        if other is None or _is_newer(info.get("updated_at"), other.get("updated_at")):
+            pairs[pair] = info
+    last_refresh = theirs.get("last_refresh")
+    if _is_newer(ours.get("last_refresh"), last_refresh):
+        last_refresh = ours["last_refresh"]
+    return {**theirs, **ours, "pairs": pairs, "last_refresh": last_refresh}
+
+
+class BaseRepository(ABC):
+    """Интерфейс хранилища пользователей, портфелей и курсов."""
+
+    _last_refresh_raw: Optional[str] = None
+    _last_refresh: Optional[datetime] = None
+
+    @abstractmethod
+    def load_users(self) -> List[User]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user(self, username: str) -> Optional[User]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_by_id(self, user_id: int) -> Optional[User]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def next_user_id(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_users(self, users: List[User]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_user(self, user: User) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def reserve_user_ids(self, count: int) -> range:
+        """Выделить ``count`` подряд идущих id из постоянной последовательности."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_users(self, users: List[User]) -> None:
+        """Добавить новых пользователей одной записью.
+
+        Если id или имя уже заняты, ничего не записывается и бросается
+        ConcurrentUpdateError.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_portfolios(self, portfolios: List[Portfolio]) -> None:
+        """Добавить портфели новых пользователей одной записью."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_portfolios(self) -> List[Portfolio]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_portfolio(self, user_id: int) -> Optional[Portfolio]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_portfolios(self, portfolios: List[Portfolio]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_portfolio(self, portfolio: Portfolio) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_wallet(
+        self,
+        user_id: int,
+        wallet: Wallet,
+        expected_version: Optional[int] = None,
+    ) -> None:
+        """Сохранить баланс одного кошелька пользователя.
+
+        Если задана ``expected_version`` и портфель с тех пор сохранил
+        кто-то другой, бросается ConcurrentUpdateError.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def accounts_generation(self) -> int:
+        """Номер поколения пользователей и портфелей.
+
+        Меняется при любом их изменении, в том числе другим процессом;
+        по нему сессии понимают, что закешированные объекты устарели.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_rates_snapshot(self) -> dict:
+        """Снимок курсов; общий объект кеша, изменять его нельзя."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def rates_generation(self) -> int:
+        """Номер поколения снимка: меняется при каждом изменении курсов."""
+        raise NotImplementedError
+
+    def get_last_refresh(self) -> Optional[datetime]:
+        raw = self.load_rates_snapshot().get("last_refresh")
+        if raw != self._last_refresh_raw:
+            self._last_refresh = parse_timestamp(raw) if raw else None
+            self._last_refresh_raw = raw
+        return self._last_refresh
+
+    @abstractmethod
+    def save_rates_snapshot(self, data: dict) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def touch_last_refresh(self, timestamp: str) -> None:
+        """Отметить, что курсы подтверждены, не переписывая снимок.
+
+        Поколение курсов при этом не меняется.
+        """
+        raise NotImplementedError
+
+    def watched_files(self, kind: str) -> List[Path]:
+        """Файлы, запись в которые меняет курсы ("rates") или счета
+        ("accounts"); пустой список — изменения отслеживаются опросом."""
+        return []
+
+    @abstractmethod
+    def append_exchange_records(self, records: List[dict]) -> None:
+        raise NotImplementedError
+
+    def append_exchange_record(self, record: dict) -> None:
+        self.append_exchange_records([record])
+
+    @abstractmethod
+    def iter_exchange_records(self) -> Iterator[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_exchange_records_since(
+        self,
+        cursor: Any = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[dict], Any]:
+        """Новые записи истории после непрозрачного курсора и новый курсор.
+
+        С ``limit`` возвращается не больше limit записей, курсор — сразу
+        после последней из них.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_deferred(self, enabled: bool) -> None:
+        """Копить изменения в памяти до flush(); при выключении — сбросить."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def flush(self) -> None:
+        raise NotImplementedError
+
+
+class DatabaseManager(BaseRepository):
+    """JSON-хранилище в каталоге data/."""
 
-class DatabaseManager:
     _instance: "DatabaseManager | None" = None
 
     def __new__(cls) -> "DatabaseManager":
@@ -22,72 +232,586 @@ class DatabaseManager:
         self.users_file = Path(settings.get("USERS_FILE"))
         self.portfolios_file = Path(settings.get("PORTFOLIOS_FILE"))
         self.rates_file = Path(settings.get("RATES_FILE"))
+        self.last_refresh_file = Path(settings.get("LAST_REFRESH_FILE"))
         self.exchange_history_file = Path(
             settings.get("EXCHANGE_HISTORY_FILE")
         )
+        self.user_id_seq_file = Path(settings.get("USER_ID_SEQ_FILE"))
+        self.lock_dir = Path(settings.get("LOCK_DIR"))
+        self.history_log = HistoryLog(
+            Path(settings.get("EXCHANGE_HISTORY_LOG")),
+            segment_max_bytes=int(settings.get("HISTORY_SEGMENT_MAX_BYTES")),
+            fsync_batch=int(settings.get("HISTORY_FSYNC_BATCH")),
+            fsync_interval=float(settings.get("HISTORY_FSYNC_INTERVAL")),
+            lock_path=self.lock_dir / "history.lock",
+        )
+        self._history_ready = False
+        atexit.register(self.history_log.close)
 
-    def load_users(self) -> List[User]:
-        if not self.users_file.exists():
-            return []
+        # Балансы: portfolios.json — контрольная точка, сделки дописываются
+        # в журнал и сворачиваются в новую точку фоновым компактором.
+        self.trade_journal = TradeJournal(
+            Path(settings.get("TRADE_JOURNAL_FILE")),
+            lock_path=self.lock_dir / "journal.lock",
+            commit_delay=float(settings.get("TRADE_JOURNAL_COMMIT_DELAY")),
+        )
+        self._checkpoint_bytes = int(
+            settings.get("TRADE_JOURNAL_CHECKPOINT_BYTES")
+        )
+        self._portfolios_lock = threading.RLock()
+        self._compactor: Optional[threading.Thread] = None
+        atexit.register(self.trade_journal.close)
+
+        # Резидентные данные и хеш-индексы, синхронизируемые с файлами
+        # по (mtime, size): повторный разбор JSON только при изменении.
+        self._users: List[User] = []
+        self._users_by_name: Dict[str, User] = {}
+        self._users_by_id: Dict[int, User] = {}
+        self._users_stamp: FileStamp = None
+        self._users_loaded = False
+
+        self._portfolios: List[Portfolio] = []
+        self._portfolios_by_user: Dict[int, Portfolio] = {}
+        self._portfolios_stamp: Tuple[FileStamp, ...] = ()
+        self._portfolios_loaded = False
+        # позиция дочитанного активного журнала сделок
+        self._journal_offset = 0
+        self._journal_inode: Optional[int] = None
+
+        self._rates: dict = {"pairs": {}, "last_refresh": None}
+        self._rates_stamp: FileStamp = None
+        self._rates_loaded = False
+        self._rates_generation = 0
+        # last_refresh без перезаписи снимка — в отдельном маленьком файле
+        self._refresh_stamp: FileStamp = None
+        self._refresh_sidecar: Optional[str] = None
+        # снимок курсов пишут и CLI, и фоновый планировщик
+        self._rates_lock = threading.RLock()
+
+        self._accounts_generation = 0
+
+        # Отложенная запись (пакетный режим): имена грязных файлов и
+        # пользователи, добавленные или изменённые за время пакета.
+        self._deferred = False
+        self._dirty: set[str] = set()
+        self._pending_users: Dict[int, User] = {}
+
+    # --- users ---
+
+    @log_action("DB_READ_USERS", level=logging.DEBUG)
+    def _read_users(self) -> List[User]:
         try:
-            with self.users_file.open("r", encoding="utf-8") as f:
-                raw = json.load(f)
+            raw = read_file(self.users_file, default=[])
         except json.JSONDecodeError:
             return []
         return [User.from_json(item) for item in raw]
 
+    def _index_users(self, users: List[User]) -> None:
+        self._accounts_generation += 1
+        self._users = list(users)
+        self._users_by_name = {u.username: u for u in self._users}
+        self._users_by_id = {u.user_id: u for u in self._users}
+
+    def _sync_users(self) -> None:
+        if "users" in self._dirty:
+            return
+        stamp = _file_stamp(self.users_file)
+        if self._users_loaded and stamp == self._users_stamp:
+            return
+        self._index_users(self._read_users())
+        self._users_stamp = stamp
+        self._users_loaded = True
+
+    @log_action("DB_WRITE_USERS", level=logging.DEBUG)
+    def _write_users(self) -> None:
+        if self._deferred:
+            self._dirty.add("users")
+            return
+        write_file(
+            self.users_file,
+            [u.to_json() for u in self._users],
+            schema="users",
+        )
+        self._users_stamp = _file_stamp(self.users_file)
+        self._users_loaded = True
+
+    def load_users(self) -> List[User]:
+        self._sync_users()
+        return list(self._users)
+
+    def get_user(self, username: str) -> Optional[User]:
+        self._sync_users()
+        return self._users_by_name.get(username)
+
+    def get_user_by_id(self, user_id: int) -> Optional[User]:
+        self._sync_users()
+        return self._users_by_id.get(user_id)
+
+    def _last_user_id(self) -> int:
+        # id, выделенные импорту, не должны достаться обычной регистрации
+        self._sync_users()
+        reserved = int(read_file(self.user_id_seq_file, default=0) or 0)
+        return max(reserved, max(self._users_by_id, default=0))
+
+    def next_user_id(self) -> int:
+        if self._deferred:
+            # users.json запишется только при flush: id резервируется сразу,
+            # чтобы его не выдали регистрации в другом процессе
+            return self.reserve_user_ids(1).start
+        return self._last_user_id() + 1
+
+    def _lock(self, name: str) -> Any:
+        return file_lock(self.lock_dir / f"{name}.lock")
+
     def save_users(self, users: List[User]) -> None:
-        data = [u.to_json() for u in users]
-        tmp = self.users_file.with_suffix(".tmp")
-        with tmp.open("w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        tmp.replace(self.users_file)
+        with self._lock("users"):
+            self._index_users(users)
+            self._write_users()
 
-    def load_portfolios(self) -> List[Portfolio]:
-        if not self.portfolios_file.exists():
-            return []
+    def save_user(self, user: User) -> None:
+        with self._lock("users"):
+            # перечитать под блокировкой: файл мог обновить другой процесс
+            self._sync_users()
+            existing = self._users_by_id.get(user.user_id)
+            taken = self._users_by_name.get(user.username)
+            if (existing is not None and existing.username != user.username) or (
+                taken is not None and taken.user_id != user.user_id
+            ):
+                raise ConcurrentUpdateError("users")
+            if existing is None:
+                self._users.append(user)
+            elif existing is not user:
+                self._users[self._users.index(existing)] = user
+            self._users_by_name[user.username] = user
+            self._users_by_id[user.user_id] = user
+            self._accounts_generation += 1
+            if self._deferred:
+                self._pending_users[user.user_id] = user
+            self._write_users()
+
+    def _merge_pending_users(self) -> None:
+        """Наложить изменения пакета на users.json, изменённый другим
+        процессом; держать блокировку users."""
+        merged = self._read_users()
+        by_id = {u.user_id: i for i, u in enumerate(merged)}
+        by_name = {u.username: u.user_id for u in merged}
+        for user_id, user in self._pending_users.items():
+            if by_name.get(user.username, user_id) != user_id:
+                raise ConcurrentUpdateError("users")
+            if user_id in by_id:
+                merged[by_id[user_id]] = user
+            else:
+                by_id[user_id] = len(merged)
+                merged.append(user)
+            by_name[user.username] = user_id
+        self._index_users(merged)
+
+    def reserve_user_ids(self, count: int) -> range:
+        with self._lock("users"):
+            last = self._last_user_id()
+            write_file(self.user_id_seq_file, last + count, schema="user_id_seq")
+        return range(last + 1, last + count + 1)
+
+    @log_action("DB_ADD_USERS", level=logging.DEBUG)
+    def add_users(self, users: List[User]) -> None:
+        with self._lock("users"):
+            self._sync_users()
+            for user in users:
+                if (
+                    user.user_id in self._users_by_id
+                    or user.username in self._users_by_name
+                ):
+                    raise ConcurrentUpdateError("users")
+            self._users.extend(users)
+            for user in users:
+                self._users_by_name[user.username] = user
+                self._users_by_id[user.user_id] = user
+                if self._deferred:
+                    self._pending_users[user.user_id] = user
+            self._accounts_generation += 1
+            self._write_users()
+
+    # --- portfolios ---
+
+    @log_action("DB_READ_PORTFOLIOS", level=logging.DEBUG)
+    def _read_checkpoint(self) -> List[Portfolio]:
         try:
-            with self.portfolios_file.open("r", encoding="utf-8") as f:
-                raw = json.load(f)
+            raw = read_file(self.portfolios_file, default=[])
         except json.JSONDecodeError:
             return []
         return [Portfolio.from_json(item) for item in raw]
 
+    def _apply_journal(self, entries: Iterable[dict]) -> None:
+        for entry in entries:
+            user_id = entry["user_id"]
+            portfolio = self._portfolios_by_user.get(user_id)
+            if portfolio is None:
+                portfolio = Portfolio(_user_id=user_id, _wallets={})
+                self._portfolios.append(portfolio)
+                self._portfolios_by_user[user_id] = portfolio
+            version = entry.get("version", portfolio.version + 1)
+            if version <= portfolio.version:
+                continue  # уже учтена: своя запись или повтор после сбоя
+            self._accounts_generation += 1
+            portfolio.version = version
+            for code, balance in entry.get("wallets", {}).items():
+                portfolio.add_currency(code).balance = balance
+
+    def _portfolios_files_stamp(self) -> Tuple[FileStamp, ...]:
+        return (
+            _file_stamp(self.portfolios_file),
+            _file_stamp(self.trade_journal.rotated_path),
+            _file_stamp(self.trade_journal.path),
+        )
+
+    def _index_portfolios(self, portfolios: List[Portfolio]) -> None:
+        self._accounts_generation += 1
+        self._portfolios = list(portfolios)
+        self._portfolios_by_user = {p.user_id: p for p in self._portfolios}
+
+    def _refresh_portfolios(self) -> None:
+        """Догнать файлы; держать _portfolios_lock и блокировку журнала.
+
+        Если менялся только активный журнал, дочитывается его хвост,
+        иначе — контрольная точка и журналы целиком.
+        """
+        if "portfolios" in self._dirty:
+            return
+        stamp = self._portfolios_files_stamp()
+        if self._portfolios_loaded and stamp == self._portfolios_stamp:
+            return
+        tail = None
+        if self._portfolios_loaded and stamp[:2] == self._portfolios_stamp[:2]:
+            tail = self.trade_journal.tail(
+                self._journal_offset,
+                self._journal_inode,
+            )
+        if tail is None:
+            self._index_portfolios(self._read_checkpoint())
+            self._apply_journal(self.trade_journal.iter_rotated())
+            tail = self.trade_journal.tail()
+        entries, self._journal_offset, self._journal_inode = tail
+        self._apply_journal(entries)
+        self._portfolios_stamp = stamp
+        self._portfolios_loaded = True
+
+    def _sync_portfolios(self) -> None:
+        with self._portfolios_lock, self.trade_journal.locked(shared=True):
+            self._refresh_portfolios()
+
+    def _write_portfolios(self) -> None:
+        if self._deferred:
+            self._dirty.add("portfolios")
+            return
+        # данные в памяти — полная замена, перечитывать файлы не нужно
+        self.checkpoint(refresh=False)
+
+    @log_action("DB_CHECKPOINT", level=logging.DEBUG)
+    def checkpoint(self, refresh: bool = True) -> None:
+        """Записать portfolios.json и сбросить свёрнутый в него журнал.
+
+        Снимок данных и откладывание журнала делаются под исключительной
+        блокировкой журнала, а сам файл пишется уже без неё — сделки во
+        время записи идут в новый журнал. Сбой на любом шаге не теряет
+        данных: при загрузке отложенный журнал применяется повторно.
+        """
+        with self._lock("checkpoint"):
+            with self._portfolios_lock, self.trade_journal.locked():
+                if refresh:
+                    self._refresh_portfolios()
+                data = [p.to_json() for p in self._portfolios]
+                self.trade_journal.rotate()
+            tmp = self.portfolios_file.with_suffix(".tmp")
+            tmp.write_bytes(encode(data, schema="portfolios"))
+            with self._portfolios_lock, self.trade_journal.locked():
+                tmp.replace(self.portfolios_file)
+                self.trade_journal.discard_rotated()
+                # новый активный журнал дочитывается с начала
+                stamp = self._portfolios_files_stamp()
+                self._portfolios_stamp = (*stamp[:2], None)
+                self._journal_offset, self._journal_inode = 0, None
+                self._portfolios_loaded = True
+        logger.info("Portfolios checkpoint written (%d portfolios)", len(data))
+
+    @log_action("DB_JOURNAL_COMMIT", level=logging.DEBUG)
+    def _commit(self, ticket: int) -> None:
+        # вне _portfolios_lock: параллельные сделки делят один fsync
+        if self._deferred:
+            return
+        self.trade_journal.commit(ticket)
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        if self.trade_journal.size() < self._checkpoint_bytes:
+            return
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(
+            target=self.checkpoint,
+            name="portfolios-compactor",
+            daemon=True,
+        )
+        self._compactor.start()
+
+    def load_portfolios(self) -> List[Portfolio]:
+        self._sync_portfolios()
+        return list(self._portfolios)
+
+    def get_portfolio(self, user_id: int) -> Optional[Portfolio]:
+        self._sync_portfolios()
+        return self._portfolios_by_user.get(user_id)
+
     def save_portfolios(self, portfolios: List[Portfolio]) -> None:
-        data = [p.to_json() for p in portfolios]
-        tmp = self.portfolios_file.with_suffix(".tmp")
-        with tmp.open("w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        tmp.replace(self.portfolios_file)
+        self._index_portfolios(portfolios)
+        self._write_portfolios()
+
+    def accounts_generation(self) -> int:
+        self._sync_users()
+        self._sync_portfolios()
+        return self._accounts_generation
+
+    @log_action("DB_SAVE_PORTFOLIO", level=logging.DEBUG)
+    def _save_user_portfolio(
+        self,
+        user_id: int,
+        update: Callable[[Portfolio], Dict[str, float]],
+        expected_version: Optional[int] = None,
+    ) -> None:
+        """Сравнить версию и дописать изменение портфеля в журнал.
+
+        Блокировка пользователя делает проверку и запись атомарными для
+        всех процессов; сделки разных пользователей идут параллельно.
+        """
+        with self._lock(f"user-{user_id}"):
+            with self._portfolios_lock, self.trade_journal.locked(shared=True):
+                self._refresh_portfolios()
+                portfolio = self._portfolios_by_user.get(user_id)
+                if portfolio is None:
+                    portfolio = Portfolio(_user_id=user_id, _wallets={})
+                    self._portfolios.append(portfolio)
+                    self._portfolios_by_user[user_id] = portfolio
+                if (
+                    expected_version is not None
+                    and portfolio.version != expected_version
+                ):
+                    # изменения вызывающего в памяти отбрасываются
+                    self._portfolios_loaded = False
+                    raise ConcurrentUpdateError(f"portfolio {user_id}")
+                wallets = update(portfolio)
+                portfolio = self._portfolios_by_user[user_id]
+                portfolio.version += 1
+                self._accounts_generation += 1
+                entry = {
+                    "user_id": user_id,
+                    "version": portfolio.version,
+                    "wallets": wallets,
+                }
+                ticket = self.trade_journal.write([entry])
+        self._commit(ticket)
+
+    @log_action("DB_ADD_PORTFOLIOS", level=logging.DEBUG)
+    def add_portfolios(self, portfolios: List[Portfolio]) -> None:
+        """Все портфели — одной пачкой записей журнала с одним fsync."""
+        with self._portfolios_lock, self.trade_journal.locked(shared=True):
+            self._refresh_portfolios()
+            if any(p.user_id in self._portfolios_by_user for p in portfolios):
+                raise ConcurrentUpdateError("portfolios")
+            entries = []
+            for portfolio in portfolios:
+                portfolio.version += 1
+                self._portfolios.append(portfolio)
+                self._portfolios_by_user[portfolio.user_id] = portfolio
+                entries.append(
+                    {
+                        "user_id": portfolio.user_id,
+                        "version": portfolio.version,
+                        "wallets": {
+                            code: w.balance for code, w in portfolio.wallets.items()
+                        },
+                    }
+                )
+            self._accounts_generation += 1
+            ticket = self.trade_journal.write(entries)
+        self._commit(ticket)
+        # большая пачка сразу сворачивается в контрольную точку: фоновый
+        # компактор короткого запуска CLI не успел бы до выхода
+        if self._compactor is not None:
+            self._compactor.join()
+
+    def save_portfolio(self, portfolio: Portfolio) -> None:
+        # в хранилище — своя копия: объект вызывающего с ней не связан
+        stored = portfolio.copy()
+
+        def update(current: Portfolio) -> Dict[str, float]:
+            stored.version = current.version
+            self._portfolios[self._portfolios.index(current)] = stored
+            self._portfolios_by_user[stored.user_id] = stored
+            return {code: w.balance for code, w in stored.wallets.items()}
+
+        self._save_user_portfolio(portfolio.user_id, update)
+
+    def save_wallet(
+        self,
+        user_id: int,
+        wallet: Wallet,
+        expected_version: Optional[int] = None,
+    ) -> None:
+        def update(portfolio: Portfolio) -> Dict[str, float]:
+            code = wallet.currency_code
+            portfolio.add_currency(code).balance = wallet.balance
+            return {code: wallet.balance}
+
+        self._save_user_portfolio(user_id, update, expected_version)
+
+    # --- rates ---
+
+    def _sync_rates(self) -> None:
+        if "rates" in self._dirty:
+            return
+        stamp = _file_stamp(self.rates_file)
+        if self._rates_loaded and stamp == self._rates_stamp:
+            return
+        if stamp is None:
+            self._rates = {"pairs": {}, "last_refresh": None}
+        else:
+            self._rates = read_file(self.rates_file)
+        self._rates_stamp = stamp
+        self._rates_loaded = True
+        self._rates_generation += 1
+        self._merge_last_refresh()
+
+    def _sync_last_refresh(self) -> None:
+        stamp = _file_stamp(self.last_refresh_file)
+        if stamp == self._refresh_stamp:
+            return
+        self._refresh_stamp = stamp
+        self._refresh_sidecar = (
+            read_file(self.last_refresh_file) if stamp is not None else None
+        )
+        self._merge_last_refresh()
+
+    def _merge_last_refresh(self) -> None:
+        # в снимке остаётся более поздняя из двух отметок
+        sidecar = self._refresh_sidecar
+        current = self._rates.get("last_refresh")
+        if sidecar and (
+            not current or parse_timestamp(sidecar) > parse_timestamp(current)
+        ):
+            self._rates = {**self._rates, "last_refresh": sidecar}
 
     def load_rates_snapshot(self) -> dict:
-        if not self.rates_file.exists():
-            return {"pairs": {}, "last_refresh": None}
-        with self.rates_file.open("r", encoding="utf-8") as f:
-            return json.load(f)
+        self._sync_rates()
+        self._sync_last_refresh()
+        return self._rates
+
+    def rates_generation(self) -> int:
+        self._sync_rates()
+        return self._rates_generation
 
+    def _write_rates(self) -> None:
+        if self._deferred:
+            self._dirty.add("rates")
+            return
+        write_file(self.rates_file, self._rates, schema="rates")
+        self._rates_stamp = _file_stamp(self.rates_file)
+
+    @log_action("DB_SAVE_RATES", level=logging.DEBUG)
     def save_rates_snapshot(self, data: dict) -> None:
-        tmp = self.rates_file.with_suffix(".tmp")
-        with tmp.open("w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        tmp.replace(self.rates_file)
+        with self._rates_lock, self._lock("rates"):
+            if (
+                not self._deferred
+                and self._rates_loaded
+                and _file_stamp(self.rates_file) != self._rates_stamp
+            ):
+                # снимок обновил другой процесс: перечитать и повторить
+                raise ConcurrentUpdateError("rates")
+            self._rates = data
+            self._rates_loaded = True
+            self._rates_generation += 1
+            self._write_rates()
+
+    def touch_last_refresh(self, timestamp: str) -> None:
+        with self._rates_lock:
+            self._sync_rates()
+            self._refresh_sidecar = timestamp
+            self._merge_last_refresh()
+            write_file(self.last_refresh_file, timestamp, schema="last_refresh")
+            self._refresh_stamp = _file_stamp(self.last_refresh_file)
+
+    def watched_files(self, kind: str) -> List[Path]:
+        if kind == "rates":
+            return [self.rates_file, self.last_refresh_file]
+        return [self.users_file, self.portfolios_file, self.trade_journal.path]
+
+    # --- batch ---
+
+    def set_deferred(self, enabled: bool) -> None:
+        self._deferred = enabled
+        if not enabled:
+            self.flush()
+
+    @log_action("DB_FLUSH", level=logging.DEBUG)
+    def flush(self) -> None:
+        deferred, self._deferred = self._deferred, False
+        try:
+            dirty, self._dirty = self._dirty, set()
+            if "users" in dirty:
+                with self._lock("users"):
+                    # за время пакета файл мог изменить другой процесс
+                    if _file_stamp(self.users_file) != self._users_stamp:
+                        self._merge_pending_users()
+                    self._write_users()
+                self._pending_users = {}
+            if "portfolios" in dirty:
+                self._write_portfolios()
+            else:
+                self.trade_journal.sync()
+                self._maybe_compact()
+            if "rates" in dirty:
+                with self._rates_lock, self._lock("rates"):
+                    if _file_stamp(self.rates_file) != self._rates_stamp:
+                        self._rates = _merge_rates(
+                            read_file(self.rates_file), self._rates
+                        )
+                        self._rates_generation += 1
+                    self._write_rates()
+            self.history_log.flush()
+        finally:
+            self._deferred = deferred
+
+    # --- history ---
+
+    def _history(self) -> HistoryLog:
+        if not self._history_ready:
+            # однократная конвертация старого exchange_rates.json;
+            # прерванная сбоем продолжается при следующем обращении
+            if self.exchange_history_file.exists():
+                convert_json_array(
+                    self.exchange_history_file,
+                    self.history_log,
+                )
+            self._history_ready = True
+        return self.history_log
+
+    @log_action("DB_APPEND_HISTORY", level=logging.DEBUG)
+    def append_exchange_records(self, records: List[dict]) -> None:
+        self._history().append(records)
+
+    def iter_exchange_records(self) -> Iterator[dict]:
+        return self._history().iter_records()
+
+    def read_exchange_records_since(
+        self,
+        cursor: Any = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[dict], Any]:
+        return self._history().read_since(cursor, limit)
 
-    def append_exchange_record(self, record: dict) -> None:
-        history: list[Any]
-        if self.exchange_history_file.exists():
-            with self.exchange_history_file.open(
-                "r",
-                encoding="utf-8",
-            ) as f:
-                history = json.load(f)
-        else:
-            history = []
-        history.append(record)
-        tmp = self.exchange_history_file.with_suffix(".tmp")
-        with tmp.open("w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
-        tmp.replace(self.exchange_history_file)
 
+def get_db() -> BaseRepository:
+    backend = str(get_settings().get("STORAGE_BACKEND", "json")).lower()
+    if backend == "sqlite":
+        from .sqlite_db import SqliteDatabase
 
-def get_db() -> DatabaseManager:
+        return SqliteDatabase()
     return DatabaseManager()
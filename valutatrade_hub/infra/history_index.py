@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import bisect
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..core.utils import parse_timestamp
+from .database import BaseRepository, get_db
+
+BAR_SECONDS: Dict[str, int] = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400,
+}
+
+# Уровни, которые поддерживаются инкрементально при каждом новом тике.
+AGGREGATED_LEVELS: Tuple[int, ...] = (60, 3600, 86400)
+
+
+@dataclass
+class Bar:
+    start: int
+    open: float
+    high: float
+    low: float
+    close: float
+    count: int
+
+    def merge(self, other: "Bar") -> None:
+        self.high = max(self.high, other.high)
+        self.low = min(self.low, other.low)
+        self.close = other.close
+        self.count += other.count
+
+
+def to_epoch(value: str) -> float:
+    return parse_timestamp(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+def from_epoch(value: float) -> datetime:
+    return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+
+
+class PairSeries:
+    """Отсортированный по времени ряд тиков одной пары и готовые бары."""
+
+    def __init__(self) -> None:
+        self.times: List[float] = []
+        self.rates: List[float] = []
+        self.bars: Dict[int, List[Bar]] = {lvl: [] for lvl in AGGREGATED_LEVELS}
+        self.bar_starts: Dict[int, List[int]] = {
+            lvl: [] for lvl in AGGREGATED_LEVELS
+        }
+
+    def add(self, ts: float, rate: float) -> None:
+        if not self.times or ts >= self.times[-1]:
+            self.times.append(ts)
+            self.rates.append(rate)
+            for level in AGGREGATED_LEVELS:
+                self._add_to_level(level, ts, rate)
+            return
+        # редкий случай: тик из прошлого — вставка и пересборка уровней
+        pos = bisect.bisect_right(self.times, ts)
+        self.times.insert(pos, ts)
+        self.rates.insert(pos, rate)
+        self._rebuild_levels()
+
+    def _add_to_level(self, level: int, ts: float, rate: float) -> None:
+        start = int(ts // level) * level
+        bars = self.bars[level]
+        if bars and bars[-1].start == start:
+            last = bars[-1]
+            last.high = max(last.high, rate)
+            last.low = min(last.low, rate)
+            last.close = rate
+            last.count += 1
+        else:
+            bars.append(Bar(start, rate, rate, rate, rate, 1))
+            self.bar_starts[level].append(start)
+
+    def _rebuild_levels(self) -> None:
+        for level in AGGREGATED_LEVELS:
+            self.bars[level] = []
+            self.bar_starts[level] = []
+            for ts, rate in zip(self.times, self.rates):
+                self._add_to_level(level, ts, rate)
+
+    def _tick_bars(self, start: float, end: float) -> Iterable[Bar]:
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_left(self.times, end)
+        for i in range(lo, hi):
+            r = self.rates[i]
+            yield Bar(int(self.times[i]), r, r, r, r, 1)
+
+    def _level_bars(self, level: int, start: int, end: int) -> Iterable[Bar]:
+        starts = self.bar_starts[level]
+        lo = bisect.bisect_left(starts, start)
+        hi = bisect.bisect_left(starts, end)
+        return self.bars[level][lo:hi]
+
+    def ohlc(self, start: float, end: float, resolution: int) -> List[Bar]:
+        """OHLC-бары за [start, end) с шагом resolution секунд.
+
+        Полностью покрытые интервалы берутся из самого крупного готового
+        уровня, кратного resolution; края диапазона — из сырых тиков.
+        """
+        level = max(
+            (lvl for lvl in AGGREGATED_LEVELS if resolution % lvl == 0),
+            default=None,
+        )
+        if level is None:
+            parts: Iterable[Bar] = self._tick_bars(start, end)
+        else:
+            body_start = int(-(-start // level) * level)
+            body_end = int(end // level) * level
+            if body_start >= body_end:
+                parts = self._tick_bars(start, end)
+            else:
+                parts = (
+                    *self._tick_bars(start, body_start),
+                    *self._level_bars(level, body_start, body_end),
+                    *self._tick_bars(body_end, end),
+                )
+
+        result: List[Bar] = []
+        for part in parts:
+            bucket = int(part.start // resolution) * resolution
+            if result and result[-1].start == bucket:
+                result[-1].merge(part)
+            else:
+                result.append(
+                    Bar(
+                        bucket,
+                        part.open,
+                        part.high,
+                        part.low,
+                        part.close,
+                        part.count,
+                    )
+                )
+        return result
+
+    def ticks(self, start: float, end: float) -> List[Tuple[float, float]]:
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_left(self.times, end)
+        return list(zip(self.times[lo:hi], self.rates[lo:hi]))
+
+
+class HistoryIndex:
+    """Индекс истории курсов по парам поверх колоночного хранилища.
+
+    Новые записи истории дописываются в колонки (курсор хранится в их
+    meta.json, поэтому каждый процесс дочитывает только новое), ряд пары
+    загружается из колонок при первом запросе, дальше — только их хвост.
+    """
+
+    def __init__(self, db: BaseRepository, store: Any = None) -> None:
+        from .columnar import ColumnarHistory
+
+        self.db = db
+        self.store = store or ColumnarHistory()
+        self.series: Dict[str, PairSeries] = {}
+        self._loaded: Dict[str, int] = {}
+
+    def refresh(self) -> int:
+        """Дописать в колонки записи, появившиеся с прошлого вызова."""
+        return self.store.sync_from(self.db)
+
+    def _load_pair(self, pair: str) -> Optional[PairSeries]:
+        with self.store.open_pair(pair) as columns:
+            loaded = self._loaded.get(pair, 0)
+            if len(columns) > loaded:
+                series = self.series.setdefault(pair, PairSeries())
+                for ts, rate in zip(
+                    columns.timestamps[loaded:],
+                    columns.rates[loaded:],
+                ):
+                    series.add(int(ts) / 1_000_000, float(rate))
+                self._loaded[pair] = len(columns)
+        return self.series.get(pair)
+
+    def ohlc(
+        self,
+        pair: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        resolution: int = 3600,
+    ) -> List[Bar]:
+        self.refresh()
+        series = self._load_pair(pair)
+        if series is None or not series.times:
+            return []
+        start = series.times[0] if start is None else start
+        end = series.times[-1] + 1 if end is None else end
+        return series.ohlc(start, end, resolution)
+
+
+_index: Optional[HistoryIndex] = None
+
+
+def get_history_index() -> HistoryIndex:
+    global _index
+    db = get_db()
+    if _index is None or _index.db is not db:
+        _index = HistoryIndex(db)
+    return _index
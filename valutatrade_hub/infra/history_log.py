@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from ..core.utils import iter_json_array
+from .locking import file_lock
+
+try:
+    import orjson
+except ImportError:  # без orjson строки кодирует стандартный json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# один кодировщик на все строки: json.dumps с ensure_ascii=False создаёт
+# новый JSONEncoder на каждый вызов, а за обновление их тысячи
+_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+
+def _encode_lines(records: Iterable[dict]) -> List[bytes]:
+    if orjson is not None:
+        return [orjson.dumps(r) + b"\n" for r in records]
+    encode = _ENCODER.encode
+    return [(encode(r) + "\n").encode("utf-8") for r in records]
+
+
+class HistoryLog:
+    """Журнал истории курсов: JSON Lines, только дозапись.
+
+    Активный сегмент — ``<name>.jsonl``. При превышении ``segment_max_bytes``
+    он переименовывается в ``<name>.000001.jsonl`` и т.д. fsync выполняется
+    пачками: раз в ``fsync_batch`` записей или ``fsync_interval`` секунд.
+    Дозапись идёт под разделяемой блокировкой ``lock_path``, ротация и
+    конвертация — под исключительной.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        segment_max_bytes: int = 16 * 1024 * 1024,
+        fsync_batch: int = 100,
+        fsync_interval: float = 1.0,
+        lock_path: Optional[Path] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.lock_path = Path(
+            lock_path or self.path.with_name(self.path.name + ".lock")
+        )
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._needs_newline = False
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def locked(self, shared: bool = False) -> AbstractContextManager[None]:
+        return file_lock(self.lock_path, shared=shared)
+
+    def _segment_path(self, number: int) -> Path:
+        return self.path.with_name(f"{self.path.stem}.{number:06d}.jsonl")
+
+    def rotated_segments(self) -> List[Path]:
+        pattern = f"{self.path.stem}.[0-9][0-9][0-9][0-9][0-9][0-9].jsonl"
+        return sorted(self.path.parent.glob(pattern))
+
+    def segments(self) -> List[Path]:
+        result = self.rotated_segments()
+        if self.path.exists():
+            result.append(self.path)
+        return result
+
+    def numbered_segments(self) -> List[Tuple[int, Path]]:
+        """Сегменты с номерами; активный получает номер, который он
+        получит при ротации, поэтому курсор чтения её переживает."""
+        result = [
+            (int(p.name.split(".")[-2]), p) for p in self.rotated_segments()
+        ]
+        if self.path.exists():
+            last = result[-1][0] if result else 0
+            result.append((last + 1, self.path))
+        return result
+
+    def exists(self) -> bool:
+        return bool(self.segments())
+
+    def _is_current(self, fd: int) -> bool:
+        """Не ротировал ли активный сегмент другой процесс."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        own = os.fstat(fd)
+        return (st.st_dev, st.st_ino) == (own.st_dev, own.st_ino)
+
+    def _open(self) -> int:
+        if self._fd is not None and not self._is_current(self._fd):
+            self._close_fd()
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            size = os.fstat(fd).st_size
+            # недописанная после сбоя строка останется отдельной битой
+            # строкой и не склеится со следующей записью
+            self._needs_newline = size > 0 and os.pread(fd, 1, size - 1) != b"\n"
+            self._fd = fd
+        return self._fd
+
+    def _sync(self) -> None:
+        if self._fd is not None and self._unsynced:
+            os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _close_fd(self) -> None:
+        self._sync()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _write(self, lines: List[bytes]) -> int:
+        """Дописать строки; вернуть размер активного сегмента.
+
+        Вызывающий держит ``self._lock`` и блокировку файла.
+        """
+        fd = self._open()
+        data = b"".join(lines)
+        if self._needs_newline:
+            data = b"\n" + data
+            self._needs_newline = False
+        # один write на O_APPEND: пачки разных процессов не смешиваются
+        os.write(fd, data)
+        self._unsynced += len(lines)
+        elapsed = time.monotonic() - self._last_sync
+        if self._unsynced >= self.fsync_batch or elapsed >= self.fsync_interval:
+            self._sync()
+        return os.fstat(fd).st_size
+
+    def _rotate(self) -> None:
+        """Ротировать активный сегмент; держать ``locked()``."""
+        fd = self._open()
+        if os.fstat(fd).st_size < self.segment_max_bytes:
+            return  # другой процесс уже ротировал
+        self._close_fd()
+        rotated = self.rotated_segments()
+        number = int(rotated[-1].name.split(".")[-2]) + 1 if rotated else 1
+        target = self._segment_path(number)
+        self.path.replace(target)
+        logger.info("History segment rotated to %s", target.name)
+
+    def append(self, records: Iterable[dict]) -> int:
+        lines = _encode_lines(records)
+        if not lines:
+            return 0
+        with self._lock:
+            with self.locked(shared=True):
+                size = self._write(lines)
+            if size >= self.segment_max_bytes:
+                with self.locked():
+                    self._rotate()
+        return len(lines)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_fd()
+
+    def iter_records(self) -> Iterator[dict]:
+        """Лениво читает записи всех сегментов по порядку."""
+        for segment in self.segments():
+            with segment.open("r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # недописанная последняя строка после сбоя
+                        logger.warning("Skipping broken line in %s", segment)
+
+    def read_since(
+        self,
+        cursor: Optional[Tuple[int, int]] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[dict], Tuple[int, int]]:
+        """Записи, добавленные после курсора (номер сегмента, смещение);
+        не больше ``limit``, если он задан."""
+        number, offset = cursor or (0, 0)
+        records: List[dict] = []
+        for seg_number, segment in self.numbered_segments():
+            if seg_number < number:
+                continue
+            start = offset if seg_number == number else 0
+            with segment.open("rb") as f:
+                f.seek(start)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # строка ещё дописывается
+                    start += len(raw)
+                    if not raw.strip():
+                        continue
+                    try:
+                        records.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        # оборванная сбоем строка, уже закрытая переводом
+                        logger.warning("Skipping broken line in %s", segment)
+                        continue
+                    if limit is not None and len(records) >= limit:
+                        return records, (seg_number, start)
+            number, offset = seg_number, start
+        return records, (number, offset)
+
+
+def conversion_marker(log: HistoryLog) -> Path:
+    return log.path.with_name(log.path.name + ".converted")
+
+
+def convert_json_array(source: Path, log: HistoryLog, batch: int = 1000) -> int:
+    """Однократно перенести историю из JSON-массива в журнал.
+
+    Конвертация идёт под исключительной блокировкой журнала и считается
+    завершённой только после записи маркера; прерванная продолжается с
+    первой записи массива, которой ещё нет в журнале.
+    """
+    marker = conversion_marker(log)
+    if marker.exists():
+        return 0
+    total = 0
+    with log._lock, log.locked():
+        if marker.exists():
+            return 0
+        skip = sum(1 for _ in log.iter_records())
+        chunk: List[bytes] = []
+        for index, record in enumerate(iter_json_array(Path(source))):
+            if index < skip:
+                continue
+            chunk.extend(_encode_lines([record]))
+            if len(chunk) >= batch:
+                total += len(chunk)
+                if log._write(chunk) >= log.segment_max_bytes:
+                    log._rotate()
+                chunk = []
+        if chunk:
+            total += len(chunk)
+            log._write(chunk)
+        log._sync()
+        marker.touch()
+    logger.info(
+        "Converted %d history records from %s (%d already present)",
+        total,
+        source,
+        skip,
+    )
+    return total
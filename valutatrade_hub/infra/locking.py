@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+_local_locks: Dict[str, threading.RLock] = {}
+_local_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: Path, shared: bool = False) -> Iterator[None]:
+    """Межпроцессная блокировка через flock на файле ``path``.
+
+    Каждый вход открывает свой дескриптор, поэтому потоки одного процесса
+    тоже исключают друг друга. Разделяемые блокировки совместимы между
+    собой; брать исключительную, удерживая разделяемую, нельзя.
+    """
+    path = Path(path)
+    if fcntl is None:
+        with _local_guard:
+            lock = _local_locks.setdefault(str(path), threading.RLock())
+        with lock:
+            yield
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .locking import file_lock
+from .serialization import read_file, write_file
+from .settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограммы задержек, секунды.
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+PROMETHEUS_PREFIX = "valutatrade_action"
+
+
+@dataclass
+class ActionStats:
+    """Счётчики одной операции; buckets[i] — вызовы в корзине BUCKETS[i]."""
+
+    count: int = 0
+    errors: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.count += 1
+        self.errors += int(error)
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def merge(self, other: "ActionStats") -> None:
+        self.count += other.count
+        self.errors += other.errors
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def quantile(self, q: float) -> float:
+        """Оценка сверху по гистограмме: граница корзины с q-й долей вызовов."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets[:-1]):
+            seen += n
+            if seen >= target:
+                return min(BUCKETS[i], self.max)
+        return self.max
+
+    def to_json(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total": self.total,
+            "max": self.max,
+            "buckets": self.buckets,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "ActionStats":
+        buckets = list(data.get("buckets", []))
+        if len(buckets) != len(BUCKETS) + 1:
+            # границы корзин поменялись: всё прошлое — в +Inf
+            buckets = [0] * len(BUCKETS) + [int(data.get("count", 0))]
+        return cls(
+            count=int(data.get("count", 0)),
+            errors=int(data.get("errors", 0)),
+            total=float(data.get("total", 0.0)),
+            max=float(data.get("max", 0.0)),
+            buckets=buckets,
+        )
+
+
+def render_prometheus(stats: Dict[str, ActionStats]) -> str:
+    """Текстовый формат Prometheus: счётчики и гистограмма по операциям."""
+    p = PROMETHEUS_PREFIX
+    lines = [
+        f"# HELP {p}_calls_total Calls per action.",
+        f"# TYPE {p}_calls_total counter",
+    ]
+    actions = sorted(stats)
+    lines += [f'{p}_calls_total{{action="{a}"}} {stats[a].count}' for a in actions]
+    lines += [
+        f"# HELP {p}_errors_total Failed calls per action.",
+        f"# TYPE {p}_errors_total counter",
+    ]
+    lines += [f'{p}_errors_total{{action="{a}"}} {stats[a].errors}' for a in actions]
+    lines += [
+        f"# HELP {p}_duration_seconds Call latency per action.",
+        f"# TYPE {p}_duration_seconds histogram",
+    ]
+    for a in actions:
+        s = stats[a]
+        cumulative = 0
+        for bound, n in zip((*map(repr, BUCKETS), "+Inf"), s.buckets):
+            cumulative += n
+            lines.append(
+                f'{p}_duration_seconds_bucket{{action="{a}",le="{bound}"}} '
+                f"{cumulative}"
+            )
+        lines.append(f'{p}_duration_seconds_sum{{action="{a}"}} {s.total!r}')
+        lines.append(f'{p}_duration_seconds_count{{action="{a}"}} {s.count}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRegistry:
+    """Метрики операций процесса с периодическим сбросом на диск.
+
+    Накопленное с прошлого сброса прибавляется к общему состоянию в
+    METRICS_STATE_FILE под файловой блокировкой, поэтому счётчики
+    суммируются по всем процессам (в том числе по коротким запускам CLI).
+    После сброса METRICS_FILE перезаписывается в формате Prometheus.
+    Сбрасывает фоновый поток, observe только обновляет счётчики в памяти.
+    """
+
+    _instance: "MetricsRegistry | None" = None
+
+    def __new__(cls) -> "MetricsRegistry":
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self) -> None:
+        settings = get_settings()
+        self.enabled = bool(settings.get("METRICS_ENABLED", True))
+        self.state_file = Path(settings.get("METRICS_STATE_FILE"))
+        self.prometheus_file = Path(settings.get("METRICS_FILE"))
+        self.lock_path = Path(settings.get("LOCK_DIR")) / "metrics.lock"
+        self.flush_interval = float(settings.get("METRICS_FLUSH_INTERVAL", 10.0))
+        self.exit_timeout = float(settings.get("METRICS_EXIT_TIMEOUT", 1.0))
+        self._lock = threading.Lock()
+        self._pending: Dict[str, ActionStats] = {}
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        atexit.register(self._shutdown)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def observe(self, action: str, seconds: float, error: bool = False) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._pending.get(action)
+            if stats is None:
+                stats = self._pending[action] = ActionStats()
+            stats.observe(seconds, error)
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop,
+                    name="metrics-flush",
+                    daemon=True,
+                )
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def _shutdown(self) -> None:
+        """Последний сброс при выходе делает поток; выход ждёт его не
+        дольше exit_timeout, даже если блокировка метрик занята."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(self.exit_timeout)
+
+    def _after_fork(self) -> None:
+        # потока в дочернем процессе нет, а накопленное сбросит родитель
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def _read_state(self) -> Dict[str, ActionStats]:
+        raw = read_file(self.state_file, default={}) or {}
+        return {name: ActionStats.from_json(data) for name, data in raw.items()}
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            with file_lock(self.lock_path):
+                state = self._read_state()
+                for name, stats in pending.items():
+                    state.setdefault(name, ActionStats()).merge(stats)
+                write_file(
+                    self.state_file,
+                    {name: s.to_json() for name, s in state.items()},
+                    schema="metrics",
+                )
+                tmp = self.prometheus_file.with_suffix(".tmp")
+                tmp.write_text(render_prometheus(state), encoding="utf-8")
+                tmp.replace(self.prometheus_file)
+        except (OSError, ValueError) as exc:
+            logger.warning("Metrics flush failed: %s", exc)
+            with self._lock:
+                for name, stats in pending.items():
+                    self._pending.setdefault(name, ActionStats()).merge(stats)
+
+    def snapshot(self) -> Dict[str, ActionStats]:
+        """Общее состояние вместе с ещё не сброшенными метриками процесса."""
+        self.flush()
+        with file_lock(self.lock_path, shared=True):
+            return self._read_state()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending = {}
+        with file_lock(self.lock_path):
+            self.state_file.unlink(missing_ok=True)
+            self.prometheus_file.unlink(missing_ok=True)
+
+
+def get_metrics() -> MetricsRegistry:
+    return MetricsRegistry()
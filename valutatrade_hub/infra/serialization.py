@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .settings import get_settings
+
+try:
+    import orjson
+except ImportError:  # без orjson работает стандартный json
+    orjson = None
+
+# Заголовок файла данных: {"format": ..., "version": ..., "schema": ...,
+# "codec": ..., "data": ...}. Ключ data всегда последний, чтобы потоковое
+# чтение могло пропустить заголовок.
+ENVELOPE_FORMAT = "valutatrade"
+FORMAT_VERSION = 1
+
+
+class Codec(ABC):
+    """Кодек файлов данных: объект <-> байты JSON."""
+
+    name: str = ""
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def loads(self, raw: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """Стандартный json: компактный или с отступами (прежний формат)."""
+
+    def __init__(self, pretty: bool = False) -> None:
+        self.pretty = pretty
+        self.name = "json-pretty" if pretty else "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        if self.pretty:
+            text = json.dumps(obj, ensure_ascii=False, indent=2)
+        else:
+            text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        return text.encode("utf-8")
+
+    def loads(self, raw: bytes) -> Any:
+        return json.loads(raw)
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise RuntimeError("orjson не установлен (pip install orjson)")
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, raw: bytes) -> Any:
+        return orjson.loads(raw)
+
+
+def _loads(raw: bytes) -> Any:
+    # все кодеки пишут JSON, поэтому читать можно самым быстрым парсером
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def available_codecs() -> Dict[str, Codec]:
+    codecs: Dict[str, Codec] = {
+        "json": JsonCodec(),
+        "json-pretty": JsonCodec(pretty=True),
+    }
+    if orjson is not None:
+        codecs["orjson"] = OrjsonCodec()
+    return codecs
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """Кодек по имени или из настройки SERIALIZER.
+
+    ``auto`` — orjson, если установлен, иначе компактный json.
+    """
+    name = (name or get_settings().get("SERIALIZER", "auto")).lower()
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    codecs = available_codecs()
+    if name not in codecs:
+        raise ValueError(
+            f"Неизвестный или недоступный кодек '{name}'. "
+            f"Доступны: {', '.join(codecs)}"
+        )
+    return codecs[name]
+
+
+def encode(data: Any, schema: str, codec: Optional[Codec] = None) -> bytes:
+    codec = codec or get_codec()
+    if not get_settings().get("SERIALIZER_ENVELOPE", True):
+        return codec.dumps(data)
+    return codec.dumps(
+        {
+            "format": ENVELOPE_FORMAT,
+            "version": FORMAT_VERSION,
+            "schema": schema,
+            "codec": codec.name,
+            "data": data,
+        }
+    )
+
+
+def check_header(header: dict) -> None:
+    version = int(header.get("version", 0))
+    if version > FORMAT_VERSION:
+        raise ValueError(
+            f"Файл данных версии {version} новее поддерживаемой "
+            f"({FORMAT_VERSION})"
+        )
+
+
+def unwrap(obj: Any) -> Any:
+    """Данные из конверта; файлы старого формата возвращаются как есть."""
+    if isinstance(obj, dict) and obj.get("format") == ENVELOPE_FORMAT:
+        check_header(obj)
+        return obj["data"]
+    return obj
+
+
+def decode(raw: bytes) -> Any:
+    return unwrap(_loads(raw))
+
+
+def read_file(path: Path, default: Any = None) -> Any:
+    path = Path(path)
+    if not path.exists():
+        return default
+    return decode(path.read_bytes())
+
+
+def write_file(
+    path: Path,
+    data: Any,
+    schema: str,
+    codec: Optional[Codec] = None,
+) -> None:
+    """Атомарно записать данные: через временный файл и replace."""
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    raw = encode(data, schema, codec)
+    try:
+        tmp.write_bytes(raw)
+    except FileNotFoundError:
+        # каталог данных создаётся при первой записи, а не при запуске
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(raw)
+    tmp.replace(path)
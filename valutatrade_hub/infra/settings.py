@@ -16,20 +16,50 @@ class SettingsLoader:
 
     def _init_defaults(self) -> None:
         base_dir = Path(os.getenv("VALUTA_BASE_DIR", ".")).resolve()
+        # каталоги создаются при первой записи: запуск CLI не трогает диск
         data_dir = base_dir / "data"
-        data_dir.mkdir(exist_ok=True)
 
         self._settings: dict[str, Any] = {
             "DATA_DIR": str(data_dir),
             "USERS_FILE": str(data_dir / "users.json"),
             "PORTFOLIOS_FILE": str(data_dir / "portfolios.json"),
             "RATES_FILE": str(data_dir / "rates.json"),
+            "LAST_REFRESH_FILE": str(data_dir / "last_refresh.json"),
             "EXCHANGE_HISTORY_FILE": str(
                 data_dir / "exchange_rates.json"
             ),
+            "EXCHANGE_HISTORY_LOG": str(data_dir / "exchange_rates.jsonl"),
+            "USER_ID_SEQ_FILE": str(data_dir / "user_id_seq.json"),
+            "ASSETS_FILE": str(data_dir / "assets.json"),
+            "LOCK_DIR": str(data_dir / "locks"),
+            "SESSION_FILE": str(data_dir / "session.json"),
+            "SESSION_TTL": float(os.getenv("VALUTA_SESSION_TTL", 12 * 3600)),
+            "METRICS_ENABLED": os.getenv("VALUTA_METRICS", "1") != "0",
+            "METRICS_FILE": str(data_dir / "metrics.prom"),
+            "METRICS_STATE_FILE": str(data_dir / "metrics.json"),
+            "METRICS_FLUSH_INTERVAL": 10.0,
+            "METRICS_EXIT_TIMEOUT": 1.0,
+            "TRADE_JOURNAL_FILE": str(data_dir / "portfolios.journal"),
+            "TRADE_JOURNAL_COMMIT_DELAY": 0.0,
+            "TRADE_JOURNAL_CHECKPOINT_BYTES": 1024 * 1024,
+            "HISTORY_COLUMNAR_DIR": str(data_dir / "history_columnar"),
+            "HISTORY_SEGMENT_MAX_BYTES": 16 * 1024 * 1024,
+            "HISTORY_FSYNC_BATCH": 100,
+            "HISTORY_FSYNC_INTERVAL": 1.0,
+            "SERIALIZER": os.getenv("VALUTA_SERIALIZER", "auto"),
+            "SERIALIZER_ENVELOPE": True,
+            "STORAGE_BACKEND": os.getenv("VALUTA_STORAGE_BACKEND", "json"),
+            "SQLITE_FILE": str(data_dir / "valutatrade.db"),
             "RATES_TTL_SECONDS": 300,
             "DEFAULT_BASE_CURRENCY": "USD",
             "LOG_DIR": str(base_dir / "logs"),
+            "LOG_FORMAT": os.getenv("VALUTA_LOG_FORMAT", "text"),
+            "LOG_QUEUE": True,
+            "LOG_QUEUE_SIZE": 10000,
+            # не больше N INFO-записей одного вида в окно (0 — без ограничения)
+            "LOG_RATE_LIMIT": 50,
+            "LOG_RATE_WINDOW": 1.0,
+            "LOG_INFO_SAMPLE": float(os.getenv("VALUTA_LOG_SAMPLE", "1.0")),
         }
 
     def get(self, key: str, default: Any | None = None) -> Any:
@@ -0,0 +1,574 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..core.exceptions import ConcurrentUpdateError
+from ..core.models import Portfolio, User, Wallet
+from ..core.utils import iter_json_array
+from ..decorators import log_action
+from .database import BaseRepository, DatabaseManager
+from .serialization import read_file
+from .settings import get_settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    hashed_password TEXT NOT NULL,
+    salt TEXT NOT NULL,
+    registration_date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS portfolios (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS wallets (
+    user_id INTEGER NOT NULL,
+    currency_code TEXT NOT NULL,
+    balance REAL NOT NULL,
+    PRIMARY KEY (user_id, currency_code)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rates (
+    pair TEXT PRIMARY KEY,
+    rate REAL NOT NULL,
+    updated_at TEXT,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS exchange_history (
+    id TEXT PRIMARY KEY,
+    from_currency TEXT NOT NULL,
+    to_currency TEXT NOT NULL,
+    rate REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    source TEXT,
+    meta TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_pair_ts
+    ON exchange_history (from_currency, to_currency, timestamp);
+"""
+
+
+def _user_row(user: User) -> tuple:
+    return (
+        user.user_id,
+        user.username,
+        user.hashed_password,
+        user.salt,
+        user.registration_date.isoformat(),
+    )
+
+
+def _user_from_row(row: sqlite3.Row) -> User:
+    return User(
+        _user_id=int(row["user_id"]),
+        _username=row["username"],
+        _hashed_password=row["hashed_password"],
+        _salt=row["salt"],
+        _registration_date=datetime.fromisoformat(row["registration_date"]),
+    )
+
+
+def _history_row(record: dict) -> tuple:
+    return (
+        record["id"],
+        record["from_currency"],
+        record["to_currency"],
+        float(record["rate"]),
+        record["timestamp"],
+        record.get("source"),
+        json.dumps(record.get("meta", {}), ensure_ascii=False),
+    )
+
+
+def _history_record(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "from_currency": row["from_currency"],
+        "to_currency": row["to_currency"],
+        "rate": row["rate"],
+        "timestamp": row["timestamp"],
+        "source": row["source"],
+        "meta": json.loads(row["meta"] or "{}"),
+    }
+
+
+class SqliteDatabase(BaseRepository):
+    """SQLite-хранилище (WAL): сделка обновляет одну строку в транзакции."""
+
+    _instance: "SqliteDatabase | None" = None
+
+    def __new__(cls) -> "SqliteDatabase":
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._connect()
+        return cls._instance
+
+    def _connect(self) -> None:
+        settings = get_settings()
+        self.db_file = Path(settings.get("SQLITE_FILE"))
+        self._lock = threading.RLock()
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            self.db_file,
+            check_same_thread=False,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        columns = {
+            r["name"]
+            for r in self._conn.execute("PRAGMA table_info(portfolios)")
+        }
+        if "version" not in columns:
+            # база, созданная до появления версий портфелей
+            self._conn.execute(
+                "ALTER TABLE portfolios "
+                "ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+            )
+            self._conn.commit()
+
+        self._rates: Optional[dict] = None
+        self._rates_key: Optional[tuple] = None
+        self._rates_writes = 0
+        self._rates_generation = 0
+        self._deferred = False
+        self._writes = 0
+        self._accounts_key: Optional[tuple] = None
+        self._accounts_generation = 0
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        """Транзакция записи; в отложенном режиме коммит ждёт flush()."""
+        with self._lock:
+            if self._deferred and not self._conn.in_transaction:
+                self._conn.execute("BEGIN")
+            # точка сохранения: ошибка откатывает только эту запись,
+            # а не всё накопленное в пакете
+            self._conn.execute("SAVEPOINT write")
+            try:
+                yield
+            except Exception:
+                self._conn.execute("ROLLBACK TO write")
+                self._conn.execute("RELEASE write")
+                raise
+            self._conn.execute("RELEASE write")
+            self._writes += 1
+            if not self._deferred and self._conn.in_transaction:
+                self._conn.commit()
+
+    def watched_files(self, kind: str) -> List[Path]:
+        # в режиме WAL коммит другого процесса дописывает файл -wal
+        return [self.db_file, self.db_file.with_name(self.db_file.name + "-wal")]
+
+    def set_deferred(self, enabled: bool) -> None:
+        with self._lock:
+            self._deferred = enabled
+            if not enabled:
+                self._conn.commit()
+
+    @log_action("DB_FLUSH", level=logging.DEBUG)
+    def flush(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    # --- users ---
+
+    @log_action("DB_READ_USERS", level=logging.DEBUG)
+    def load_users(self) -> List[User]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM users ORDER BY user_id"
+            ).fetchall()
+        return [_user_from_row(r) for r in rows]
+
+    def get_user(self, username: str) -> Optional[User]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM users WHERE username = ?",
+                (username,),
+            ).fetchone()
+        return _user_from_row(row) if row else None
+
+    def get_user_by_id(self, user_id: int) -> Optional[User]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM users WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        return _user_from_row(row) if row else None
+
+    def _last_user_id(self) -> int:
+        # id, выделенные импорту, не должны достаться обычной регистрации
+        row = self._conn.execute(
+            "SELECT MAX(COALESCE((SELECT MAX(user_id) FROM users), 0), "
+            "COALESCE((SELECT CAST(value AS INTEGER) FROM meta "
+            "WHERE key = 'user_id_seq'), 0))"
+        ).fetchone()
+        return int(row[0])
+
+    def next_user_id(self) -> int:
+        with self._lock:
+            return self._last_user_id() + 1
+
+    def reserve_user_ids(self, count: int) -> range:
+        with self._write():
+            last = self._last_user_id()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('user_id_seq', ?)",
+                (str(last + count),),
+            )
+        return range(last + 1, last + count + 1)
+
+    @log_action("DB_ADD_USERS", level=logging.DEBUG)
+    def add_users(self, users: List[User]) -> None:
+        try:
+            with self._write():
+                self._conn.executemany(
+                    "INSERT INTO users VALUES (?, ?, ?, ?, ?)",
+                    (_user_row(u) for u in users),
+                )
+        except sqlite3.IntegrityError as exc:
+            raise ConcurrentUpdateError("users") from exc
+
+    @log_action("DB_WRITE_USERS", level=logging.DEBUG)
+    def save_users(self, users: List[User]) -> None:
+        with self._write():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?)",
+                (_user_row(u) for u in users),
+            )
+
+    @log_action("DB_WRITE_USERS", level=logging.DEBUG)
+    def save_user(self, user: User) -> None:
+        # id и имя проверяются в той же транзакции: при гонке регистраций
+        # второй процесс получает конфликт, а не перезаписывает первого
+        try:
+            with self._write():
+                cursor = self._conn.execute(
+                    "INSERT INTO users VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET "
+                    "hashed_password = excluded.hashed_password, "
+                    "salt = excluded.salt "
+                    "WHERE username = excluded.username",
+                    _user_row(user),
+                )
+                if cursor.rowcount == 0:
+                    raise ConcurrentUpdateError("users")
+        except sqlite3.IntegrityError as exc:
+            raise ConcurrentUpdateError("users") from exc
+
+    # --- portfolios ---
+
+    def _wallets_by_user(
+        self,
+        rows: Iterable[sqlite3.Row],
+    ) -> Dict[int, Dict[str, Wallet]]:
+        result: Dict[int, Dict[str, Wallet]] = {}
+        for r in rows:
+            code = r["currency_code"]
+            result.setdefault(int(r["user_id"]), {})[code] = Wallet(
+                currency_code=code,
+                _balance=float(r["balance"]),
+            )
+        return result
+
+    @log_action("DB_READ_PORTFOLIOS", level=logging.DEBUG)
+    def load_portfolios(self) -> List[Portfolio]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, version FROM portfolios ORDER BY user_id"
+            ).fetchall()
+            wallets = self._wallets_by_user(
+                self._conn.execute("SELECT * FROM wallets")
+            )
+        return [
+            Portfolio(
+                _user_id=int(r["user_id"]),
+                _wallets=wallets.get(int(r["user_id"]), {}),
+                _version=int(r["version"]),
+            )
+            for r in rows
+        ]
+
+    def get_portfolio(self, user_id: int) -> Optional[Portfolio]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM portfolios WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+            if not row:
+                return None
+            wallets = self._wallets_by_user(
+                self._conn.execute(
+                    "SELECT * FROM wallets WHERE user_id = ?",
+                    (user_id,),
+                )
+            )
+        return Portfolio(
+            _user_id=user_id,
+            _wallets=wallets.get(user_id, {}),
+            _version=int(row["version"]),
+        )
+
+    def _upsert_portfolios(self, portfolios: Iterable[Portfolio]) -> None:
+        for p in portfolios:
+            self._conn.execute(
+                "INSERT INTO portfolios (user_id, version) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+                (p.user_id, p.version),
+            )
+            # кошельки, которых больше нет в портфеле, удаляются в той же
+            # транзакции — иначе при следующей загрузке они вернутся
+            codes = list(p.wallets)
+            self._conn.execute(
+                "DELETE FROM wallets WHERE user_id = ? AND currency_code "
+                f"NOT IN ({', '.join('?' * len(codes))})",
+                (p.user_id, *codes),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO wallets VALUES (?, ?, ?)",
+                (
+                    (p.user_id, code, w.balance)
+                    for code, w in p.wallets.items()
+                ),
+            )
+
+    @log_action("DB_SAVE_PORTFOLIO", level=logging.DEBUG)
+    def save_portfolios(self, portfolios: List[Portfolio]) -> None:
+        with self._write():
+            self._upsert_portfolios(portfolios)
+
+    def save_portfolio(self, portfolio: Portfolio) -> None:
+        self.save_portfolios([portfolio])
+
+    @log_action("DB_ADD_PORTFOLIOS", level=logging.DEBUG)
+    def add_portfolios(self, portfolios: List[Portfolio]) -> None:
+        try:
+            with self._write():
+                self._conn.executemany(
+                    "INSERT INTO portfolios (user_id, version) VALUES (?, 1)",
+                    ((p.user_id,) for p in portfolios),
+                )
+                self._conn.executemany(
+                    "INSERT INTO wallets VALUES (?, ?, ?)",
+                    (
+                        (p.user_id, code, w.balance)
+                        for p in portfolios
+                        for code, w in p.wallets.items()
+                    ),
+                )
+        except sqlite3.IntegrityError as exc:
+            raise ConcurrentUpdateError("portfolios") from exc
+
+    @log_action("DB_SAVE_PORTFOLIO", level=logging.DEBUG)
+    def save_wallet(
+        self,
+        user_id: int,
+        wallet: Wallet,
+        expected_version: Optional[int] = None,
+    ) -> None:
+        with self._write():
+            self._conn.execute(
+                "INSERT OR IGNORE INTO portfolios (user_id) VALUES (?)",
+                (user_id,),
+            )
+            if expected_version is None:
+                self._conn.execute(
+                    "UPDATE portfolios SET version = version + 1 "
+                    "WHERE user_id = ?",
+                    (user_id,),
+                )
+            else:
+                # compare-and-swap версии портфеля
+                cursor = self._conn.execute(
+                    "UPDATE portfolios SET version = version + 1 "
+                    "WHERE user_id = ? AND version = ?",
+                    (user_id, expected_version),
+                )
+                if cursor.rowcount == 0:
+                    raise ConcurrentUpdateError(f"portfolio {user_id}")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO wallets VALUES (?, ?, ?)",
+                (user_id, wallet.currency_code, wallet.balance),
+            )
+
+    def accounts_generation(self) -> int:
+        # как и для курсов: чужие коммиты видны по data_version,
+        # собственные записи — по счётчику
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            key = (version, self._writes)
+            if key != self._accounts_key:
+                self._accounts_key = key
+                self._accounts_generation += 1
+            return self._accounts_generation
+
+    # --- rates ---
+
+    def _sync_rates(self) -> None:
+        # data_version меняется при коммитах из других соединений,
+        # _rates_writes — при собственных.
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            key = (version, self._rates_writes)
+            if self._rates is not None and key == self._rates_key:
+                return
+            rows = self._conn.execute("SELECT * FROM rates").fetchall()
+            refresh = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'last_refresh'"
+            ).fetchone()
+            pairs = {
+                r["pair"]: {
+                    "rate": r["rate"],
+                    "updated_at": r["updated_at"],
+                    "source": r["source"],
+                }
+                for r in rows
+            }
+            self._rates = {
+                "pairs": pairs,
+                "last_refresh": refresh[0] if refresh else None,
+            }
+            self._rates_key = key
+            self._rates_generation += 1
+
+    def load_rates_snapshot(self) -> dict:
+        self._sync_rates()
+        return self._rates
+
+    def rates_generation(self) -> int:
+        self._sync_rates()
+        return self._rates_generation
+
+    @log_action("DB_SAVE_RATES", level=logging.DEBUG)
+    def save_rates_snapshot(self, data: dict) -> None:
+        pairs = data.get("pairs", {})
+        with self._write():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rates VALUES (?, ?, ?, ?)",
+                (
+                    (
+                        pair,
+                        float(info["rate"]),
+                        info.get("updated_at"),
+                        info.get("source"),
+                    )
+                    for pair, info in pairs.items()
+                ),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('last_refresh', ?)",
+                (data.get("last_refresh"),),
+            )
+            self._rates_writes += 1
+
+    def touch_last_refresh(self, timestamp: str) -> None:
+        with self._write():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('last_refresh', ?)",
+                (timestamp,),
+            )
+        # курсы не изменились: кеш снимка остаётся, меняется только отметка
+        with self._lock:
+            if self._rates is not None:
+                self._rates = {**self._rates, "last_refresh": timestamp}
+
+    @log_action("DB_APPEND_HISTORY", level=logging.DEBUG)
+    def append_exchange_records(self, records: List[dict]) -> None:
+        with self._write():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO exchange_history "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (_history_row(r) for r in records),
+            )
+
+    def iter_exchange_records(self) -> Iterator[dict]:
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT * FROM exchange_history ORDER BY rowid")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for r in rows:
+                yield _history_record(r)
+
+    def read_exchange_records_since(
+        self,
+        cursor: Any = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[dict], Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, * FROM exchange_history "
+                "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (cursor or 0, -1 if limit is None else limit),
+            ).fetchall()
+        if not rows:
+            return [], cursor
+        return [_history_record(r) for r in rows], rows[-1]["rowid"]
+
+
+def _batched(items: Iterable, size: int) -> Iterable[list]:
+    batch: list = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def migrate_from_json(batch_size: int = 1000) -> Dict[str, int]:
+    """Потоково перенести data/*.json в SQLite, пачками по batch_size."""
+    settings = get_settings()
+    json_db = DatabaseManager()
+    # отложенные записи пакетного режима и журнал сделок должны попасть
+    # в файлы, которые читаются ниже
+    json_db.flush()
+    json_db.checkpoint()
+    db = SqliteDatabase()
+    counts = {"users": 0, "portfolios": 0, "rates": 0, "history": 0}
+
+    users = (
+        User.from_json(item)
+        for item in iter_json_array(Path(settings.get("USERS_FILE")))
+    )
+    for batch in _batched(users, batch_size):
+        db.save_users(batch)
+        counts["users"] += len(batch)
+
+    portfolios = (
+        Portfolio.from_json(item)
+        for item in iter_json_array(Path(settings.get("PORTFOLIOS_FILE")))
+    )
+    for batch in _batched(portfolios, batch_size):
+        db.save_portfolios(batch)
+        counts["portfolios"] += len(batch)
+
+    rates_file = Path(settings.get("RATES_FILE"))
+    if rates_file.exists():
+        snapshot = read_file(rates_file)
+        db.save_rates_snapshot(snapshot)
+        counts["rates"] = len(snapshot.get("pairs", {}))
+
+    history = json_db.iter_exchange_records()
+    for batch in _batched(history, batch_size):
+        db.append_exchange_records(batch)
+        counts["history"] += len(batch)
+
+    return counts
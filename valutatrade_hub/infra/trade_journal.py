@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .locking import file_lock
+
+logger = logging.getLogger(__name__)
+
+
+class TradeJournal:
+    """Журнал изменений балансов (write-ahead) с групповым fsync.
+
+    Каждая запись — абсолютные балансы и новая версия портфеля, поэтому
+    повторное применение журнала к контрольной точке идемпотентно. Сделки
+    из разных потоков, ожидающие подтверждения одновременно, делят один
+    fsync. Дозапись идёт под разделяемой блокировкой ``lock_path``,
+    ротация — под исключительной.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        lock_path: Path,
+        commit_delay: float = 0.0,
+    ) -> None:
+        self.path = Path(path)
+        self.rotated_path = self.path.with_name(self.path.name + ".1")
+        self.lock_path = Path(lock_path)
+        self.commit_delay = commit_delay
+        self._cond = threading.Condition()
+        self._fd: Optional[int] = None
+        self._needs_newline = False
+        self._written = 0
+        self._durable = 0
+        self._syncing = False
+
+    def locked(self, shared: bool = False) -> AbstractContextManager[None]:
+        return file_lock(self.lock_path, shared=shared)
+
+    def _is_current(self, fd: int) -> bool:
+        """Не отложил ли журнал другой процесс, пока файл был открыт."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        own = os.fstat(fd)
+        return (st.st_dev, st.st_ino) == (own.st_dev, own.st_ino)
+
+    def _open(self) -> int:
+        if self._fd is not None and not self._is_current(self._fd):
+            self._close_locked()
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            size = os.fstat(fd).st_size
+            # недописанная после сбоя строка останется отдельной битой
+            # строкой и не склеится со следующей записью
+            self._needs_newline = size > 0 and os.pread(fd, 1, size - 1) != b"\n"
+            self._fd = fd
+        return self._fd
+
+    def write(self, entries: Iterable[dict]) -> int:
+        """Дописать записи без fsync; вернуть номер для commit().
+
+        Вызывающий держит ``locked(shared=True)``.
+        """
+        data = "".join(
+            json.dumps(e, ensure_ascii=False) + "\n" for e in entries
+        ).encode("utf-8")
+        with self._cond:
+            fd = self._open()
+            if self._needs_newline:
+                data = b"\n" + data
+                self._needs_newline = False
+            # один write на O_APPEND: строки разных процессов не смешиваются
+            os.write(fd, data)
+            self._written += 1
+            return self._written
+
+    def commit(self, ticket: int) -> None:
+        """Дождаться, пока запись с номером ticket окажется на диске.
+
+        Первый ожидающий становится ведущим и делает fsync за всех,
+        кто успел записаться к этому моменту; остальные ждут его.
+        """
+        with self._cond:
+            while self._durable < ticket and self._syncing:
+                self._cond.wait()
+            if self._durable >= ticket:
+                return
+            self._syncing = True
+        target = ticket
+        try:
+            if self.commit_delay > 0:
+                time.sleep(self.commit_delay)
+            with self._cond:
+                target = self._written
+                fd = self._fd
+            if fd is not None:
+                os.fsync(fd)
+        finally:
+            with self._cond:
+                self._syncing = False
+                self._durable = max(self._durable, target)
+                self._cond.notify_all()
+
+    def sync(self) -> None:
+        self.commit(self._written)
+
+    def size(self) -> int:
+        with self._cond:
+            if self._fd is not None:
+                return os.fstat(self._fd).st_size
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _close_locked(self) -> None:
+        while self._syncing:
+            self._cond.wait()
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        self._durable = self._written
+
+    def close(self) -> None:
+        with self._cond:
+            self._close_locked()
+
+    def rotate(self) -> None:
+        """Отложить текущий журнал перед записью контрольной точки.
+
+        Вызывающий держит ``locked()``. Остаток от прерванной контрольной
+        точки не теряется: активный журнал дописывается в его конец.
+        """
+        with self._cond:
+            self._close_locked()
+            if not self.path.exists():
+                return
+            if self.rotated_path.exists():
+                with self.rotated_path.open("ab") as dst:
+                    with self.path.open("rb") as src:
+                        dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                self.path.unlink()
+            else:
+                self.path.replace(self.rotated_path)
+
+    def discard_rotated(self) -> None:
+        """Контрольная точка записана — отложенный журнал больше не нужен."""
+        try:
+            self.rotated_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _parse(self, raw: bytes) -> Optional[dict]:
+        if not raw.strip():
+            return None
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            # недописанная строка после сбоя
+            logger.warning("Skipping broken line in %s", self.path.name)
+            return None
+
+    def iter_rotated(self) -> Iterator[dict]:
+        if not self.rotated_path.exists():
+            return
+        with self.rotated_path.open("rb") as f:
+            for raw in f:
+                entry = self._parse(raw)
+                if entry is not None:
+                    yield entry
+
+    def tail(
+        self,
+        offset: int = 0,
+        inode: Optional[int] = None,
+    ) -> Optional[Tuple[List[dict], int, Optional[int]]]:
+        """Записи активного журнала после смещения и новое (смещение, inode).
+
+        None — журнал с тех пор заменён, нужно перечитать всё.
+        """
+        try:
+            f = self.path.open("rb")
+        except FileNotFoundError:
+            return [], 0, None
+        with f:
+            st = os.fstat(f.fileno())
+            if inode is not None and st.st_ino != inode or st.st_size < offset:
+                return None
+            f.seek(offset)
+            entries: List[dict] = []
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # строка ещё дописывается
+                offset += len(raw)
+                entry = self._parse(raw)
+                if entry is not None:
+                    entries.append(entry)
+        return entries, offset, st.st_ino
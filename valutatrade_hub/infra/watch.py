@@ -0,0 +1,114 @@
+"""Ожидание изменений файлов данных: inotify (Linux) или опрос.
+
+Наблюдатель только будит вызывающего («что-то могло измениться»);
+изменились ли данные на самом деле, тот проверяет сам по поколению
+хранилища, поэтому ложное пробуждение стоит одного stat().
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT = struct.Struct("iIII")
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+class PollingWatcher:
+    """Запасной вариант: просыпаться раз в ``interval`` секунд."""
+
+    def __init__(self, interval: float = 1.0) -> None:
+        self.interval = interval
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """inotify через ctypes на каталогах наблюдаемых файлов.
+
+    Наблюдаются каталоги, а не сами файлы: снимки заменяются через
+    rename, и наблюдение за старым inode потерялось бы.
+    """
+
+    def __init__(self, paths: Iterable[Path]) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._names = {Path(p).name for p in paths}
+        for directory in {Path(p).resolve().parent for p in paths}:
+            wd = libc.inotify_add_watch(
+                self._fd,
+                os.fsencode(directory),
+                ctypes.c_uint32(_WATCH_MASK),
+            )
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch {directory}")
+
+    def _drain(self) -> bool:
+        """Прочитать накопленные события; True, если есть по нашим файлам."""
+        matched = False
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return matched
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if os.fsdecode(name) in self._names:
+                    matched = True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                return False
+            if self._drain():
+                return True
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(paths: List[Path], poll_interval: float = 1.0):
+    """inotify, если доступен и каталоги существуют, иначе опрос."""
+    if paths:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError) as exc:
+            logger.info("inotify unavailable (%s), polling", exc)
+    return PollingWatcher(poll_interval)
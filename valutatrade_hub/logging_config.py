@@ -1,40 +1,214 @@
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .infra.settings import get_settings
 
 _LOGGING_CONFIGURED = False
+_listener: Optional[QueueListener] = None
+
+
+class _LazyRotatingFileHandler(RotatingFileHandler):
+    """Открывает файл (и создаёт каталог) только при первой записи."""
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "msg": record.getMessage(),
+        }
+        action = getattr(record, "action", None)
+        if action:
+            entry["action"] = action
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Прореживание частых сообщений уровня INFO и ниже.
+
+    Не больше ``limit`` записей с одним ключом за ``window`` секунд
+    (ключ — поле ``action`` записи или шаблон сообщения), плюс случайная
+    выборка доли ``sample``. Предупреждения и ошибки проходят всегда.
+    Число подавленных записей дописывается к следующей пропущенной.
+    """
+
+    def __init__(self, limit: int = 0, window: float = 1.0, sample: float = 1.0):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.sample = sample
+        self._lock = threading.Lock()
+        # ключ -> (начало окна, записей в окне, подавлено)
+        self._windows: Dict[Tuple[str, str], List[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # фильтр может стоять на нескольких обработчиках: решение одно
+        decision = getattr(record, "_rate_limit_passed", None)
+        if decision is None:
+            decision = record._rate_limit_passed = self._decide(record)
+        return decision
+
+    def _decide(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return False
+        if self.limit <= 0:
+            return True
+        key = (record.name, getattr(record, "action", None) or str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = int(state[2]) if state else 0
+                self._windows[key] = [now, 1, 0]
+            elif state[1] < self.limit:
+                state[1] += 1
+                suppressed = 0
+            else:
+                state[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.getMessage()} [+{suppressed} similar suppressed]"
+            record.args = None
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler, который не форматирует запись и не ждёт очередь.
+
+    Очередь внутри процесса, поэтому запись не сериализуется: в потоке
+    команды только подставляются аргументы сообщения. Если очередь полна
+    (диск не успевает), запись отбрасывается, а число потерь сообщается
+    следующей записью.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            notice = logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                "Log queue full, dropped %d records", (dropped,), None,
+            )
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                self.dropped += dropped
 
-def configure_logging() -> None:
-    global _LOGGING_CONFIGURED
+
+def _stop_listener(
+    handler: logging.Handler,
+    targets: List[logging.Handler],
+) -> None:
+    # после остановки потока записи идут в обработчики напрямую
+    if _listener is not None:
+        _listener.stop()
+    root_logger = logging.getLogger()
+    root_logger.removeHandler(handler)
+    for target in targets:
+        root_logger.addHandler(target)
+
+
+def configure_logging(log_format: Optional[str] = None) -> None:
+    """Журнал в logs/app.log и stderr через очередь и фоновый поток.
+
+    Команды только кладут запись в очередь; форматирование, ротация
+    и запись на диск выполняются потоком QueueListener.
+    """
+    global _LOGGING_CONFIGURED, _listener
     if _LOGGING_CONFIGURED:
         return
 
-    logs_dir = Path("logs")
-    logs_dir.mkdir(exist_ok=True)
+    settings = get_settings()
+    log_format = (log_format or settings.get("LOG_FORMAT", "text")).lower()
+    logfile = Path("logs") / "app.log"
 
-    logfile = logs_dir / "app.log"
-
-    handler = RotatingFileHandler(
+    handler = _LazyRotatingFileHandler(
         logfile,
         maxBytes=1_000_000,
         backupCount=3,
         encoding="utf-8",
+        delay=True,
     )
 
-    fmt = (
-        "%(levelname)s %(asctime)s "
-        "%(name)s %(funcName)s: %(message)s"
-    )
-    formatter = logging.Formatter(fmt=fmt, datefmt="%Y-%m-%dT%H:%M:%S")
+    datefmt = "%Y-%m-%dT%H:%M:%S"
+    if log_format == "json":
+        formatter: logging.Formatter = JsonFormatter(datefmt=datefmt)
+    else:
+        fmt = (
+            "%(levelname)s %(asctime)s "
+            "%(name)s %(funcName)s: %(message)s"
+        )
+        formatter = logging.Formatter(fmt=fmt, datefmt=datefmt)
     handler.setFormatter(formatter)
 
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(handler)
 
-    console = logging.StreamHandler()
-    console.setFormatter(formatter)
-    root_logger.addHandler(console)
+    rate_limit = RateLimitFilter(
+        limit=int(settings.get("LOG_RATE_LIMIT", 0)),
+        window=float(settings.get("LOG_RATE_WINDOW", 1.0)),
+        sample=float(settings.get("LOG_INFO_SAMPLE", 1.0)),
+    )
+    targets: List[logging.Handler] = [handler, console]
+    if not settings.get("LOG_QUEUE", True):
+        for target in targets:
+            target.addFilter(rate_limit)
+            root_logger.addHandler(target)
+        _LOGGING_CONFIGURED = True
+        return
+
+    queue_handler = NonBlockingQueueHandler(
+        queue.Queue(maxsize=int(settings.get("LOG_QUEUE_SIZE", 10000)))
+    )
+    queue_handler.addFilter(rate_limit)
+    root_logger.addHandler(queue_handler)
+    _listener = QueueListener(
+        queue_handler.queue,
+        *targets,
+        respect_handler_level=True,
+    )
+    _listener.start()
+    atexit.register(_stop_listener, queue_handler, targets)
 
     _LOGGING_CONFIGURED = True
@@ -1,45 +1,162 @@
 from __future__ import annotations
 
+import json
 import logging
+import math
+import random
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from ..core.exceptions import ApiRequestError
+from ..core.utils import parse_timestamp
+from ..decorators import log_action
 from .config import ParserConfig
 
 logger = logging.getLogger(__name__)
 
 
 class BaseApiClient(ABC):
+    # Сессия и валидаторы кеша (ETag/Last-Modified) общие для процесса:
+    # соединения переиспользуются между запусками обновления.
+    _session: Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+    _validators: Dict[str, Dict[str, str]] = {}
+
     def __init__(self, config: ParserConfig) -> None:
         self.config = config
+        self.last_meta: Dict[str, Any] = {}
 
     @abstractmethod
     def fetch_rates(self) -> Dict[str, float]:
         raise NotImplementedError
 
+    def _get_session(self) -> requests.Session:
+        with BaseApiClient._session_lock:
+            if BaseApiClient._session is None:
+                retry = Retry(
+                    total=self.config.MAX_RETRIES,
+                    backoff_factor=self.config.RETRY_BACKOFF,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=("GET",),
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=self.config.POOL_SIZE,
+                    pool_maxsize=self.config.POOL_SIZE,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                BaseApiClient._session = session
+            return BaseApiClient._session
 
-class CoinGeckoClient(BaseApiClient):
-    def fetch_rates(self) -> Dict[str, float]:
-        ids = ",".join(
-            self.config.CRYPTO_ID_MAP[code]
-            for code in self.config.CRYPTO_CURRENCIES
+    def _request(
+        self,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+    ) -> Tuple[Optional[requests.Response], Dict[str, Any]]:
+        """GET с условными заголовками: (ответ или None при 304, метаданные).
+
+        Не трогает ``last_meta``, поэтому безопасен для параллельных
+        запросов одного клиента.
+        """
+        key = url + "?" + "&".join(
+            f"{k}={v}" for k, v in sorted((params or {}).items())
+        )
+        validators = self._validators.get(key, {})
+        headers: Dict[str, str] = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+        started = time.perf_counter()
+        resp = self._get_session().get(
+            url,
+            params=params,
+            headers=headers,
+            timeout=self.config.REQUEST_TIMEOUT,
         )
-        params = {
-            "ids": ids,
-            "vs_currencies": self.config.BASE_CURRENCY.lower(),
+        request_ms = (time.perf_counter() - started) * 1000
+        etag = resp.headers.get("ETag", validators.get("etag", ""))
+        meta = {
+            "request_ms": round(request_ms, 1),
+            "status_code": resp.status_code,
+            "etag": etag,
+            "not_modified": resp.status_code == 304,
+            "raw_ids": {},
         }
+        if resp.status_code == 304:
+            return None, meta
+        if resp.status_code == 200:
+            self._validators[key] = {
+                "etag": resp.headers.get("ETag", ""),
+                "last_modified": resp.headers.get("Last-Modified", ""),
+            }
+        return resp, meta
+
+    def _get(
+        self,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+    ) -> Optional[requests.Response]:
+        """GET с условными заголовками; None, если ответ 304."""
+        resp, self.last_meta = self._request(url, params)
+        return resp
+
+
+def _id_batches(ids: List[str], max_length: int) -> List[List[str]]:
+    """Разбить ids на пачки, чей параметр ids (с %2C) не длиннее max_length."""
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    length = 0
+    for coin_id in ids:
+        # запятая в URL кодируется как %2C
+        size = len(quote(coin_id, safe="")) + (3 if batch else 0)
+        if batch and length + size > max_length:
+            batches.append(batch)
+            batch, length = [], 0
+            size -= 3
+        batch.append(coin_id)
+        length += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class CoinGeckoClient(BaseApiClient):
+    """Курсы криптовалют из CRYPTO_ID_MAP.
+
+    Список ids делится на пачки так, чтобы URL запроса не превышал
+    COINGECKO_MAX_URL_LENGTH; пачки запрашиваются параллельно, у каждой
+    свой ETag. Ошибка части пачек не отменяет курсы остальных.
+    """
+
+    def _fetch_batch(
+        self,
+        ids: List[str],
+        codes: Dict[str, str],
+    ) -> Tuple[Dict[str, float], Dict[str, Any]]:
+        vs = self.config.BASE_CURRENCY.lower()
+        params = {"ids": ",".join(ids), "vs_currencies": vs}
         try:
-            resp = requests.get(
-                self.config.COINGECKO_URL,
-                params=params,
-                timeout=self.config.REQUEST_TIMEOUT,
-            )
+            resp, meta = self._request(self.config.COINGECKO_URL, params=params)
         except requests.exceptions.RequestException as exc:
             raise ApiRequestError(f"CoinGecko network error: {exc}") from exc
 
+        if resp is None:
+            return {}, meta
+
         if resp.status_code != 200:
             raise ApiRequestError(
                 f"CoinGecko HTTP {resp.status_code}: {resp.text[:200]}"
@@ -47,18 +164,79 @@ class CoinGeckoClient(BaseApiClient):
 
         data = resp.json()
         result: Dict[str, float] = {}
-        for code in self.config.CRYPTO_CURRENCIES:
-            coin_id = self.config.CRYPTO_ID_MAP[code]
-            price_info = data.get(coin_id, {})
-            value = price_info.get(self.config.BASE_CURRENCY.lower())
+        for coin_id in ids:
+            value = data.get(coin_id, {}).get(vs)
             if value is not None:
-                pair = f"{code}_{self.config.BASE_CURRENCY}"
+                pair = f"{codes[coin_id]}_{self.config.BASE_CURRENCY}"
                 result[pair] = float(value)
-        logger.info("CoinGecko fetched %d rates", len(result))
+                meta["raw_ids"][pair] = coin_id
+        return result, meta
+
+    @log_action("API_COINGECKO", level=logging.DEBUG)
+    def fetch_rates(self) -> Dict[str, float]:
+        codes = {
+            self.config.CRYPTO_ID_MAP[code]: code
+            for code in self.config.CRYPTO_CURRENCIES
+            if code in self.config.CRYPTO_ID_MAP
+        }
+        base_length = len(self.config.COINGECKO_URL) + len(
+            f"?ids=&vs_currencies={self.config.BASE_CURRENCY.lower()}"
+        )
+        batches = _id_batches(
+            sorted(codes),
+            max(1, self.config.COINGECKO_MAX_URL_LENGTH - base_length),
+        )
+        if not batches:
+            self.last_meta = _offline_meta()
+            return {}
+
+        outcomes: List[Tuple[Dict[str, float], Dict[str, Any]]] = []
+        errors: List[ApiRequestError] = []
+        workers = max(1, min(len(batches), self.config.POOL_SIZE))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(self._fetch_batch, batch, codes) for batch in batches
+            ]
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except ApiRequestError as exc:
+                    errors.append(exc)
+
+        if errors and not outcomes:
+            raise errors[0]
+        result: Dict[str, float] = {}
+        raw_ids: Dict[str, str] = {}
+        for rates, meta in outcomes:
+            result.update(rates)
+            raw_ids.update(meta["raw_ids"])
+        metas = [meta for _, meta in outcomes]
+        self.last_meta = {
+            "request_ms": max(meta["request_ms"] for meta in metas),
+            "status_code": 200 if result else metas[0]["status_code"],
+            "etag": metas[0]["etag"] if len(metas) == 1 else "",
+            "not_modified": not errors and all(m["not_modified"] for m in metas),
+            "raw_ids": raw_ids,
+            "batches": len(batches),
+        }
+        if errors:
+            logger.warning(
+                "CoinGecko: %d of %d batches failed: %s",
+                len(errors),
+                len(batches),
+                errors[0],
+            )
+        if self.last_meta["not_modified"]:
+            logger.info("CoinGecko not modified")
+            return {}
+        logger.info(
+            "CoinGecko fetched %d rates in %d batches", len(result), len(batches)
+        )
         return result
 
 
 class ExchangeRateApiClient(BaseApiClient):
+    @log_action("API_EXCHANGERATE", level=logging.DEBUG)
     def fetch_rates(self) -> Dict[str, float]:
         if not self.config.EXCHANGERATE_API_KEY:
             raise ApiRequestError(
@@ -71,15 +249,16 @@ class ExchangeRateApiClient(BaseApiClient):
             f"{self.config.BASE_CURRENCY}"
         )
         try:
-            resp = requests.get(
-                url,
-                timeout=self.config.REQUEST_TIMEOUT,
-            )
+            resp = self._get(url)
         except requests.exceptions.RequestException as exc:
             raise ApiRequestError(
                 f"ExchangeRate-API network error: {exc}"
             ) from exc
 
+        if resp is None:
+            logger.info("ExchangeRate-API not modified")
+            return {}
+
         if resp.status_code != 200:
             raise ApiRequestError(
                 f"ExchangeRate-API HTTP {resp.status_code}: "
@@ -92,14 +271,183 @@ class ExchangeRateApiClient(BaseApiClient):
                 f"ExchangeRate-API error: {data.get('error-type')}"
             )
 
-        rates = data.get("rates", {})
+        # conversion_rates: 1 BASE = value CODE; пара CODE_BASE хранит
+        # цену CODE в BASE, поэтому курс обращается
+        rates = data.get("conversion_rates") or data.get("rates") or {}
+        base = self.config.BASE_CURRENCY
+        wanted = self.config.FIAT_CURRENCIES
         result: Dict[str, float] = {}
-        for code in self.config.FIAT_CURRENCIES:
-            if code == self.config.BASE_CURRENCY:
+        for code, value in rates.items():
+            if code == base or (wanted is not None and code not in wanted):
                 continue
-            value = rates.get(code)
-            if value is not None:
-                pair = f"{code}_{self.config.BASE_CURRENCY}"
-                result[pair] = float(value)
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if value > 0:
+                pair = f"{code}_{base}"
+                result[pair] = 1.0 / value
+                self.last_meta["raw_ids"][pair] = code
         logger.info("ExchangeRate-API fetched %d rates", len(result))
         return result
+
+
+def _offline_meta(not_modified: bool = False) -> Dict[str, Any]:
+    return {
+        "request_ms": 0.0,
+        "status_code": 304 if not_modified else 200,
+        "etag": "",
+        "not_modified": not_modified,
+        "raw_ids": {},
+    }
+
+
+def _iter_history_file(path: Path) -> Iterator[dict]:
+    """Записи истории из exchange_rates.json (массив) или .jsonl."""
+    if path.suffix == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    from ..infra.serialization import read_file
+
+    yield from read_file(path, default=[]) or []
+
+
+class ReplayApiClient(BaseApiClient):
+    """Провайдер без сети: проигрывает записанную историю курсов.
+
+    Записи группируются по времени в кадры (один кадр — один ответ
+    провайдера). Часы воспроизведения идут в ``speed`` раз быстрее
+    реальных; запрос возвращает последние курсы кадров, наступивших с
+    прошлого запроса, или «304», если таких нет. ``speed=0`` — каждый
+    запрос отдаёт следующий кадр. По окончании записи воспроизведение
+    начинается сначала (``loop``) или бросается ApiRequestError.
+    """
+
+    def __init__(
+        self,
+        config: ParserConfig,
+        path: Optional[str] = None,
+        speed: Optional[float] = None,
+        loop: bool = True,
+    ) -> None:
+        super().__init__(config)
+        path = path or config.REPLAY_FILE
+        if path:
+            records: Iterable[dict] = _iter_history_file(Path(path))
+        else:
+            from ..infra.database import get_db
+
+            records = get_db().iter_exchange_records()
+        frames: Dict[str, Dict[str, float]] = {}
+        for rec in records:
+            pair = f"{rec['from_currency']}_{rec['to_currency']}"
+            frames.setdefault(rec["timestamp"], {})[pair] = float(rec["rate"])
+        self.frames: List[Tuple[float, Dict[str, float]]] = sorted(
+            (parse_timestamp(ts).timestamp(), pairs) for ts, pairs in frames.items()
+        )
+        if not self.frames:
+            raise ApiRequestError(f"нет записей для воспроизведения ({path})")
+        self.speed = config.REPLAY_SPEED if speed is None else speed
+        self.loop = loop
+        self._position = 0
+        self._started: Optional[float] = None
+
+    def _due(self) -> int:
+        """Индекс кадра, до которого дошли часы воспроизведения."""
+        if self.speed <= 0:
+            return self._position + 1
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now
+        replay_ts = self.frames[0][0] + (now - self._started) * self.speed
+        due = self._position
+        while due < len(self.frames) and self.frames[due][0] <= replay_ts:
+            due += 1
+        return due
+
+    def fetch_rates(self) -> Dict[str, float]:
+        if self._position >= len(self.frames):
+            if not self.loop:
+                raise ApiRequestError("запись истории воспроизведена до конца")
+            self._position, self._started = 0, None
+        due = self._due()
+        if due == self._position:
+            self.last_meta = _offline_meta(not_modified=True)
+            return {}
+        result: Dict[str, float] = {}
+        for _, pairs in self.frames[self._position:due]:
+            result.update(pairs)
+        self._position = due
+        self.last_meta = _offline_meta()
+        return result
+
+
+class SyntheticApiClient(BaseApiClient):
+    """Провайдер без сети: случайное блуждание курсов ``pairs`` пар.
+
+    Блуждание делает ``frequency`` шагов в секунду (0 — один шаг на
+    запрос); за шаг сдвигается доля пар ``change_fraction`` на
+    логнормальную величину с волатильностью ``volatility``. Если с
+    прошлого запроса шагов не было, ответ — «304».
+    """
+
+    def __init__(
+        self,
+        config: ParserConfig,
+        pairs: Optional[int] = None,
+        volatility: Optional[float] = None,
+        frequency: Optional[float] = None,
+        change_fraction: Optional[float] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        super().__init__(config)
+        count = config.SYNTHETIC_PAIRS if pairs is None else pairs
+        self.volatility = (
+            config.SYNTHETIC_VOLATILITY if volatility is None else volatility
+        )
+        self.frequency = (
+            config.SYNTHETIC_FREQUENCY if frequency is None else frequency
+        )
+        self.change_fraction = (
+            config.SYNTHETIC_CHANGE_FRACTION
+            if change_fraction is None
+            else change_fraction
+        )
+        self._random = random.Random(seed)
+        base = config.BASE_CURRENCY
+        self.rates = {
+            f"S{i:05d}_{base}": math.exp(self._random.uniform(-5, 10))
+            for i in range(count)
+        }
+        self._last_step: Optional[float] = None
+
+    def _steps(self) -> int:
+        if self.frequency <= 0:
+            return 1
+        now = time.monotonic()
+        steps = int((now - self._last_step) * self.frequency)
+        self._last_step += steps / self.frequency
+        return steps
+
+    def fetch_rates(self) -> Dict[str, float]:
+        if self._last_step is None:
+            # первый запрос — начальные курсы
+            self._last_step = time.monotonic()
+            self.last_meta = _offline_meta()
+            return dict(self.rates)
+        steps = self._steps()
+        if steps == 0:
+            self.last_meta = _offline_meta(not_modified=True)
+            return {}
+        rnd = self._random
+        # сумма steps независимых шагов — один шаг с sigma * sqrt(steps)
+        sigma = self.volatility * math.sqrt(steps)
+        moved = 1 - (1 - self.change_fraction) ** steps
+        for pair, rate in self.rates.items():
+            if moved >= 1 or rnd.random() < moved:
+                self.rates[pair] = rate * math.exp(rnd.gauss(0, sigma))
+        self.last_meta = _offline_meta()
+        return dict(self.rates)
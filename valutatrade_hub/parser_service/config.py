@@ -1,28 +1,76 @@
 import os
 from dataclasses import dataclass
 
+from ..core.currencies import coingecko_ids
+
 
 @dataclass
 class ParserConfig:
     EXCHANGERATE_API_KEY: str | None = os.getenv("EXCHANGERATE_API_KEY")
 
-    COINGECKO_URL: str = "https://api.coingecko.com/api/v3/simple/price"
-    EXCHANGERATE_API_URL: str = "https://v6.exchangerate-api.com/v6"
+    # адреса переопределяются, например, локальной заглушкой API
+    COINGECKO_URL: str = os.getenv(
+        "COINGECKO_URL",
+        "https://api.coingecko.com/api/v3/simple/price",
+    )
+    EXCHANGERATE_API_URL: str = os.getenv(
+        "EXCHANGERATE_API_URL",
+        "https://v6.exchangerate-api.com/v6",
+    )
 
+    # Набор активов берётся из каталога валют (core/assets.json):
+    # криптовалюты — все с coingecko_id, фиатные — все валюты ответа
+    # ExchangeRate-API, если FIAT_CURRENCIES не ограничивает их явно.
     BASE_CURRENCY: str = "USD"
-    FIAT_CURRENCIES: tuple[str, ...] = ("EUR", "GBP", "RUB")
-    CRYPTO_CURRENCIES: tuple[str, ...] = ("BTC", "ETH", "SOL")
+    FIAT_CURRENCIES: tuple[str, ...] | None = None
+    CRYPTO_CURRENCIES: tuple[str, ...] = None
     CRYPTO_ID_MAP: dict[str, str] = None
 
     RATES_FILE_PATH: str = "data/rates.json"
     HISTORY_FILE_PATH: str = "data/exchange_rates.json"
 
     REQUEST_TIMEOUT: int = 10
+    MAX_RETRIES: int = 3
+    RETRY_BACKOFF: float = 0.5
+    POOL_SIZE: int = 10
+    # ids CoinGecko делятся на пачки, чтобы URL не превышал лимит;
+    # пачки запрашиваются параллельно (не больше POOL_SIZE сразу)
+    COINGECKO_MAX_URL_LENGTH: int = 2000
+
+    DEFAULT_UPDATE_INTERVAL: int = 300
+    UPDATE_INTERVALS: dict[str, int] = None
+    UPDATE_JITTER: float = 5.0
+    VOLATILITY_THRESHOLD: float = 0.005
+
+    # Относительное изменение курса, ниже которого он не пишется ни в
+    # снимок, ни в историю; CHANGE_THRESHOLDS — пороги отдельных пар.
+    # Отрицательный порог — писать каждый полученный курс.
+    CHANGE_THRESHOLD: float = 0.0001
+    CHANGE_THRESHOLDS: dict[str, float] = None
+    # не реже этого (секунды) пара пишется в историю целиком (ключевой кадр)
+    KEYFRAME_INTERVAL: int = 3600
+
+    # Офлайн-провайдеры для нагрузочных тестов (--source synthetic|replay).
+    # SYNTHETIC_FREQUENCY — шагов блуждания в секунду, 0 — шаг на запрос.
+    SYNTHETIC_PAIRS: int = 1000
+    SYNTHETIC_VOLATILITY: float = 0.001
+    SYNTHETIC_FREQUENCY: float = 1.0
+    SYNTHETIC_CHANGE_FRACTION: float = 1.0
+    # None — история из хранилища; REPLAY_SPEED — ускорение времени
+    REPLAY_FILE: str | None = os.getenv("VALUTA_REPLAY_FILE")
+    REPLAY_SPEED: float = 60.0
 
     def __post_init__(self) -> None:
         if self.CRYPTO_ID_MAP is None:
-            self.CRYPTO_ID_MAP = {
-                "BTC": "bitcoin",
-                "ETH": "ethereum",
-                "SOL": "solana",
+            self.CRYPTO_ID_MAP = coingecko_ids()
+        if self.CRYPTO_CURRENCIES is None:
+            self.CRYPTO_CURRENCIES = tuple(self.CRYPTO_ID_MAP)
+        if self.CHANGE_THRESHOLDS is None:
+            self.CHANGE_THRESHOLDS = {}
+        if self.UPDATE_INTERVALS is None:
+            self.UPDATE_INTERVALS = {
+                "CoinGeckoClient": 60,
+                "ExchangeRateApiClient": 3600,
+                "SyntheticApiClient": 1,
+                "ReplayApiClient": 1,
             }
@@ -1,20 +1,207 @@
 from __future__ import annotations
 
 import logging
+import math
+import random
+import signal
+import threading
 import time
-from typing import List
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 
+from ..infra.database import get_db
 from .api_clients import BaseApiClient
 from .updater import RatesUpdater
 
 logger = logging.getLogger(__name__)
 
 
-def run_scheduler(clients: List[BaseApiClient], interval_seconds: int) -> None:
-    updater = RatesUpdater(clients)
-    while True:
+@dataclass
+class ProviderSchedule:
+    """Расписание одного провайдера.
+
+    Тики выровнены по настенным часам (кратны интервалу), поэтому время
+    запроса не сдвигает период. Интервал адаптируется к волатильности:
+    сокращается вдвое при движении курса больше ``volatility_threshold``
+    и растёт обратно, когда рынок спокоен.
+    """
+
+    client: BaseApiClient
+    interval: float
+    jitter: float = 0.0
+    min_interval: Optional[float] = None
+    max_interval: Optional[float] = None
+    volatility_threshold: float = 0.005
+
+    current_interval: float = field(init=False)
+    next_run: float = field(init=False, default=0.0)
+    last_rates: Dict[str, float] = field(init=False, default_factory=dict)
+
+    def __post_init__(self) -> None:
+        if self.min_interval is None:
+            self.min_interval = max(1.0, self.interval / 4)
+        if self.max_interval is None:
+            self.max_interval = self.interval
+        self.current_interval = self.interval
+
+    @property
+    def name(self) -> str:
+        return self.client.__class__.__name__
+
+    def schedule_next(self, now: float) -> None:
+        interval = self.current_interval
+        tick = (math.floor(now / interval) + 1) * interval
+        # джиттер не больше 10% интервала, чтобы не съедать сетку
+        self.next_run = tick + random.uniform(0, min(self.jitter, interval / 10))
+
+    def observe(self, rates: Dict[str, float]) -> float:
+        """Учесть новые курсы и подстроить интервал; вернуть волатильность."""
+        changes = [
+            abs(rate - self.last_rates[pair]) / self.last_rates[pair]
+            for pair, rate in rates.items()
+            if self.last_rates.get(pair)
+        ]
+        self.last_rates.update(rates)
+        volatility = max(changes, default=0.0)
+        if volatility > self.volatility_threshold:
+            self.current_interval = max(
+                self.min_interval,
+                self.current_interval / 2,
+            )
+        elif volatility < self.volatility_threshold / 4:
+            self.current_interval = min(
+                self.max_interval,
+                self.current_interval * 2,
+            )
+        return volatility
+
+
+class RatesScheduler:
+    def __init__(self, schedules: List[ProviderSchedule]) -> None:
+        self.schedules = schedules
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run_provider(self, schedule: ProviderSchedule) -> None:
         try:
-            updater.run_update()
+            result = RatesUpdater([schedule.client]).run_update()
         except Exception as exc:
-            logger.error("Scheduler iteration failed: %s", exc)
-        time.sleep(interval_seconds)
+            logger.error("Scheduler update of %s failed: %s", schedule.name, exc)
+            return
+        volatility = schedule.observe(result.get("pairs", {}))
+        logger.info(
+            "%s tick: volatility=%.4f next interval=%.0fs",
+            schedule.name,
+            volatility,
+            schedule.current_interval,
+        )
+
+    def _provider_loop(self, schedule: ProviderSchedule) -> None:
+        while not self._stop.is_set():
+            delay = schedule.next_run - time.time()
+            if delay > 0 and self._stop.wait(delay):
+                return
+            self._run_provider(schedule)
+            schedule.schedule_next(time.time())
+
+    def run(self) -> None:
+        """Цикл до stop(): у каждого провайдера свой поток и своя сетка.
+
+        Потоки спят на общем Event, поэтому между тиками CPU не тратится,
+        а остановка будит их сразу.
+        """
+        now = time.time()
+        workers = []
+        for schedule in self.schedules:
+            # первый запуск сразу, дальше — по сетке интервала
+            schedule.next_run = now
+            worker = threading.Thread(
+                target=self._provider_loop,
+                args=(schedule,),
+                name=f"rates-{schedule.name}",
+                daemon=True,
+            )
+            worker.start()
+            workers.append(worker)
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        finally:
+            self._stop.set()
+            for worker in workers:
+                worker.join()
+            get_db().flush()
+            logger.info("Scheduler stopped")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start_background(self) -> threading.Thread:
+        """Запустить цикл в фоновом потоке (рядом с интерактивным CLI)."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run,
+            name="rates-scheduler",
+            daemon=True,
+        )
+        self._thread.start()
+        return self._thread
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def install_signal_handlers(self) -> Dict[int, Any]:
+        """SIGTERM/SIGINT останавливают цикл после текущего тика;
+        возвращает прежние обработчики."""
+
+        def _handler(signum: int, frame: object) -> None:
+            logger.info("Received signal %d, stopping scheduler", signum)
+            self.stop()
+
+        previous = {}
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous[signum] = signal.signal(signum, _handler)
+        return previous
+
+
+def build_schedules(
+    clients: List[BaseApiClient],
+    interval_seconds: Optional[float] = None,
+) -> List[ProviderSchedule]:
+    """Расписания по ParserConfig.UPDATE_INTERVALS клиентов."""
+    schedules = []
+    for client in clients:
+        config = client.config
+        name = client.__class__.__name__
+        interval = interval_seconds or config.UPDATE_INTERVALS.get(
+            name,
+            config.DEFAULT_UPDATE_INTERVAL,
+        )
+        schedules.append(
+            ProviderSchedule(
+                client=client,
+                interval=float(interval),
+                jitter=config.UPDATE_JITTER,
+                volatility_threshold=config.VOLATILITY_THRESHOLD,
+            )
+        )
+    return schedules
+
+
+def run_scheduler(
+    clients: List[BaseApiClient],
+    interval_seconds: Optional[float] = None,
+) -> None:
+    """Цикл планировщика в текущем потоке до SIGTERM/SIGINT."""
+    scheduler = RatesScheduler(build_schedules(clients, interval_seconds))
+    previous = scheduler.install_signal_handlers()
+    try:
+        scheduler.run()
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
@@ -1,61 +1,141 @@
 from __future__ import annotations
 
-import json
+import logging
+import threading
+from dataclasses import dataclass, field
 from datetime import datetime
-from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional, Set
 
+from ..core.utils import parse_timestamp
+from ..decorators import log_action, retry_on_conflict
 from ..infra.database import get_db
+from .config import ParserConfig
 
+# провайдеры планировщика обновляют снимок из разных потоков
+_snapshot_lock = threading.Lock()
 
-def write_snapshot(pairs: Dict[str, float], source: str) -> None:
-    db = get_db()
-    snapshot = db.load_rates_snapshot()
-    existing_pairs = snapshot.get("pairs", {})
-    now_iso = datetime.utcnow().isoformat() + "Z"
 
-    for pair, rate in pairs.items():
-        existing_pairs[pair] = {
-            "rate": rate,
-            "updated_at": now_iso,
-            "source": source,
-        }
+@dataclass
+class SnapshotUpdate:
+    """Какие из полученных курсов записаны в снимок."""
+
+    # источник -> {пара: курс}
+    written: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    # пары, записанные по KEYFRAME_INTERVAL, а не из-за изменения
+    keyframes: Set[str] = field(default_factory=set)
+    skipped: int = 0
+
 
-    snapshot["pairs"] = existing_pairs
-    snapshot["last_refresh"] = now_iso
-    db.save_rates_snapshot(snapshot)
+def _change_kind(
+    pair: str,
+    rate: float,
+    info: Optional[dict],
+    now: datetime,
+    config: ParserConfig,
+) -> Optional[str]:
+    """'change', 'keyframe' или None, если курс записывать не нужно."""
+    if not info or not info.get("rate"):
+        return "change"
+    previous = float(info["rate"])
+    threshold = config.CHANGE_THRESHOLDS.get(pair, config.CHANGE_THRESHOLD)
+    if abs(rate - previous) / previous > threshold:
+        return "change"
+    updated_at = info.get("updated_at")
+    if not updated_at or (
+        (now - parse_timestamp(updated_at)).total_seconds()
+        >= config.KEYFRAME_INTERVAL
+    ):
+        return "keyframe"
+    return None
 
 
-def append_history(pairs: Dict[str, float], source: str) -> None:
+@log_action("STORE_SNAPSHOT", level=logging.DEBUG)
+@retry_on_conflict()
+def write_snapshot(
+    results: Dict[str, Dict[str, float]],
+    config: Optional[ParserConfig] = None,
+) -> SnapshotUpdate:
+    """Записать заметно изменившиеся курсы одним обновлением снимка.
+
+    ``results`` — словарь ``источник -> {пара: курс}``. Курс сравнивается
+    с сохранённым; если ни одна пара не изменилась больше своего порога
+    и ни для одной не подошёл ключевой кадр, снимок не переписывается,
+    а обновляется только last_refresh.
+    """
+    config = config or ParserConfig()
     db = get_db()
-    history_file = Path(db.exchange_history_file)
-    if history_file.exists():
-        with history_file.open("r", encoding="utf-8") as f:
-            history = json.load(f)
-    else:
-        history = []
+    with _snapshot_lock:
+        snapshot = db.load_rates_snapshot()
+        previous = snapshot.get("pairs", {})
+        now = datetime.utcnow()
+        now_iso = now.isoformat() + "Z"
+
+        update = SnapshotUpdate()
+        for source, pairs in results.items():
+            for pair, rate in pairs.items():
+                kind = _change_kind(pair, rate, previous.get(pair), now, config)
+                if kind is None:
+                    update.skipped += 1
+                    continue
+                update.written.setdefault(source, {})[pair] = rate
+                if kind == "keyframe":
+                    update.keyframes.add(pair)
+
+        if not update.written:
+            db.touch_last_refresh(now_iso)
+            return update
 
+        # снимок из кеша общий, поэтому собираем новый словарь
+        existing_pairs = dict(previous)
+        for source, pairs in update.written.items():
+            for pair, rate in pairs.items():
+                existing_pairs[pair] = {
+                    "rate": rate,
+                    "updated_at": now_iso,
+                    "source": source,
+                }
+
+        db.save_rates_snapshot(
+            {**snapshot, "pairs": existing_pairs, "last_refresh": now_iso}
+        )
+    return update
+
+
+@log_action("STORE_HISTORY", level=logging.DEBUG)
+def append_history(
+    results: Dict[str, Dict[str, float]],
+    metas: Optional[Dict[str, dict]] = None,
+    keyframes: Optional[Set[str]] = None,
+) -> None:
+    """Дописать в историю курсы всех источников одной пачкой.
+
+    ``metas`` — метаданные запроса по источникам (``last_meta`` клиента),
+    ``keyframes`` — пары, записанные по интервалу, а не из-за изменения.
+    """
+    db = get_db()
+    history = []
     now_iso = datetime.utcnow().isoformat() + "Z"
-    for pair, rate in pairs.items():
-        from_code, to_code = pair.split("_", maxsplit=1)
-        rec_id = f"{from_code}_{to_code}_{now_iso}"
-        record = {
-            "id": rec_id,
-            "from_currency": from_code,
-            "to_currency": to_code,
-            "rate": rate,
-            "timestamp": now_iso,
-            "source": source,
-            "meta": {
-                "raw_id": "",
-                "request_ms": 0,
-                "status_code": 200,
-                "etag": "",
-            },
-        }
-        history.append(record)
-
-    tmp = history_file.with_suffix(".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(history, f, ensure_ascii=False, indent=2)
-    tmp.replace(history_file)
+    for source, pairs in results.items():
+        meta = (metas or {}).get(source, {})
+        raw_ids = meta.get("raw_ids", {})
+        for pair, rate in pairs.items():
+            from_code, to_code = pair.split("_", maxsplit=1)
+            rec_id = f"{from_code}_{to_code}_{now_iso}"
+            record = {
+                "id": rec_id,
+                "from_currency": from_code,
+                "to_currency": to_code,
+                "rate": rate,
+                "timestamp": now_iso,
+                "source": source,
+                "meta": {
+                    "raw_id": raw_ids.get(pair, ""),
+                    "request_ms": meta.get("request_ms", 0),
+                    "status_code": meta.get("status_code", 200),
+                    "etag": meta.get("etag", ""),
+                    "keyframe": pair in (keyframes or ()),
+                },
+            }
+            history.append(record)
+
+    db.append_exchange_records(history)
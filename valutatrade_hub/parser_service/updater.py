@@ -1,43 +1,105 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 from ..core.exceptions import ApiRequestError
+from ..decorators import log_action
 from .api_clients import BaseApiClient
+from .config import ParserConfig
 from .storage import append_history, write_snapshot
 
 logger = logging.getLogger(__name__)
 
+FetchOutcome = Tuple[str, Optional[Dict[str, float]], Optional[str], dict]
+
 
 class RatesUpdater:
-    def __init__(self, clients: List[BaseApiClient]) -> None:
+    def __init__(
+        self,
+        clients: List[BaseApiClient],
+        config: Optional[ParserConfig] = None,
+    ) -> None:
         self.clients = clients
+        if config is None:
+            config = clients[0].config if clients else ParserConfig()
+        self.config = config
+
+    @staticmethod
+    def _fetch(client: BaseApiClient) -> FetchOutcome:
+        name = client.__class__.__name__
+        logger.info("Fetching from %s...", name)
+        client.last_meta = {}
+        started = time.perf_counter()
+        try:
+            pairs = client.fetch_rates()
+            error = None
+        except ApiRequestError as exc:
+            pairs = None
+            error = f"Failed to fetch from {name}: {exc}"
+        meta = dict(client.last_meta)
+        meta["elapsed_ms"] = (time.perf_counter() - started) * 1000
+        return name, pairs, error, meta
 
+    @log_action("UPDATE_RATES", level=logging.DEBUG)
     def run_update(self) -> dict:
         logger.info("Starting rates update...")
         all_pairs: Dict[str, float] = {}
+        fetched: Dict[str, Dict[str, float]] = {}
+        metas: Dict[str, dict] = {}
+        latency_ms: Dict[str, float] = {}
+        not_modified: List[str] = []
         errors: List[str] = []
 
-        for client in self.clients:
-            name = client.__class__.__name__
-            logger.info("Fetching from %s...", name)
-            try:
-                pairs = client.fetch_rates()
-            except ApiRequestError as exc:
-                msg = f"Failed to fetch from {name}: {exc}"
-                logger.error(msg)
-                errors.append(msg)
+        # Провайдеры опрашиваются параллельно: медленный не задерживает
+        # остальных, общее время — максимум, а не сумма задержек.
+        workers = max(1, len(self.clients))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(self._fetch, self.clients))
+
+        for name, pairs, error, meta in outcomes:
+            elapsed_ms = meta.pop("elapsed_ms")
+            latency_ms[name] = round(elapsed_ms, 1)
+            if error is not None:
+                logger.error(error)
+                errors.append(error)
+                continue
+            if meta.get("not_modified"):
+                # 304: данные не изменились, разбор и запись не нужны
+                logger.info("%s not modified (%.0f ms)", name, elapsed_ms)
+                not_modified.append(name)
                 continue
-            logger.info("%s OK (%d rates)", name, len(pairs))
+            logger.info(
+                "%s OK (%d rates, %.0f ms)",
+                name,
+                len(pairs),
+                elapsed_ms,
+            )
+            fetched[name] = pairs
+            metas[name] = meta
             all_pairs.update(pairs)
-            source = name
-            append_history(pairs, source=source)
-            write_snapshot(pairs, source=source)
+
+        written = skipped = 0
+        if fetched or not_modified:
+            # В снимок и историю идут только курсы, изменившиеся больше
+            # порога, и ключевые кадры; иначе (и при 304) обновляется
+            # только last_refresh.
+            update = write_snapshot(fetched, self.config)
+            if update.written:
+                append_history(update.written, metas, update.keyframes)
+            written = sum(len(pairs) for pairs in update.written.values())
+            skipped = update.skipped
 
         result = {
             "total_rates": len(all_pairs),
+            "written": written,
+            "unchanged": skipped,
             "errors": errors,
+            "latency_ms": latency_ms,
+            "not_modified": not_modified,
+            "pairs": all_pairs,
         }
         if errors:
             logger.info(